@@ -6,7 +6,8 @@ from rest_framework.decorators import action
 
 class MultiEditMixin:
     """
-    Provides the `edit()` action, which updates multiple objects.
+    Provides the `edit()` action, which updates multiple objects
+    (the serializer's list serializer must be a BulkListSerializer).
     """
 
     @action(methods=['post'], detail=False)
@@ -38,31 +39,20 @@ class MultiEditMixin:
         if serializer.is_valid():
             serializer.save()
             return Response({'success': True})
+        elif serializer.valid_data:
+            # Update the valid objects
+            serializer.save_valid()
+            return Response({
+                'success': True,
+                'message': 'Some records cannot be updated.',
+                'errors': serializer.errors,
+            })
         else:
-            # Try to update valid lanes
-            valid_data = [item[1] for item in zip(serializer.errors, post_data)
-                          if not item[0]]
-
-            if any(valid_data):
-                self._update_valid(valid_data)
-                return Response({
-                    'success': True,
-                    'message': 'Some records cannot be updated.',
-                })
-            else:
-                return Response({
-                    'success': False,
-                    'message': 'Invalid payload.',
-                }, 400)
-
-    def _update_valid(self, data):
-        """ Update valid objects. """
-        ids = [x['pk'] for x in data]
-        objects = self._get_model().objects.filter(pk__in=ids)
-        serializer = self.get_serializer(
-            data=data, instance=objects, many=True)
-        serializer.is_valid()
-        serializer.save()
+            return Response({
+                'success': False,
+                'message': 'Invalid payload.',
+                'errors': serializer.errors,
+            }, 400)
 
     def _get_model(self):
         return self.get_serializer().Meta.model
@@ -71,7 +61,8 @@ class MultiEditMixin:
 class LibrarySampleMultiEditMixin(object):
     """
     Provides the `edit()` action, which updates multiple objects and deals with
-    both Library and Sample instances.
+    both Library and Sample instances (the serializers' list serializers must
+    be BulkListSerializers).
     """
 
     @action(methods=['post'], detail=False)
@@ -160,24 +151,11 @@ class LibrarySampleMultiEditMixin(object):
         if serializer.is_valid():
             serializer.save()
         else:
-            # Try to update valid objects
-            valid_data = [item[1] for item in zip(serializer.errors, data)
-                          if not item[0]]
-
-            if any(valid_data):
-                new_ids = [x['pk'] for x in valid_data]
-                self._update_valid(
-                    model_class, serializer_class, new_ids, valid_data)
+            # Update the valid objects
+            if serializer.valid_data:
+                serializer.save_valid()
             else:
                 objects_ok = False
             no_invalid = False
 
         return objects_ok, no_invalid
-
-    def _update_valid(self, model_class, serializer_class, ids, valid_data):
-        """ Update valid objects. """
-        objects = model_class.objects.filter(pk__in=ids)
-        serializer = serializer_class(
-            data=valid_data, instance=objects, many=True)
-        serializer.is_valid()
-        serializer.save()
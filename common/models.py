@@ -83,3 +83,15 @@ class DateTimeMixin(models.Model):
 
     class Meta:
         abstract = True
+
+
+class CacheVersion(models.Model):
+    """
+    Version stamp of data cached in each process (see common.utils.
+    ProcessCache), stored in the database so that all processes see it.
+    """
+    key = models.CharField('Key', max_length=100, unique=True)
+    version = models.CharField('Version', max_length=32)
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
@@ -1,9 +1,154 @@
-from rest_framework.serializers import ModelSerializer
+from django.db import transaction
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import (
+    ModelSerializer,
+    ListSerializer,
+    PrimaryKeyRelatedField,
+)
 
 from .models import CostUnit
+from .utils import bulk_update
 
 
 class CostUnitSerializer(ModelSerializer):
     class Meta:
         model = CostUnit
         fields = ('id', 'name')
+
+
+class BulkPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """
+    Look the related objects up in `objects` (fetched for all rows at once
+    by BulkListSerializer) instead of querying them for each row.
+    """
+
+    objects = None
+
+    def to_internal_value(self, data):
+        if self.objects is not None and self.pk_field is None:
+            try:
+                return self.objects[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(ListSerializer):
+    """
+    Validate all rows once and save them in bulk: new objects with
+    a single bulk_create() and existing objects with a single UPDATE query
+    (see common.utils.bulk_update()), both in one transaction.
+
+    Unlike in ListSerializer, the valid rows are kept if some of the others
+    are invalid (`valid_data`), so they can be saved without validating
+    them again (see save_valid()). `errors` holds the errors of each row.
+    """
+
+    valid_data = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The child's fields are built lazily, so its foreign keys
+        # can still be validated with BulkPrimaryKeyRelatedField
+        self.child.serializer_related_field = BulkPrimaryKeyRelatedField
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+
+        self.fetch_related_objects(data)
+
+        self.valid_data = []
+        errors = []
+        for item in data:
+            try:
+                validated = self.child.run_validation(item)
+            except ValidationError as exc:
+                errors.append(exc.detail)
+            else:
+                self.valid_data.append(validated)
+                errors.append({})
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        return self.valid_data
+
+    def fetch_related_objects(self, data):
+        """ Fetch the related objects of all rows with one query per field. """
+        for name, field in self.child.fields.items():
+            if not isinstance(field, BulkPrimaryKeyRelatedField) or \
+                    field.read_only:
+                continue
+
+            pks = set()
+            for item in data:
+                try:
+                    pks.add(int(item[name]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+            field.objects = field.get_queryset().in_bulk(pks)
+
+    def save_valid(self):
+        """ Save the valid rows (after is_valid() has failed). """
+        if self.instance is not None:
+            return self.update(self.instance, self.valid_data)
+        return self.create(self.valid_data)
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objects = [model(**item) for item in validated_data]
+        with transaction.atomic():
+            return self.create_objects(objects)
+
+    def update(self, instance, validated_data):
+        # Maps for id->instance and id->data item
+        object_mapping = {obj.pk: obj for obj in instance}
+        data_mapping = {item['pk']: item for item in validated_data}
+
+        objects = []
+        fields = set()
+        for obj_id, data in data_mapping.items():
+            obj = object_mapping.get(obj_id, None)
+            if obj is not None:
+                fields.update(self.update_object(obj, data))
+                objects.append(obj)
+
+        if objects:
+            model = type(objects[0])
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    for obj in objects:
+                        field.pre_save(obj, False)
+                    fields.add(field.name)
+
+            with transaction.atomic():
+                self.save_objects(objects, list(fields))
+
+        return objects
+
+    def update_object(self, obj, data):
+        """
+        Set the attributes of an object from a validated data item and
+        return the names of the changed model fields.
+        """
+        fields = []
+        for attr, value in data.items():
+            try:
+                field = obj._meta.get_field(attr)
+            except FieldDoesNotExist:
+                continue
+            if not field.concrete or field.many_to_many or field.primary_key:
+                continue
+            setattr(obj, attr, value)
+            fields.append(field.name)
+        return fields
+
+    def create_objects(self, objects):
+        return type(objects[0]).objects.bulk_create(objects) \
+            if objects else []
+
+    def save_objects(self, objects, fields):
+        bulk_update(objects, fields)
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by common.utils.bulk_update(), which doesn't call save() and
+# doesn't send post_save
+post_bulk_update = Signal(providing_args=['objects', 'fields'])
@@ -1,10 +1,16 @@
 import re
+import uuid
 import string
 import random
 from time import time
 from datetime import datetime
 
+from django.apps import apps
 from django.db import connection
+from django.db.models import Case, When, Value, Subquery, OuterRef
+from django.db.models.functions import Cast, Coalesce
+
+from .signals import post_bulk_update
 
 
 def timeit(func):
@@ -25,6 +31,17 @@ def generate_barcode(record_type, counter):
     return barcode
 
 
+def get_barcode_key(barcode):
+    """
+    Get an integer sort key of a barcode: year * 1000000 + counter
+    (e.g., 18L000123 -> 18000123), None if the barcode is malformed.
+    """
+    match = re.match(r'^(\d{2})[A-Z](\d+)$', barcode or '')
+    if not match:
+        return None
+    return int(match[1]) * 1000000 + int(match[2])
+
+
 def get_random_name(len=10):
     """ Generate a random string of a given length. """
     return ''.join(random.SystemRandom().choice(
@@ -73,3 +90,92 @@ def get_date_range(start, end, format):
         start = end.replace(hour=0, minute=0)
 
     return (start, end)
+
+
+def bulk_update(objects, fields):
+    """
+    Save the given fields of model instances (of the same model)
+    with a single UPDATE query.
+
+    Note: neither save() nor the pre_save/post_save signals are called,
+    post_bulk_update is sent instead (see common.signals).
+    """
+    objects = [x for x in objects if x.pk is not None]
+    if not objects or not fields:
+        return 0
+
+    model = type(objects[0])
+    values = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        # Cast the values explicitly: if they are all NULL, Postgres
+        # would type the CASE expression as text
+        values[field.attname] = Case(
+            *[When(pk=x.pk, then=Cast(
+                Value(getattr(x, field.attname), output_field=field),
+                field,
+            )) for x in objects],
+            output_field=field,
+        )
+
+    count = model.objects.filter(
+        pk__in=[x.pk for x in objects]).update(**values)
+    post_bulk_update.send(sender=model, objects=objects, fields=fields)
+    return count
+
+
+class ProcessCache:
+    """
+    Base class for data cached in each process (in the subclass's own
+    `_cache` dict) until it is invalidated with clear_cache().
+
+    The version stamp of `cache_key` is stored in the database (see
+    common.models.CacheVersion) and checked with one query before the
+    cache is used, so an invalidation reaches all processes.
+    """
+
+    cache_key = ''
+    _cache = None
+    _cache_version = None
+
+    @classmethod
+    def get_cache_version(cls):
+        CacheVersion = apps.get_model('common', 'CacheVersion')
+        return CacheVersion.objects.filter(
+            key=cls.cache_key).values_list('version', flat=True).first()
+
+    @classmethod
+    def check_cache_version(cls):
+        """ Drop the cached data if it has been invalidated anywhere. """
+        version = cls.get_cache_version()
+        if version != cls._cache_version:
+            cls._cache.clear()
+            cls._cache_version = version
+
+    @classmethod
+    def clear_cache(cls):
+        CacheVersion = apps.get_model('common', 'CacheVersion')
+        version = uuid.uuid4().hex
+        if not CacheVersion.objects.filter(
+                key=cls.cache_key).update(version=version):
+            CacheVersion.objects.get_or_create(
+                key=cls.cache_key, defaults={'version': version})
+        cls._cache.clear()
+        cls._cache_version = version
+
+
+def aggregate_subquery(queryset, outer_ref, aggregate, output_field):
+    """
+    Aggregate the objects of `queryset` which are related to each object
+    of the outer query in a subquery (`outer_ref` is the lookup of the outer
+    object), 0 if there are none. Unlike aggregating over several joined
+    relations, this doesn't multiply the rows.
+    """
+    return Coalesce(Subquery(
+        queryset.filter(
+            **{outer_ref: OuterRef('pk')}
+        ).order_by().values(outer_ref).annotate(
+            value=aggregate,
+        ).values('value'),
+        output_field=output_field,
+    ), 0)
@@ -19,7 +19,7 @@ class LaneInline(admin.TabularInline):
     name.short_description = 'Name'
 
     def pool(self, instance):
-        return instance.lane.pool.name
+        return ', '.join(x.name for x in instance.lane.pools.all())
     pool.short_description = 'Pool'
 
     def loading_concentration(self, instance):
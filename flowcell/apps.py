@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class FlowcellConfig(AppConfig):
     name = 'flowcell'
+
+    def ready(self):
+        import flowcell.signals
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def copy_pools(apps, schema_editor):
+    Lane = apps.get_model('flowcell', 'Lane')
+    Lane.pools.through.objects.bulk_create([
+        Lane.pools.through(lane_id=lane_id, pool_id=pool_id)
+        for lane_id, pool_id in Lane.objects.values_list('pk', 'pool')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('index_generator', '0002_auto_20261018_1200'),
+        ('flowcell', '0003_flowcell_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lane',
+            name='pools',
+            field=models.ManyToManyField(blank=True, related_name='Pool', to='index_generator.Pool'),
+        ),
+        migrations.RunPython(copy_pools, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='lane',
+            name='pool',
+        ),
+    ]
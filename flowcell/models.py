@@ -24,18 +24,8 @@ class Lane(models.Model):
     completed = models.BooleanField('Completed', default=False)
 
     def __str__(self):
-        return f'{self.name}: {self.pools.name}'
-
-    def save(self, *args, **kwargs):
-        created = self.pk is None
-        super().save(*args, **kwargs)
-
-        # When a Lane objects is created, increment the loaded value of the
-        # related pool
-        if created:
-            for x in self.pools.all():
-                x.loaded += 1
-                x.save(update_fields=['loaded'])
+        pools = ', '.join(x.name for x in self.pools.all())
+        return f'{self.name}: {pools}'
 
 
 class Flowcell(DateTimeMixin):
@@ -1,4 +1,5 @@
 import itertools
+from collections import OrderedDict
 
 from django.apps import apps
 from django.db.models import Q
@@ -6,12 +7,16 @@ from django.db.models import Q
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (
     ModelSerializer,
-    ListSerializer,
     SerializerMethodField,
     IntegerField,
     CharField,
 )
 
+from common.serializers import BulkListSerializer
+from common.utils import bulk_update, get_barcode_key
+from library_sample_shared.utils import bulk_update_records
+from index_generator.collisions import get_pool_records, check_records
+
 from .models import Sequencer, Flowcell, Lane
 
 Request = apps.get_model('request', 'Request')
@@ -26,26 +31,19 @@ class SequencerSerializer(ModelSerializer):
         fields = ('id', 'name', 'lanes', 'lane_capacity',)
 
 
-class LaneListSerializer(ListSerializer):
-    def update(self, instance, validated_data):
-        # Maps for id->instance and id->data item.
-        object_mapping = {obj.pk: obj for obj in instance}
-        data_mapping = {item['pk']: item for item in validated_data}
-
-        # Perform updates
-        ret = []
-        for obj_id, data in data_mapping.items():
-            obj = object_mapping.get(obj_id, None)
-            if obj is not None:
-                if 'quality_check' in data.keys() and \
-                        data['quality_check'] == 'completed':
-                    obj.completed = True
-                ret.append(self.child.update(obj, data))
-        return ret
+class LaneListSerializer(BulkListSerializer):
+    def update_object(self, obj, data):
+        fields = super().update_object(obj, data)
+        if 'quality_check' in data.keys() and \
+                data['quality_check'] == 'completed':
+            obj.completed = True
+            fields.append('completed')
+        return fields
 
 
 class LaneSerializer(ModelSerializer):
     pk = IntegerField()
+    pool = SerializerMethodField()
     pool_name = SerializerMethodField()
     read_length_name = SerializerMethodField()
     index_i7_show = SerializerMethodField()
@@ -61,14 +59,18 @@ class LaneSerializer(ModelSerializer):
                   'loading_concentration', 'phix', 'quality_check',)
         extra_kwargs = {
             'name': {'required': False},
-            'pool': {'required': False},
         }
 
+    def get_pool(self, obj):
+        # A lane is created with a single pool (see FlowcellSerializer)
+        pools = obj.pools.all()
+        return pools[0].pk if pools else None
+
     def get_pool_name(self, obj):
-        return obj.pool.name
+        return ', '.join(x.name for x in obj.pools.all())
 
     def get_read_length_name(self, obj):
-        return str(obj.pool.size)
+        return ', '.join(str(x.size) for x in obj.pools.all())
 
     def get_index_i7_show(self, obj):
         # records = obj.pool.libraries.all() or obj.pool.samples.all()
@@ -83,8 +85,10 @@ class LaneSerializer(ModelSerializer):
         return None
 
     def get_equal_representation(self, obj):
-        records = list(itertools.chain(
-            obj.pool.libraries.all(), obj.pool.samples.all()))
+        records = list(itertools.chain(*[
+            itertools.chain(x.libraries.all(), x.samples.all())
+            for x in obj.pools.all()
+        ]))
         ern = [x.equal_representation_nucleotides for x in records].count(True)
         return len(records) == ern
 
@@ -124,6 +128,9 @@ class FlowcellListSerializer(ModelSerializer):
 
 
 class FlowcellSerializer(ModelSerializer):
+    # Minimum distance between the indices of the records on a lane
+    MIN_INDEX_DISTANCE = 1
+
     class Meta:
         model = Flowcell
         fields = ('flowcell_id', 'sequencer',)
@@ -144,33 +151,67 @@ class FlowcellSerializer(ModelSerializer):
                 'lanes': ['All lanes must be loaded.'],
             })
 
+        self.validate_index_collisions(lanes)
+
         internal_value.update({'lanes': lanes})
 
         return internal_value
 
+    def validate_index_collisions(self, lanes):
+        """
+        Ensure that the records of all pools loaded on a lane
+        can be demultiplexed.
+        """
+        pool_records = get_pool_records([x['pool_id'] for x in lanes])
+
+        lane_pools = OrderedDict()
+        for lane in lanes:
+            lane_pools.setdefault(lane['name'], []).append(lane['pool_id'])
+
+        errors = []
+        for lane_name, pool_ids in lane_pools.items():
+            records = list(itertools.chain(
+                *[pool_records.get(x, []) for x in set(pool_ids)]))
+            result = check_records(records, self.MIN_INDEX_DISTANCE)
+            for collision in result['collisions']:
+                errors.append(
+                    f'{lane_name}: indices of "{collision["record1"]}" '
+                    f'and "{collision["record2"]}" are too similar '
+                    f'(distance {collision["distance"]}).'
+                )
+
+        if errors:
+            raise ValidationError({'lanes': errors})
+
     def create(self, validated_data):
         lanes = validated_data.pop('lanes')
         instance = super().create(validated_data)
 
         # Create Lane objects and add them to the flowcell
+        # (the pools' value 'loaded' is incremented by the m2m_changed
+        # signal, see signals.py)
         lane_ids = []
         for lane_dict in lanes:
-            lane = Lane(name=lane_dict['name'], pool_id=lane_dict['pool_id'])
+            lane = Lane(name=lane_dict['name'])
             lane.save()
+            lane.pools.add(lane_dict['pool_id'])
             lane_ids.append(lane.pk)
         instance.lanes.add(*lane_ids)
 
-        pool_ids = list(Lane.objects.all().filter(pk__in=lane_ids).values_list(
-            'pool', flat=True,
-        ).distinct())
-        pools = Pool.objects.filter(pk__in=pool_ids)
+        pools = Pool.objects.filter(
+            pk__in={x['pool_id'] for x in lanes}).select_related('size')
 
         # After creating a flowcell, update all pool's libraries' and
-        # samples' statuses if the pool is fully loaded
+        # samples' statuses if the pool is fully loaded (in bulk, so that
+        # post_bulk_update is sent, e.g., to invalidate the invoicing)
         for pool in pools:
             if pool.loaded == pool.size.multiplier:
-                pool.libraries.all().filter(status=4).update(status=5)
-                pool.samples.all().filter(status=4).update(status=5)
+                for records in [pool.libraries.filter(status=4),
+                                pool.samples.filter(status=4)]:
+                    records = list(records)
+                    for record in records:
+                        record.status = 5
+                    bulk_update_records(records, ['status'])
 
         # When a Flowcell is loaded, save the all corresponding requests
         libraries = Library.objects.filter(pool__in=pools)
@@ -179,7 +220,10 @@ class FlowcellSerializer(ModelSerializer):
             libraries.values_list('request', flat=True).distinct(),
             samples.values_list('request', flat=True).distinct()
         )))
-        requests.update(sequenced=True)
+        requests = list(requests)
+        for request in requests:
+            request.sequenced = True
+        bulk_update(requests, ['sequenced'])
         instance.requests.add(*requests)
 
         return instance
@@ -286,7 +330,8 @@ class PoolInfoSerializer(ModelSerializer):
         records = libraries + samples
 
         data.update({
-            'records': sorted(records, key=lambda x: x['barcode'][3:])
+            'records': sorted(
+                records, key=lambda x: get_barcode_key(x['barcode']) or 0)
         })
 
         return data
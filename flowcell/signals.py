@@ -0,0 +1,24 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from index_generator.models import Pool
+from .models import Lane
+
+
+@receiver(m2m_changed, sender=Lane.pools.through)
+def increment_pool_loaded(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """
+    When pools are added to a lane, increment their value 'loaded'
+    (the number of lanes they are loaded on).
+    """
+    if action != 'post_add' or not pk_set:
+        return
+
+    if reverse:
+        # Lanes are added to a pool
+        Pool.objects.filter(pk=instance.pk).update(
+            loaded=F('loaded') + len(pk_set))
+    else:
+        Pool.objects.filter(pk__in=pk_set).update(loaded=F('loaded') + 1)
@@ -23,10 +23,10 @@ def create_sequencer(name, lanes=8, lane_capacity=200):
 def create_lane(name, pool):
     lane = Lane(
         name=name,
-        pool=pool,
         loading_concentration=1.0,
     )
     lane.save()
+    lane.pools.add(pool)
     return lane
 
 
@@ -61,7 +61,7 @@ class TestLaneModel(BaseTestCase):
         self.assertTrue(isinstance(self.lane, Lane))
         self.assertEqual(
             self.lane.__str__(),
-            '{}: {}'.format(self.lane.name, self.lane.pool.name)
+            '{}: {}'.format(self.lane.name, self.lane.pools.get().name)
         )
 
     def test_increment_pool_loaded(self):
@@ -77,6 +77,8 @@ class TestLaneModel(BaseTestCase):
         create_lane('Lane 1', pool1)
         create_lane('Lane 2', pool2)
         create_lane('Lane 3', pool2)
+        pool1.refresh_from_db()
+        pool2.refresh_from_db()
         self.assertEqual(pool1.loaded, 1)
         self.assertEqual(pool2.loaded, 2)
 
@@ -195,16 +197,13 @@ class TestFlowcell(BaseTestCase):
         lanes1 = []
         for i in range(2):
             name = 'Lane {}'.format(i + 1)
-            lane = Lane(name=name)
-            lane.pools.add(pool1)
-            lane.save()
+            lane = create_lane(name, pool1)
             lanes1.append(lane.pk)
 
         lanes2 = []
         for i in range(2, 4):
             name = 'Lane {}'.format(i + 1)
-            lane = Lane(name=name)
-            lane.pools.add(pool1)
+            lane = create_lane(name, pool1)
             lane.completed = True
             lane.save()
             lanes2.append(lane.pk)
@@ -322,6 +321,42 @@ class TestFlowcell(BaseTestCase):
         self.assertEqual(data['message'], 'Invalid payload.')
         self.assertIn('All lanes must be loaded.', data['errors']['lanes'])
 
+    def test_create_flowcell_index_collision(self):
+        """ Ensure error is thrown if indices on a lane are not unique. """
+        self.client.login(email='test@test.io', password='foo-bar')
+
+        library1 = create_library(get_random_name(), 4)
+        library2 = create_library(get_random_name(), 4)
+        for library in [library1, library2]:
+            library.index_i7 = 'ATCACG'
+            library.save()
+
+        pool1 = create_pool(self.user)
+        pool1.libraries.add(library1)
+        pool2 = create_pool(self.user)
+        pool2.libraries.add(library2)
+
+        # Both pools are loaded on Lane 1
+        lanes = [{'name': 'Lane 1', 'pool_id': pool1.pk}] + [{
+            'name': 'Lane {}'.format(i + 1),
+            'pool_id': pool2.pk,
+        } for i in range(4)]
+
+        sequencer = create_sequencer(get_random_name(), lanes=5)
+
+        response = self.client.post(reverse('flowcells-list'), {
+            'data': json.dumps({
+                'flowcell_id': get_random_name(),
+                'sequencer': sequencer.pk,
+                'lanes': lanes,
+            })
+        })
+        data = response.json()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(data['success'])
+        self.assertEqual(len(data['errors']['lanes']), 1)
+        self.assertIn('Lane 1', data['errors']['lanes'][0])
+
     def test_update_lane(self):
         """ Ensure update lanes behaves correctly. """
         self.client.login(email='test@test.io', password='foo-bar')
@@ -333,8 +368,7 @@ class TestFlowcell(BaseTestCase):
         sequencer = create_sequencer(get_random_name(), lanes=1)
         flowcell = create_flowcell(get_random_name(), sequencer)
 
-        lane = Lane(name=get_random_name(len=6), pool=pool)
-        lane.save()
+        lane = create_lane(get_random_name(len=6), pool)
 
         flowcell.lanes.add(lane)
 
@@ -360,11 +394,8 @@ class TestFlowcell(BaseTestCase):
         sequencer = create_sequencer(get_random_name(), lanes=2)
         flowcell = create_flowcell(get_random_name(), sequencer)
 
-        lane1 = Lane(name=get_random_name(len=6), pool=pool)
-        lane1.save()
-
-        lane2 = Lane(name=get_random_name(len=6), pool=pool)
-        lane2.save()
+        lane1 = create_lane(get_random_name(len=6), pool)
+        lane2 = create_lane(get_random_name(len=6), pool)
 
         flowcell.lanes.add(*[lane1.pk, lane2.pk])
 
@@ -395,8 +426,7 @@ class TestFlowcell(BaseTestCase):
         sequencer = create_sequencer(get_random_name(), lanes=1)
         flowcell = create_flowcell(get_random_name(), sequencer)
 
-        lane = Lane(name=get_random_name(len=6), pool=pool)
-        lane.save()
+        lane = create_lane(get_random_name(len=6), pool)
 
         flowcell.lanes.add(lane)
 
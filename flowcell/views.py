@@ -19,6 +19,8 @@ from xlwt import Workbook, XFStyle
 
 from common.views import CsrfExemptSessionAuthentication
 from common.mixins import MultiEditMixin
+from common.utils import get_barcode_key
+from library_sample_shared.utils import IndexCoordinates
 
 from .models import Sequencer, Lane, Flowcell
 from .serializers import (
@@ -31,8 +33,6 @@ from .serializers import (
 )
 
 ReadLength = apps.get_model('library_sample_shared', 'ReadLength')
-IndexI7 = apps.get_model('library_sample_shared', 'IndexI7')
-IndexI5 = apps.get_model('library_sample_shared', 'IndexI5')
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 Pool = apps.get_model('index_generator', 'Pool')
@@ -106,11 +106,13 @@ class FlowcellViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
                 'read_length', 'index_type',
                 'equal_representation_nucleotides')
 
-        lanes_qs = Lane.objects.filter(completed=False).select_related(
-            'pool',
-        ).prefetch_related(
-            Prefetch('pool__libraries', queryset=libraries_qs),
-            Prefetch('pool__samples', queryset=samples_qs),
+        pools_qs = Pool.objects.select_related('size').prefetch_related(
+            Prefetch('libraries', queryset=libraries_qs),
+            Prefetch('samples', queryset=samples_qs),
+        )
+
+        lanes_qs = Lane.objects.filter(completed=False).prefetch_related(
+            Prefetch('pools', queryset=pools_qs),
         ).order_by('name')
 
         queryset = Flowcell.objects.select_related(
@@ -258,18 +260,6 @@ class FlowcellViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
         """ Generate Benchtop Protocol as XLS file for selected lanes. """
 
         def create_row(lane, record):
-            index_i7 = IndexI7.objects.filter(
-                index=record.index_i7,
-                index_type=record.index_type
-            )
-            index_i7_id = index_i7[0].index_id if index_i7 else ''
-
-            index_i5 = IndexI5.objects.filter(
-                index=record.index_i5,
-                index_type=record.index_type
-            )
-            index_i5_id = index_i5[0].index_id if index_i5 else ''
-
             request_name = unicodedata.normalize(
                 'NFKD', record.request.get().name)
             request_name = str(request_name.encode('ASCII', 'ignore'), 'utf-8')
@@ -284,10 +274,14 @@ class FlowcellViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
                 record.barcode,        # Sample_ID
                 record.name,           # Sample_Name
                 '',                    # Sample_Plate
-                '',                    # Sample_Well
-                index_i7_id,           # I7_Index_ID
+                coordinates.get((      # Sample_Well
+                    record.index_type_id,
+                    record.index_i7_id,
+                    record.index_i5_id,
+                )),
+                record.index_i7_id,    # I7_Index_ID
                 record.index_i7,       # index
-                index_i5_id,           # I5_Index_ID
+                record.index_i5_id,    # I5_Index_ID
                 record.index_i5,       # index2
                 request_name,          # Sample_Project / Request ID
                 library_protocol,      # Description / Library Protocol
@@ -338,18 +332,32 @@ class FlowcellViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
 
         lanes = Lane.objects.filter(pk__in=ids).order_by('name')
 
-        rows = []
+        lane_records = []
         for lane in lanes:
             records = list(itertools.chain(
-                lane.pool.libraries.all().filter(~Q(status=-1)),
-                lane.pool.samples.all().filter(~Q(status=-1))
+                Library.objects.filter(
+                    ~Q(status=-1), pool__in=lane.pools.all(),
+                ).select_related('index_i7_ref', 'index_i5_ref').distinct(),
+                Sample.objects.filter(
+                    ~Q(status=-1), pool__in=lane.pools.all(),
+                ).select_related('index_i7_ref', 'index_i5_ref').distinct(),
             ))
+            lane_records.append((lane, records))
 
+        coordinates = IndexCoordinates([
+            record.index_type_id
+            for _, records in lane_records
+            for record in records
+        ])
+
+        rows = []
+        for lane, records in lane_records:
             for record in records:
                 row = create_row(lane, record)
                 rows.append(row)
 
-        rows = sorted(rows, key=lambda x: (x[0], x[1][3:]))
+        rows = sorted(
+            rows, key=lambda x: (x[0], get_barcode_key(x[1]) or 0))
         for row in rows:
             writer.writerow(row)
 
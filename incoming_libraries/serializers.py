@@ -2,37 +2,31 @@ from django.apps import apps
 
 from rest_framework.serializers import (
     ModelSerializer,
-    ListSerializer,
     SerializerMethodField,
     IntegerField,
     CharField,
 )
 
+from library_sample_shared.serializers import LibrarySampleBaseListSerializer
+
 Request = apps.get_model('request', 'Request')
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 
 
-class BaseListSerializer(ListSerializer):
-    def update(self, instance, validated_data):
-        # Maps for id->instance and id->data item.
-        object_mapping = {obj.pk: obj for obj in instance}
-        data_mapping = {item['pk']: item for item in validated_data}
-
-        # Perform updates
-        ret = []
-        for obj_id, data in data_mapping.items():
-            obj = object_mapping.get(obj_id, None)
-            if obj is not None:
-                if 'quality_check' in data.keys():
-                    if data['quality_check'] == 'passed':
-                        obj.status = 2
-                    elif data['quality_check'] == 'compromised':
-                        obj.status = -2
-                    elif data['quality_check'] == 'failed':
-                        obj.status = -1
-                ret.append(self.child.update(obj, data))
-        return ret
+class BaseListSerializer(LibrarySampleBaseListSerializer):
+    def update_object(self, obj, data):
+        fields = super().update_object(obj, data)
+        if 'quality_check' in data.keys():
+            status = {
+                'passed': 2,
+                'compromised': -2,
+                'failed': -1,
+            }.get(data['quality_check'])
+            if status is not None:
+                obj.status = status
+                fields.append('status')
+        return fields
 
 
 class BaseSerializer(ModelSerializer):
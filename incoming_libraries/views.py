@@ -9,6 +9,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 
 from common.mixins import LibrarySampleMultiEditMixin
+from common.utils import get_barcode_key
 from .serializers import RequestSerializer, LibrarySerializer, SampleSerializer
 
 Request = apps.get_model('request', 'Request')
@@ -45,5 +46,6 @@ class IncomingLibrariesViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
         serializer = RequestSerializer(queryset, many=True)
         data = list(itertools.chain(*serializer.data))
 
-        data = sorted(data, key=lambda x: x['barcode'][3:])
+        data = sorted(
+            data, key=lambda x: get_barcode_key(x['barcode']) or 0)
         return Response(data)
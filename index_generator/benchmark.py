@@ -0,0 +1,211 @@
+"""
+Benchmark of the index generator on synthetic index kits.
+
+Every run builds a kit (single/dual, tube/plate, 6/8 nt) and a set of
+samples with random sequencing depths, generates indices with a fixed
+seed and measures the wall time, the number of queries, the number of
+greedy passes and the worst-cycle color imbalance of the result.
+
+All objects are created in a transaction which is rolled back at the end.
+"""
+import time
+import random
+import string
+import itertools
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from .index_generator import IndexGenerator, IndexRegistry
+
+IndexType = apps.get_model('library_sample_shared', 'IndexType')
+IndexI7 = apps.get_model('library_sample_shared', 'IndexI7')
+IndexI5 = apps.get_model('library_sample_shared', 'IndexI5')
+IndexPair = apps.get_model('library_sample_shared', 'IndexPair')
+Organism = apps.get_model('library_sample_shared', 'Organism')
+ConcentrationMethod = apps.get_model(
+    'library_sample_shared', 'ConcentrationMethod')
+ReadLength = apps.get_model('library_sample_shared', 'ReadLength')
+LibraryProtocol = apps.get_model('library_sample_shared', 'LibraryProtocol')
+LibraryType = apps.get_model('library_sample_shared', 'LibraryType')
+NucleicAcidType = apps.get_model('sample', 'NucleicAcidType')
+Sample = apps.get_model('sample', 'Sample')
+
+KIT_TYPES = [
+    {'is_dual': is_dual, 'format': format, 'index_length': index_length}
+    for is_dual, format, index_length in itertools.product(
+        (False, True), ('single', 'plate'), ('6', '8'))
+]
+SAMPLE_COUNTS = [2, 8, 24, 96, 384]
+
+# A kit holds enough indices (or index pairs) for 384 samples:
+# a 16x24 plate or 24 indices I7 x 16 indices I5 for dual kits
+PLATE_ROWS, PLATE_COLUMNS = 16, 24
+
+
+def random_indices(rng, count, length):
+    """ Get `count` unique random index sequences. """
+    indices = set()
+    while len(indices) < count:
+        indices.add(''.join(rng.choice('ACGT') for _ in range(length)))
+    return sorted(indices)
+
+
+def create_kit(rng, number, is_dual, format, index_length):
+    """ Create a synthetic index type with its indices and index pairs. """
+    index_type = IndexType.objects.create(
+        name=f'Benchmark {number}',
+        is_dual=is_dual,
+        format=format,
+        index_length=index_length,
+    )
+    prefix = f'~bench{number}'
+    length = int(index_length)
+
+    num_i7 = PLATE_COLUMNS if is_dual else PLATE_ROWS * PLATE_COLUMNS
+    indices_i7 = [
+        IndexI7.objects.create(prefix=prefix, number=str(i + 1), index=x)
+        for i, x in enumerate(random_indices(rng, num_i7, length))
+    ]
+    index_type.indices_i7.add(*indices_i7)
+
+    indices_i5 = []
+    if is_dual:
+        indices_i5 = [
+            IndexI5.objects.create(prefix=prefix, number=str(i + 1), index=x)
+            for i, x in enumerate(random_indices(rng, PLATE_ROWS, length))
+        ]
+        index_type.indices_i5.add(*indices_i5)
+
+    if format == 'plate':
+        pairs = []
+        for i, j in itertools.product(
+                range(PLATE_ROWS), range(PLATE_COLUMNS)):
+            pairs.append(IndexPair(
+                index_type=index_type,
+                index1=indices_i7[j if is_dual else i * PLATE_COLUMNS + j],
+                index2=indices_i5[i] if is_dual else None,
+                char_coord=string.ascii_uppercase[i],
+                num_coord=j + 1,
+            ))
+        IndexPair.objects.bulk_create(pairs)
+
+    return index_type
+
+
+def create_samples(rng, index_type, count):
+    """ Create `count` samples with random sequencing depths. """
+    library_protocol = LibraryProtocol.objects.create(
+        name='Benchmark',
+        type='DNA',
+        provider='-',
+        catalog='-',
+        explanation='-',
+        input_requirements='-',
+        typical_application='-',
+    )
+    library_type = LibraryType.objects.create(name='Benchmark')
+    library_type.library_protocol.add(library_protocol)
+
+    fields = {
+        'status': 2,
+        'organism': Organism.objects.create(name='Benchmark'),
+        'concentration': 1.0,
+        'concentration_method': ConcentrationMethod.objects.create(
+            name='Benchmark'),
+        'read_length': ReadLength.objects.create(name='Benchmark'),
+        'library_protocol': library_protocol,
+        'library_type': library_type,
+        'nucleic_acid_type': NucleicAcidType.objects.create(
+            name='Benchmark'),
+        'index_type': index_type,
+    }
+
+    samples = []
+    for i in range(count):
+        sample = Sample(
+            name=f'Benchmark_{i + 1}',
+            sequencing_depth=rng.randint(1, 50),
+            **fields,
+        )
+        sample.save()
+        samples.append(sample)
+    return samples
+
+
+def run_case(kit, num_samples, seed, number=0, restarts=0, optimize=False):
+    """
+    Benchmark a single kit type and pool size.
+    Return a dict with the measurements.
+    """
+    rng = random.Random(seed)
+    index_type = create_kit(rng, number, **kit)
+    samples = create_samples(rng, index_type, num_samples)
+
+    result = {
+        'mode': 'dual' if kit['is_dual'] else 'single',
+        'format': kit['format'],
+        'index_length': int(kit['index_length']),
+        'num_samples': num_samples,
+        'seed': seed,
+        'restarts': restarts,
+        'optimize': optimize,
+        'success': True,
+        'message': '',
+        'wall_time': None,
+        'queries': None,
+        'attempts': None,
+        'worst_cycle_score': None,
+    }
+
+    # Measure the cold path (the registry is loaded from the database)
+    IndexRegistry.clear_cache()
+    random.seed(seed)
+
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        index_generator = IndexGenerator(
+            [], [x.pk for x in samples], None, None)
+        try:
+            index_generator.generate(
+                restarts, processes=1 if restarts else None,
+                optimize=optimize)
+        except ValueError as e:
+            result.update(success=False, message=str(e))
+
+    result.update(
+        wall_time=round(time.perf_counter() - start, 4),
+        queries=len(queries),
+        attempts=index_generator.attempts,
+    )
+
+    if result['success']:
+        records = index_generator._result
+        result['worst_cycle_score'] = round(index_generator.get_imbalance(
+            [x['index_i7'] for x in records],
+            [x['index_i5'] for x in records],
+            [x['sequencing_depth'] for x in records],
+        ), 2)
+
+    return result
+
+
+def run_benchmark(kits=None, sample_counts=None, seed=0, restarts=0,
+                  optimize=False):
+    """ Benchmark all combinations of kit types and pool sizes. """
+    kits = KIT_TYPES if kits is None else kits
+    sample_counts = SAMPLE_COUNTS if sample_counts is None else sample_counts
+
+    results = []
+    try:
+        with transaction.atomic():
+            cases = itertools.product(kits, sample_counts)
+            for number, (kit, num_samples) in enumerate(cases):
+                results.append(run_case(
+                    kit, num_samples, seed, number, restarts, optimize))
+            transaction.set_rollback(True)
+    finally:
+        IndexRegistry.clear_cache()
+
+    return results
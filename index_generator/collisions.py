@@ -0,0 +1,202 @@
+import itertools
+
+import numpy as np
+from django.apps import apps
+
+from library_sample_shared.encoding import pack_index, packed_length
+
+Library = apps.get_model('library', 'Library')
+Sample = apps.get_model('sample', 'Sample')
+
+MAX_LENGTH = 8  # the maximum index length (see GenericIndex.index)
+EVEN_BITS = int('01' * MAX_LENGTH, 2)
+FULL_MASK = (1 << 2 * MAX_LENGTH) - 1
+
+# PREFIX_MASKS[n] selects the first n nucleotides of an aligned code
+PREFIX_MASKS = np.array([
+    FULL_MASK ^ (FULL_MASK >> 2 * n) for n in range(MAX_LENGTH + 1)
+], dtype=np.uint16)
+
+# Number of set bits of every 16-bit value
+POPCOUNT = np.array([bin(x).count('1') for x in range(1 << 16)], dtype=np.int8)
+
+
+def align_indices(packed_indices):
+    """
+    Strip the length marker from packed indices (see encoding.py) and
+    align them to the left, so that the same cycles of all indices take
+    the same bits. Return the aligned codes and the index lengths.
+
+    Missing indices (None) get the length 0.
+    """
+    codes = np.zeros(len(packed_indices), dtype=np.uint16)
+    lengths = np.zeros(len(packed_indices), dtype=np.int8)
+
+    for i, packed in enumerate(packed_indices):
+        if not packed:
+            continue
+        length = packed_length(packed)
+        code = packed ^ (1 << 2 * length)
+        if length > MAX_LENGTH:
+            code >>= 2 * (length - MAX_LENGTH)
+            length = MAX_LENGTH
+        codes[i] = code << 2 * (MAX_LENGTH - length)
+        lengths[i] = length
+
+    return codes, lengths
+
+
+def mismatches(codes1, codes2, mask=None):
+    """
+    Count the mismatching nucleotides of aligned codes
+    (within the nucleotides selected by `mask`).
+    """
+    diff = codes1 ^ codes2
+    diff = (diff | diff >> 1) & EVEN_BITS
+    if mask is not None:
+        diff &= mask
+    return POPCOUNT[diff].astype(np.int16)
+
+
+def hamming_matrix(codes, lengths):
+    """
+    Get the pairwise Hamming distances between aligned indices.
+
+    Indices of different length are compared over the shorter one.
+    """
+    mask = None
+    if len(lengths) and lengths.min() != lengths.max():
+        mask = PREFIX_MASKS[np.minimum.outer(lengths, lengths)]
+    return mismatches(codes[:, None], codes[None, :], mask)
+
+
+def indel_matrix(codes, lengths):
+    """
+    Get the pairwise distances between aligned indices if one of them
+    is read with a single insertion or deletion (which counts as 1).
+    """
+    n = len(codes)
+    distances = np.full((n, n), MAX_LENGTH + 1, dtype=np.int16)
+    if n == 0:
+        return distances
+
+    overlap = np.minimum.outer(np.maximum(lengths - 1, 0), lengths)
+    mask = PREFIX_MASKS[overlap]
+
+    # Delete the nucleotide i of the first index and compare
+    # the rest with the second index
+    for i in range(MAX_LENGTH):
+        prefix = PREFIX_MASKS[i]
+        deleted = (codes & prefix) | ((codes << 2) & ~prefix)
+        distances = np.minimum(
+            distances, 1 + mismatches(deleted[:, None], codes[None, :], mask))
+
+    # An insertion into the first index is a deletion from the second one
+    distances = np.minimum(distances, distances.T)
+    distances[overlap == 0] = MAX_LENGTH + 1
+    return distances
+
+
+def distance_matrix(indices_i7, indices_i5=None, edit_distance=False):
+    """
+    Get the pairwise distances between records given their packed
+    indices I7 and I5: the sum of the distances of both index reads.
+
+    If `edit_distance` is set, a single insertion or deletion in an
+    index read is considered as well (the read distance is the minimum
+    of its Hamming distance and its one-indel distance).
+    """
+    if indices_i5 is None:
+        indices_i5 = [None] * len(indices_i7)
+
+    distances = 0
+    for packed_indices in (indices_i7, indices_i5):
+        codes, lengths = align_indices(packed_indices)
+        read_distances = hamming_matrix(codes, lengths)
+        if edit_distance:
+            read_distances = np.minimum(
+                read_distances, indel_matrix(codes, lengths))
+        distances = distances + read_distances
+
+    return distances
+
+
+def find_collisions(indices_i7, indices_i5=None, min_distance=1,
+                    edit_distance=False):
+    """
+    Check the pairwise distances between records in a pool (or on a lane).
+
+    Return the minimum distance (None if there are less than two records
+    with an index I7) and the pairs of record positions which are closer
+    than `min_distance` together with their distances.
+    """
+    if indices_i5 is None:
+        indices_i5 = [None] * len(indices_i7)
+
+    # Skip records without (valid) indices
+    positions = [i for i, x in enumerate(indices_i7) if x]
+    if len(positions) < 2:
+        return None, []
+
+    distances = distance_matrix(
+        [indices_i7[i] for i in positions],
+        [indices_i5[i] for i in positions],
+        edit_distance,
+    )
+
+    upper = np.triu(np.ones_like(distances, dtype=bool), k=1)
+    close = upper & (distances < min_distance)
+
+    collisions = [
+        (positions[i], positions[j], int(distances[i, j]))
+        for i, j in zip(*np.nonzero(close))
+    ]
+
+    return int(distances[upper].min()), collisions
+
+
+def get_pool_records(pool_ids):
+    """
+    Get the names and the packed indices of the libraries and samples
+    in the given pools (a dict pool id -> list of records).
+    """
+    fields = ('pool', 'name', 'barcode', 'index_i7_packed', 'index_i5_packed')
+    records = itertools.chain(
+        Library.objects.filter(pool__in=pool_ids).values(*fields),
+        Sample.objects.filter(pool__in=pool_ids).values(*fields),
+    )
+
+    result = {}
+    for record in records:
+        result.setdefault(record['pool'], []).append(record)
+    return result
+
+
+def check_records(records, min_distance=1, edit_distance=False):
+    """
+    Check the distances between records (dicts with the keys
+    'name', 'index_i7_packed' and 'index_i5_packed').
+    """
+    distance, collisions = find_collisions(
+        [x['index_i7_packed'] for x in records],
+        [x['index_i5_packed'] for x in records],
+        min_distance, edit_distance,
+    )
+
+    return {
+        'min_distance': distance,
+        'collisions': [{
+            'record1': records[i]['name'],
+            'record2': records[j]['name'],
+            'distance': d,
+        } for i, j, d in collisions],
+    }
+
+
+def pack_records(records):
+    """ Add packed indices to records with the index sequences. """
+    return [{
+        **x,
+        'index_i7_packed': pack_index(x.get('index_i7')),
+        'index_i5_packed': pack_index(x.get('index_i5')),
+    } for x in records]
@@ -1,25 +1,61 @@
 import re
+import time
 import random
 import string
 import itertools
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
 from collections import namedtuple, OrderedDict, defaultdict
 
+import numpy as np
 from django.apps import apps
+from django.conf import settings
+
+from common.utils import ProcessCache
+from library_sample_shared.utils import IndexCoordinates
+
+from .optimizer import PoolOptimizer
+from .scoring import (
+    ColorDistribution,
+    encode_indices,
+    find_best,
+    max_imbalance,
+)
 
-IndexI7 = apps.get_model('library_sample_shared', 'IndexI7')
-IndexI5 = apps.get_model('library_sample_shared', 'IndexI5')
 IndexPair = apps.get_model('library_sample_shared', 'IndexPair')
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 
 Pair = namedtuple('Pair', ['index1', 'index2', 'coordinate'])
+GenerationTask = namedtuple('GenerationTask', [
+    'depths', 'plate_samples', 'tube_samples',
+    'init_index_pairs', 'init_indices_i7', 'init_indices_i5',
+])
 
+# The processes of the multi-restart search are shared by all requests
+# and jobs of a worker (see get_process_pool())
+_process_pool = None
+_process_pool_lock = threading.Lock()
 
-class IndexRegistry:
+
+class IndexRegistry(ProcessCache):
     """ """
+    # Fetched indices and index pairs shared across requests (per worker).
+    # The cache is cleared by the signals in index_generator/signals.py
+    # whenever an index, index pair or index type changes
+    cache_key = 'index_generator.registry'
+    _cache = {}
+
     def __init__(self, mode, index_types, start_coord='A1', direction='right'):
         self.indices = {}
         self.pairs = {}
+        self.colors = {}
+        self.index_lengths = {}
 
         # In case if an empty string was passed
         start_coord = start_coord if start_coord else 'A1'
@@ -32,12 +68,30 @@ class IndexRegistry:
 
         char_coord, num_coord = self.split_coordinate(start_coord)
 
-        # Fetch indices and index pairs
+        self.check_cache_version()
+
+        # Fetch indices and index pairs (or take them from the cache)
         for index_type in self.index_types:
-            if index_type.format == 'single':
-                self.fetch_indices(index_type)
-            else:
-                self.fetch_pairs(index_type, char_coord, num_coord)
+            key = (index_type.pk, mode, start_coord, direction)
+            if key not in self._cache:
+                if index_type.format == 'single':
+                    self.fetch_indices(index_type)
+                else:
+                    self.fetch_pairs(index_type, char_coord, num_coord)
+                self._cache[key] = {
+                    'indices': self.indices.get(index_type.pk),
+                    'pairs': self.pairs.get(index_type.pk),
+                    'index_length': int(index_type.index_length),
+                    'colors': {},
+                }
+
+            cached = self._cache[key]
+            if cached['indices'] is not None:
+                self.indices[index_type.pk] = cached['indices']
+            if cached['pairs'] is not None:
+                self.pairs[index_type.pk] = cached['pairs']
+            self.index_lengths[index_type.pk] = cached['index_length']
+            self.colors[index_type.pk] = cached['colors']
 
     def fetch_indices(self, index_type):
         if index_type.pk not in self.indices.keys():
@@ -133,6 +187,33 @@ class IndexRegistry:
     def get_pairs(self, index_type_id):
         return self.pairs.get(index_type_id, [])
 
+    def get_indices_colors(self, index_type_id, index_group):
+        """ Get the color matrix of all indices of a given index type. """
+        colors = self.colors.setdefault(index_type_id, {})
+        if index_group not in colors:
+            colors[index_group] = encode_indices([
+                x['index']
+                for x in self.get_indices(index_type_id, index_group)
+            ], self.index_lengths.get(index_type_id))
+        return colors[index_group]
+
+    def get_pairs_colors(self, index_type_id):
+        """
+        Get the color matrix of all index pairs of a given index type
+        (concatenated indices I7 and I5 in the dual mode).
+        """
+        colors = self.colors.setdefault(index_type_id, {})
+        if 'pairs' not in colors:
+            length = self.index_lengths.get(index_type_id)
+            if length and self.mode == 'dual':
+                length *= 2
+            colors['pairs'] = encode_indices([
+                x.index1['index'] + x.index2['index']
+                if self.mode == 'dual' else x.index1['index']
+                for x in self.get_pairs(index_type_id)
+            ], length)
+        return colors['pairs']
+
     def to_list(self, format, index_type, indices):
         return list(map(lambda x: self.create_index_dict(
             format, index_type, x.prefix, x.number, x.index), indices))
@@ -169,29 +250,34 @@ class IndexGenerator:
     index_length = 0
     format = ''
     mode = ''
+    attempts = 0  # the number of passes, greedy or fixed (see benchmark.py)
+    deadline = None  # time.time() after which a pass stops (see search())
+    rng = random  # the random number generator of a pass (see run_restart())
     MAX_ATTEMPTS = 30
     MAX_RANDOM_SAMPLES = 5
+    SEARCH_TIME_BUDGET = 10.0  # seconds
+    OPTIMIZER_ITERATIONS = 20000
 
-    def __init__(self, library_ids, sample_ids, start_coord, direction):
+    def __init__(self, library_ids, sample_ids, start_coord, direction,
+                 progress=None):
         self._result = []
 
+        # Optional callback progress(samples_placed, best_score)
+        self.progress = progress
+
         self.libraries = Library.objects.filter(
             pk__in=library_ids
         ).select_related(
-            'read_length', 'index_type',
-        ).prefetch_related(
-            'index_type__indices_i7', 'index_type__indices_i5',
+            'read_length', 'index_type', 'index_i7_ref', 'index_i5_ref',
         ).only(
             'id', 'name', 'sequencing_depth', 'read_length__id', 'index_type',
-            'index_i7', 'index_i5',
+            'index_i7', 'index_i5', 'index_i7_ref', 'index_i5_ref',
         )
 
         self.samples = Sample.objects.filter(
             pk__in=sample_ids
         ).select_related(
             'read_length', 'index_type',
-        ).prefetch_related(
-            'index_type__indices_i7', 'index_type__indices_i5',
         ).order_by(
             'index_type__format', 'index_type__id', 'sequencing_depth',
         ).only(
@@ -238,8 +324,16 @@ class IndexGenerator:
 
         return index_types
 
-    def generate(self):
-        """ """
+    def generate(self, restarts=0, time_budget=None, processes=None,
+                 optimize=False):
+        """
+        Generate indices for the samples.
+
+        By default, the first greedy pass with unique index pairs is taken.
+        If `restarts` is set, run that many seeded passes (see `search()`)
+        and take the one with the lowest worst-cycle color imbalance.
+        If `optimize` is set, refine the result with `optimize()`.
+        """
         if self.num_libraries > 0:
             self.add_libraries_to_result()
 
@@ -251,6 +345,50 @@ class IndexGenerator:
                     self.samples[0], index_i7, index_i5))
             return self.result
 
+        task = self.prepare_task()
+
+        if restarts:
+            indices = self.search(task, restarts, time_budget, processes)
+        elif optimize:
+            # The optimizer doesn't need a greedy start (which may fail
+            # for large pools), any unique assignment will do
+            indices = None
+        else:
+            indices = None
+            attempt = 0
+            while indices is None and attempt < self.MAX_ATTEMPTS:
+                indices = self.generate_once(task)
+                attempt += 1
+
+        if indices is None and optimize:
+            indices = self.find_random_assignment()
+
+        if indices is None:
+            raise ValueError('Failed to generate indices.')
+
+        indices_i7, indices_i5 = indices
+
+        if optimize:
+            indices_i7, indices_i5 = self.optimize(
+                indices_i7, indices_i5, task.depths, time_budget)
+
+        # Skip indices which are already in the result
+        indices_i7 = indices_i7[len(self._result):]
+        indices_i5 = indices_i5[len(self._result):]
+
+        # Add generated indices to the result
+        for i, sample in enumerate(self.samples):
+            self._result.append(
+                self.create_result_dict(
+                    sample, indices_i7[i], indices_i5[i]))
+
+        return self.result
+
+    def prepare_task(self):
+        """
+        Collect the sequencing depths, the indices of the records which
+        are already in the result and the samples to generate indices for.
+        """
         depths = [x.sequencing_depth for x in self.samples]
 
         init_index_pairs = []
@@ -291,75 +429,293 @@ class IndexGenerator:
             else:
                 tube_samples.pop(0)
 
-        attempt = 0
-        is_ok = False
-
-        while not is_ok and attempt < self.MAX_ATTEMPTS:
-            init_pairs = list(init_index_pairs)
-            init_i7 = list(init_indices_i7)
-            init_i5 = list(init_indices_i5)
-
-            if not any(init_pairs):
-                pair_1 = self.find_random(self.samples[0])
-                init_pairs.append(pair_1)
-                init_i7.append(pair_1[0])
-                init_i5.append(pair_1[1])
-
-            # Find index pairs
-            pairs = self.find_pairs(plate_samples, depths, init_pairs)
-
-            # Extract indices from the pairs
-            # for pair in pairs[1:]:
-            for pair in pairs[len(init_pairs):]:
-                init_i7.append(pair[0])
-                init_i5.append(pair[1])
-
-            # Find indices I7 and I5 independently
-            indices_i7 = self.find_indices(
-                tube_samples, depths, 'i7', init_i7)
-            if self.mode == 'single':
-                indices_i5 = [
-                    self.index_registry.create_index_dict()] * len(indices_i7)
+        return GenerationTask(
+            depths, plate_samples, tube_samples,
+            init_index_pairs, init_indices_i7, init_indices_i5,
+        )
+
+    def generate_once(self, task):
+        """
+        Run a single greedy pass. Return the indices I7 and I5 for all
+        records or None if the generated index pairs are not unique.
+        """
+        init_pairs = list(task.init_index_pairs)
+        init_i7 = list(task.init_indices_i7)
+        init_i5 = list(task.init_indices_i5)
+
+        if not any(init_pairs):
+            pair_1 = self.find_random(self.samples[0])
+            init_pairs.append(pair_1)
+            init_i7.append(pair_1[0])
+            init_i5.append(pair_1[1])
+
+        # Find index pairs
+        pairs = self.find_pairs(task.plate_samples, task.depths, init_pairs)
+
+        # Extract indices from the pairs
+        for pair in pairs[len(init_pairs):]:
+            init_i7.append(pair[0])
+            init_i5.append(pair[1])
+
+        # Find indices I7 and I5 independently
+        indices_i7 = self.find_indices(
+            task.tube_samples, task.depths, 'i7', init_i7)
+        if self.mode == 'single':
+            indices_i5 = [
+                self.index_registry.create_index_dict()] * len(indices_i7)
+        else:
+            indices_i5 = self.find_indices(
+                task.tube_samples, task.depths, 'i5', init_i5)
+
+        # Ensure uniqueness
+        i7_extracted = [x['index'] for x in indices_i7]
+        i5_extracted = [x['index'] for x in indices_i5]
+        all_pairs = list(zip(i7_extracted, i5_extracted))
+
+        if len(all_pairs) != len(set(all_pairs)):
+            return None
+
+        return indices_i7, indices_i5
+
+    def search(self, task, restarts, time_budget=None, processes=None):
+        """
+        Run `restarts` seeded greedy passes across the shared process pool
+        and return the indices with the lowest worst-cycle color imbalance.
+
+        At most `processes` passes (settings.INDEX_GENERATOR_PROCESSES
+        at most and by default) run at the same time. Passes which haven't
+        finished within `time_budget` seconds are stopped and discarded.
+        Return None if no pass has produced unique pairs.
+        """
+        if time_budget is None:
+            time_budget = self.SEARCH_TIME_BUDGET
+        max_processes = settings.INDEX_GENERATOR_PROCESSES
+        processes = min(processes or max_processes, max_processes)
+        # Wall-clock time, so that it can be compared in the worker processes
+        deadline = time.time() + time_budget
+
+        seeds = random.sample(range(2 ** 32), restarts)
+        results = []
+        best_scores = []
+
+        def report(result):
+            if result is not None:
+                best_scores.append(result[0])
+                self.report_progress(self.num_samples, min(best_scores))
+
+        if processes <= 1:
+            for seed in seeds:
+                if time.time() > deadline:
+                    break
+                results.append(run_restart(self, task, seed, deadline))
+                report(results[-1])
+
+        else:
+            pool = get_process_pool()
+            futures, pending, finished = {}, set(), {}
+            try:
+                while True:
+                    while seeds and len(pending) < processes and \
+                            time.time() < deadline:
+                        future = pool.submit(
+                            run_restart, self, task, seeds.pop(0), deadline)
+                        futures[future] = len(futures)
+                        pending.add(future)
+                    if not pending:
+                        break
+
+                    done, pending = wait(
+                        pending, timeout=max(deadline - time.time(), 0),
+                        return_when=FIRST_COMPLETED)
+                    if not done:
+                        break
+
+                    for future in done:
+                        exception = future.exception()
+                        if isinstance(exception, BrokenProcessPool):
+                            raise exception
+                        if exception is None:
+                            finished[futures[future]] = future.result()
+                            report(finished[futures[future]])
+            except BrokenProcessPool:
+                reset_process_pool()
+                raise
+
+            # The queued passes are cancelled and the running ones stop
+            # at the deadline on their own
+            for future in pending:
+                future.cancel()
+
+            # Keep the order of the seeds for reproducible tie-breaking
+            results = [finished[i] for i in sorted(finished)]
+
+        results = [x for x in results if x is not None]
+        if not any(results):
+            return None
+
+        return min(results, key=lambda x: x[0])[1]
+
+    def find_random_assignment(self):
+        """
+        Find random unique indices for all samples
+        (the starting point of `optimize()`).
+        """
+        indices_i7 = [x['index_i7'] for x in self._result]
+        indices_i5 = [x['index_i5'] for x in self._result]
+        used = {(x['index'], y['index']) for x, y in zip(
+            indices_i7, indices_i5)}
+
+        for sample in self.samples:
+            for _ in range(self.MAX_ATTEMPTS):
+                index_i7, index_i5 = self.find_random(sample)
+                key = (index_i7['index'], index_i5['index'])
+                if key not in used:
+                    break
             else:
-                indices_i5 = self.find_indices(
-                    tube_samples, depths, 'i5', init_i5)
+                return None
 
-            # Ensure uniqueness
-            i7_extracted = [x['index'] for x in indices_i7]
-            i5_extracted = [x['index'] for x in indices_i5]
-            all_pairs = list(zip(i7_extracted, i5_extracted))
+            used.add(key)
+            indices_i7.append(index_i7)
+            indices_i5.append(index_i5)
 
-            # If all pairs are unique, exit. Otherwise, re-generate the indices
-            if len(all_pairs) == len(set(all_pairs)):
-                is_ok = True
+        return indices_i7, indices_i5
 
-            attempt += 1
+    def optimize(self, indices_i7, indices_i5, depths, time_budget=None):
+        """
+        Refine the generated indices of the samples with simulated
+        annealing (see `PoolOptimizer`). Libraries keep their indices.
+        """
+        if time_budget is None:
+            time_budget = self.SEARCH_TIME_BUDGET
 
-        if not is_ok:
-            raise ValueError('Failed to generate indices.')
+        indices_i7, indices_i5 = list(indices_i7), list(indices_i5)
+        length = self.index_length
 
-        # Skip indices which are already in the result
-        indices_i7 = indices_i7[len(self._result):]
-        indices_i5 = indices_i5[len(self._result):]
+        colors = encode_indices([x['index'] for x in indices_i7], length)
+        if self.mode == 'dual':
+            colors = np.hstack([colors, encode_indices(
+                [x['index'] for x in indices_i5], length)])
+
+        optimizer = PoolOptimizer(colors, depths, [
+            (x['index'], y['index']) for x, y in zip(indices_i7, indices_i5)
+        ])
+
+        # Samples follow the libraries in the result
+        offset = len(indices_i7) - self.num_samples
+        variables = []
 
-        # Add generated indices to the result
         for i, sample in enumerate(self.samples):
-            self._result.append(
-                self.create_result_dict(
-                    sample, indices_i7[i], indices_i5[i]))
+            record = offset + i
+            index_type_id = sample.index_type.pk
 
-        return self.result
+            if sample.index_type.format == 'plate':
+                pairs = self.index_registry.get_pairs(index_type_id)
+                current = self._find_position(
+                    [(x.index1, x.index2) for x in pairs],
+                    (indices_i7[record], indices_i5[record]),
+                )
+                if current is None:
+                    continue
+                optimizer.add_variable(
+                    record, (0, 1),
+                    [(x.index1['index'], x.index2['index']) for x in pairs],
+                    self.index_registry.get_pairs_colors(index_type_id),
+                    current,
+                )
+                variables.append((record, 'pair', pairs))
+                continue
+
+            for part, index_group in enumerate(['i7', 'i5']):
+                if index_group == 'i5' and self.mode == 'single':
+                    break
+
+                indices = self.index_registry.get_indices(
+                    index_type_id, index_group)
+                current = self._find_position(
+                    indices, (indices_i7, indices_i5)[part][record])
+                if current is None:
+                    continue
+
+                # Place the colors of the index I7/I5 into its read
+                index_colors = self.index_registry.get_indices_colors(
+                    index_type_id, index_group)
+                padding = np.zeros_like(index_colors)
+                if self.mode == 'dual':
+                    index_colors = np.hstack(
+                        [index_colors, padding] if part == 0
+                        else [padding, index_colors])
+
+                optimizer.add_variable(
+                    record, (part,), [(x['index'],) for x in indices],
+                    index_colors, current,
+                )
+                variables.append((record, index_group, indices))
+
+        positions = optimizer.run(
+            self.OPTIMIZER_ITERATIONS, time_budget,
+            progress=lambda x: self.report_progress(self.num_samples, x),
+        )
+
+        for (record, index_group, candidates), position in zip(
+                variables, positions):
+            if index_group == 'pair':
+                indices_i7[record] = candidates[position].index1
+                indices_i5[record] = candidates[position].index2
+            elif index_group == 'i7':
+                indices_i7[record] = candidates[position]
+            else:
+                indices_i5[record] = candidates[position]
+
+        return indices_i7, indices_i5
+
+    @staticmethod
+    def _find_position(candidates, item):
+        """ Find the position of an index (pair) among the candidates. """
+        return next((i for i, x in enumerate(candidates) if x == item), None)
+
+    def check_deadline(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise ValueError('The time budget has been exceeded.')
+
+    def report_progress(self, samples_placed, best_score):
+        if self.progress:
+            self.progress(samples_placed, best_score)
+
+    def __getstate__(self):
+        # The progress callback stays in the parent process (see search())
+        state = self.__dict__.copy()
+        state['progress'] = None
+        return state
+
+    def get_imbalance(self, indices_i7, indices_i5, depths):
+        """ Get the worst-cycle color imbalance of the generated indices. """
+        imbalance = max_imbalance(
+            encode_indices([x['index'] for x in indices_i7],
+                           self.index_length),
+            depths,
+        )
+        if self.mode == 'dual':
+            imbalance = max(imbalance, max_imbalance(
+                encode_indices([x['index'] for x in indices_i5],
+                               self.index_length),
+                depths,
+            ))
+        return imbalance
 
     def add_libraries_to_result(self):
         """ Add all libraries directly to the result. """
 
-        def idx_dict(class_model, index, index_type):
-            idx = class_model.objects.filter(
-                index=index, index_type=index_type)
-            if idx:
+        # Plate coordinates of the libraries' index pairs
+        coordinates = IndexCoordinates(
+            [x.index_type_id for x in self.libraries])
+
+        def idx_dict(index, ref, index_type, coordinate):
+            # The libraries' indices are resolved on save (see
+            # GenericLibrarySample.resolve_indices())
+            if ref:
                 idx = self.index_registry.create_index_dict(
-                    index_type.format, index_type.pk, idx[0].prefix,
-                    idx[0].number, idx[0].index, is_library=True)
+                    index_type.format, index_type.pk, ref.prefix,
+                    ref.number, ref.index, coordinate, is_library=True)
             else:
                 idx = self.index_registry.create_index_dict(
                     index=index, is_library=True)
@@ -369,12 +725,20 @@ class IndexGenerator:
         with_index = []
 
         for library in self.libraries:
-            index_i7 = idx_dict(IndexI7, library.index_i7, library.index_type)
+            coordinate = coordinates.get((
+                library.index_type_id,
+                library.index_i7_id,
+                library.index_i5_id,
+            ))
+            index_i7 = idx_dict(
+                library.index_i7, library.index_i7_ref, library.index_type,
+                coordinate)
             index_i5 = self.index_registry.create_index_dict(is_library=True)
 
             if self.mode == 'dual':
                 index_i5 = idx_dict(
-                    IndexI5, library.index_i5, library.index_type)
+                    library.index_i5, library.index_i5_ref,
+                    library.index_type, coordinate)
 
             d = self.create_result_dict(library, index_i7, index_i5)
             if d['index_i7']['prefix'] != '':
@@ -392,17 +756,17 @@ class IndexGenerator:
         """ Find random indices I7/I5 for a given sample. """
 
         if sample.index_type.format == 'single':
-            index_i7 = random.choice(
+            index_i7 = self.rng.choice(
                 self.index_registry.get_indices(sample.index_type.pk, 'i7'))
             index_i5 = self.index_registry.create_index_dict()
             if self.mode == 'dual':
-                index_i5 = random.choice(
+                index_i5 = self.rng.choice(
                     self.index_registry.get_indices(
                         sample.index_type.pk, 'i5'))
             return (index_i7, index_i5)
 
         else:
-            pair = random.choice(
+            pair = self.rng.choice(
                 self.index_registry.get_pairs(sample.index_type.pk))
             return (pair.index1, pair.index2)
 
@@ -411,19 +775,36 @@ class IndexGenerator:
         if not any(samples):
             return init_indices
 
+        distribution = ColorDistribution.from_indices(
+            [x['index'] for x in init_indices], depths, self.index_length)
+        init_state = distribution.checkpoint()
+        init_used = {x['index'] for x in init_indices}
+
         attempt = 0
 
         while attempt < self.MAX_ATTEMPTS:
+            self.check_deadline()
             indices = list(init_indices)
+            self.attempts += 1
+            used = set(init_used)
+
+            # Discard the indices accepted during the previous attempt
+            distribution.rollback(init_state)
 
             try:
                 for sample in samples:
+                    self.check_deadline()
                     index = self.find_index(
-                        sample, index_group, indices, depths)
+                        sample, index_group, used, distribution)
                     if 'index' not in index:
                         raise ValueError('Index not found.')
+                    score = index['avg_score']
                     index = index['index']
                     indices.append(index)
+                    used.add(index['index'])
+                    distribution.add(index['index'], sample.sequencing_depth)
+                    self.report_progress(
+                        len(indices) - len(init_indices), score)
             except ValueError:
                 pass
 
@@ -441,33 +822,33 @@ class IndexGenerator:
         raise ValueError(f'Could not generate indices "{index_group}" ' +
                          'for the selected samples.')
 
-    def find_index(self, sample, index_group, current_indices, depths):
+    def find_index(self, sample, index_group, indices_in_result,
+                   distribution):
         """ Helper function for find_indices(). """
-        indices_in_result = [x['index'] for x in current_indices]
         result_index = {'avg_score': 100.0}
 
-        indices = list(self.index_registry.get_indices(
-            sample.index_type.pk, index_group))
-        random.shuffle(indices)
+        indices = self.index_registry.get_indices(
+            sample.index_type.pk, index_group)
+        colors = self.index_registry.get_indices_colors(
+            sample.index_type.pk, index_group)
+
+        order = list(range(len(indices)))
+        self.rng.shuffle(order)
 
         # Ensure uniqueness
         if self.mode == 'single':
-            indices = [
-                x for x in indices
-                if x['index'] not in indices_in_result
+            order = [
+                i for i in order
+                if indices[i]['index'] not in indices_in_result
             ]
 
-        # Calculate color distribution
-        color_distribution, total_depth = self.calculate_color_distribution(
-            indices_in_result, depths, sample)
-
-        for index in indices:
-            converted_index = self.convert_index(index['index'])
-            scores = self.calculate_scores(
-                sample, converted_index, color_distribution, total_depth)
-            avg_score = sum(scores) / self.index_length
-            if avg_score < result_index['avg_score']:
-                result_index = {'avg_score': avg_score, 'index': index}
+        scores = distribution.score(colors[order], sample.sequencing_depth)
+        best = find_best(scores)
+        if best is not None:
+            result_index = {
+                'avg_score': float(scores[best]),
+                'index': indices[order[best]],
+            }
 
         return result_index
 
@@ -476,17 +857,41 @@ class IndexGenerator:
         if not any(samples):
             return init_pairs
 
+        index_length = self.index_length
+        if self.mode == 'dual':
+            index_length *= 2
+
+        distribution = ColorDistribution.from_indices(
+            [self._concat_index_pair(x) for x in init_pairs],
+            depths, index_length)
+        init_state = distribution.checkpoint()
+        init_used = {self._pair_key(x) for x in init_pairs}
+
         attempt = 0
         while attempt < self.MAX_ATTEMPTS:
+            self.check_deadline()
             pairs = list(init_pairs)
+            self.attempts += 1
+            used = set(init_used)
+
+            # Discard the pairs accepted during the previous attempt
+            distribution.rollback(init_state)
 
             try:
                 for sample in samples:
-                    pair = self.find_pair(sample, depths, pairs)
+                    self.check_deadline()
+                    pair = self.find_pair(sample, used, distribution)
                     if 'pair' not in pair:
                         raise ValueError('Pair not found.')
+                    score = pair['avg_score']
                     pair = pair['pair']
                     pairs.append(pair)
+                    used.add(self._pair_key(pair))
+                    distribution.add(
+                        self._concat_index_pair(pair),
+                        sample.sequencing_depth,
+                    )
+                    self.report_progress(len(pairs) - len(init_pairs), score)
             except ValueError:
                 pass
 
@@ -501,50 +906,37 @@ class IndexGenerator:
 
         raise ValueError(f'Could not generate pairs for the selected samples.')
 
-    def find_pair(self, sample, depths, current_pairs):
-        """ """
+    def find_pair(self, sample, pairs_in_result, distribution):
+        """ Helper function for find_pairs(). """
         result_pair = {'avg_score': 100.0}
-        pairs = list(self.index_registry.get_pairs(sample.index_type.pk))
-        random.shuffle(pairs)
+        pairs = self.index_registry.get_pairs(sample.index_type.pk)
+        colors = self.index_registry.get_pairs_colors(sample.index_type.pk)
+
+        order = list(range(len(pairs)))
+        self.rng.shuffle(order)
 
         # Ensure uniqueness
         if self.mode == 'single':
-            pairs = [
-                x for x in pairs
-                if (x.index1, x.index2) not in current_pairs
+            order = [
+                i for i in order
+                if self._pair_key(pairs[i][:2]) not in pairs_in_result
             ]
 
-        if self.mode == 'single':
-            indices_in_result = list(map(
-                lambda x: x[0]['index'], current_pairs))
-        else:
-            indices_in_result = list(map(
-                lambda x: x[0]['index'] + x[1]['index'],
-                current_pairs,
-            ))
-
-        # Calculate color distribution
-        index_length = len(indices_in_result[0])
-        color_distribution, total_depth = self.calculate_color_distribution(
-            indices_in_result, depths, sample)
-
-        for pair in pairs:
-            converted_index = self.convert_index(
-                self._concat_index_pair(pair))
-            scores = self.calculate_scores(
-                sample, converted_index, color_distribution, total_depth)
-            avg_score = sum(scores) / index_length
-            if avg_score < result_pair['avg_score']:
-                result_pair = {
-                    'avg_score': avg_score,
-                    'pair': (pair.index1, pair.index2),
-                }
+        scores = distribution.score(colors[order], sample.sequencing_depth)
+        best = find_best(scores)
+        if best is not None:
+            pair = pairs[order[best]]
+            result_pair = {
+                'avg_score': float(scores[best]),
+                'pair': (pair.index1, pair.index2),
+            }
 
         return result_pair
 
     def find_pairs_fixed(self, plate_samples):
         """ """
         result = []
+        self.attempts += 1
 
         # Group by index type
         samples_dict = OrderedDict()
@@ -561,55 +953,14 @@ class IndexGenerator:
 
         return result
 
-    def calculate_color_distribution(self, indices, sequencing_depths, sample):
-        """ """
-        total_depth = 0
-        index_length = len(indices[0])
-        color_distribution = [{'G': 0, 'R': 0} for _ in range(index_length)]
-
-        for i, index in enumerate(indices):
-            idx = self.convert_index(index)
-            for cycle in range(index_length):
-                color = idx[cycle]
-                color_distribution[cycle][color] += sequencing_depths[i]
-            total_depth += sequencing_depths[i]
-        total_depth += sample.sequencing_depth
-
-        return color_distribution, total_depth
-
-    def calculate_scores(self, current_sample, current_converted_index,
-                         current_color_distribution, total_depth):
-        """
-        Calculate the scores for a given sample.
-
-        Score is an absolute difference between the sequencing depths of
-        the two indices divided by the total sequencing depth (in %).
-
-        The ideal score is 0.0 (50% green and 50% red),
-        an acceptable score is 60.0 (80%/20% or 20%/80%).
-
-        If the score > 60%, then the indices are not compatible.
-        """
-        distribution = list(current_color_distribution)
-        result = []
-
-        for cycle in range(len(current_converted_index)):
-            color = current_converted_index[cycle]
-            distribution[cycle][color] += current_sample.sequencing_depth
-
-            if distribution[cycle]['G'] > 0 and distribution[cycle]['R'] > 0:
-                difference = abs((distribution[cycle]['G'] -
-                                  distribution[cycle]['R']) /
-                                 total_depth) * 100
-                result.append(difference)
-            else:
-                result.append(100.0)
-
-        return result
-
     def _concat_index_pair(self, pair):
-        return pair.index1['index'] + pair.index2['index'] \
-            if self.mode == 'dual' else pair.index1['index']
+        return pair[0]['index'] + pair[1]['index'] \
+            if self.mode == 'dual' else pair[0]['index']
+
+    @staticmethod
+    def _pair_key(pair):
+        """ Hashable equivalent of a pair of index dicts. """
+        return tuple(pair[0].items()), tuple(pair[1].items())
 
     @property
     def result(self):
@@ -662,3 +1013,50 @@ class IndexGenerator:
             'index_i7': index_i7,
             'index_i5': index_i5,
         }
+
+
+def run_restart(index_generator, task, seed, deadline=None):
+    """
+    Run a single seeded greedy pass of `IndexGenerator.search()`
+    which stops at `deadline` (time.time()).
+
+    Return a tuple (worst-cycle imbalance, (indices I7, indices I5))
+    or None if the pass has failed.
+    """
+    index_generator.rng = random.Random(seed)
+    index_generator.deadline = deadline
+    try:
+        indices = index_generator.generate_once(task)
+    except ValueError:
+        return None
+    finally:
+        index_generator.rng = random
+        index_generator.deadline = None
+    if indices is None:
+        return None
+    imbalance = index_generator.get_imbalance(*indices, task.depths)
+    return imbalance, indices
+
+
+def get_process_pool():
+    """
+    Get the process pool of the multi-restart search, creating it on
+    the first call. All its processes are started at once, so a worker
+    forks them only once instead of on every search.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.INDEX_GENERATOR_PROCESSES)
+            _process_pool.submit(int).result()
+        return _process_pool
+
+
+def reset_process_pool():
+    """ Drop a broken process pool, the next search creates a new one. """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False)
+            _process_pool = None
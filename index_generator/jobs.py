@@ -0,0 +1,170 @@
+import time
+import json
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import GenerationJob
+from .index_generator import (
+    IndexGenerator,
+    IndexRegistry,
+    get_process_pool,
+)
+
+Library = apps.get_model('library', 'Library')
+Sample = apps.get_model('sample', 'Sample')
+
+logger = logging.getLogger('db')
+
+# The generator is CPU-bound and the multi-restart search spawns its own
+# processes, so only a couple of jobs run at the same time
+executor = ThreadPoolExecutor(max_workers=2)
+
+JOB_RESULT_TTL = timedelta(hours=1)
+PROGRESS_INTERVAL = 0.5  # seconds between the progress updates
+HEARTBEAT_INTERVAL = 15  # seconds between the heartbeats of a running job
+
+# A pending or running job whose heartbeat (update_time) is older than this
+# is considered lost (e.g., its worker process has been restarted)
+JOB_STALE_TIMEOUT = timedelta(minutes=2)
+
+
+def job_key(params):
+    """
+    Get the key of a generation job: a hash of its parameters,
+    the index registry version and the last update time of the records
+    (so that a changed kit or sample doesn't reuse an old result).
+    """
+    update_time = max(
+        [str(x) for x in (
+            Library.objects.filter(pk__in=params['libraries']).aggregate(
+                x=Max('update_time'))['x'],
+            Sample.objects.filter(pk__in=params['samples']).aggregate(
+                x=Max('update_time'))['x'],
+        ) if x],
+        default='',
+    )
+    data = json.dumps([
+        params, IndexRegistry.get_cache_version(), update_time,
+    ], sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def fail_stale_jobs(queryset):
+    """
+    Mark the pending or running jobs of a queryset which have stopped
+    sending heartbeats as failed. Return the number of such jobs.
+    """
+    now = timezone.now()
+    return queryset.filter(
+        status__in=[GenerationJob.PENDING, GenerationJob.RUNNING],
+        update_time__lt=now - JOB_STALE_TIMEOUT,
+    ).update(
+        status=GenerationJob.FAILED,
+        message='The job has stopped responding.',
+        update_time=now,
+    )
+
+
+def submit_job(params):
+    """
+    Start generating indices in the background or reuse a job with
+    the same key (a finished one or one which is still running).
+    """
+    key = job_key(params)
+    fail_stale_jobs(GenerationJob.objects.filter(key=key))
+    job = GenerationJob.objects.filter(
+        key=key,
+        status__in=[
+            GenerationJob.PENDING, GenerationJob.RUNNING, GenerationJob.DONE],
+        create_time__gte=timezone.now() - JOB_RESULT_TTL,
+    ).order_by('-create_time').first()
+
+    if job is None:
+        job = GenerationJob.objects.create(key=key, params=params)
+        executor.submit(_run_in_thread, job.pk)
+
+    return job
+
+
+def run_job(job_id):
+    # Skip the job if it has been marked as failed while it was pending
+    if not GenerationJob.objects.filter(
+        pk=job_id, status=GenerationJob.PENDING,
+    ).update(status=GenerationJob.RUNNING, update_time=timezone.now()):
+        return
+
+    job = GenerationJob.objects.get(pk=job_id)
+    params = job.params
+    state = {
+        'samples_placed': 0,
+        'num_samples': len(params['samples']),
+        'best_score': None,
+    }
+    last_update = [0.0]
+
+    def progress(samples_placed, best_score):
+        state['samples_placed'] = samples_placed
+        state['best_score'] = round(float(best_score), 2)
+
+        now = time.monotonic()
+        if now - last_update[0] >= PROGRESS_INTERVAL:
+            last_update[0] = now
+            GenerationJob.objects.filter(pk=job_id).update(progress=state)
+
+    # Start the search processes before the heartbeat thread,
+    # so that they aren't forked while it's running
+    if params['restarts'] and settings.INDEX_GENERATOR_PROCESSES > 1:
+        get_process_pool()
+
+    # The restarts can report no progress for a long time, so a separate
+    # thread keeps the job's heartbeat going
+    stop = threading.Event()
+
+    def heartbeat():
+        try:
+            while not stop.wait(HEARTBEAT_INTERVAL):
+                GenerationJob.objects.filter(pk=job_id).update(
+                    update_time=timezone.now())
+        finally:
+            connection.close()
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+
+    try:
+        index_generator = IndexGenerator(
+            params['libraries'], params['samples'],
+            params['start_coord'], params['direction'], progress)
+        result = index_generator.generate(
+            params['restarts'], params['time_budget'],
+            optimize=params['optimize'])
+    except Exception as e:
+        logger.exception(e)
+        GenerationJob.objects.filter(pk=job_id).update(
+            status=GenerationJob.FAILED, message=str(e))
+    else:
+        GenerationJob.objects.filter(pk=job_id).update(
+            status=GenerationJob.DONE,
+            result=result,
+            progress={**state, 'samples_placed': state['num_samples']},
+        )
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Threads get their own database connections
+        connection.close()
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from index_generator.benchmark import (
+    KIT_TYPES,
+    SAMPLE_COUNTS,
+    run_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the index generator on synthetic index kits.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, nargs='+',
+                            default=SAMPLE_COUNTS, dest='samples',
+                            help='pool sizes')
+        parser.add_argument('--mode', choices=['single', 'dual'],
+                            dest='mode', help='only single or dual kits')
+        parser.add_argument('--format', choices=['single', 'plate'],
+                            dest='format', help='only tube or plate kits')
+        parser.add_argument('--index-length', choices=['6', '8'],
+                            dest='index_length', help='only 6 or 8 nt kits')
+        parser.add_argument('--seed', type=int, default=0, dest='seed',
+                            help='random seed')
+        parser.add_argument('--restarts', type=int, default=0,
+                            dest='restarts', help='multi-restart search')
+        parser.add_argument('--optimize', action='store_true',
+                            dest='optimize', help='refine the result')
+        parser.add_argument('--output', type=str, default='', dest='output',
+                            help='write the results to a JSON file')
+
+    def handle(self, *args, **options):
+        kits = [
+            x for x in KIT_TYPES
+            if options['mode'] in (None, 'dual' if x['is_dual'] else 'single')
+            and options['format'] in (None, x['format'])
+            and options['index_length'] in (None, x['index_length'])
+        ]
+
+        results = run_benchmark(
+            kits, options['samples'], options['seed'],
+            options['restarts'], options['optimize'])
+
+        for x in results:
+            score = x['worst_cycle_score']
+            self.stdout.write(
+                f"{x['mode']:6} {x['format']:6} {x['index_length']}nt "
+                f"{x['num_samples']:4} samples: {x['wall_time']:8.3f} s, "
+                f"{x['queries']:3} queries, {x['attempts']:3} attempts, " +
+                (f'worst cycle {score:6.2f}' if x['success']
+                 else f"failed ({x['message']})")
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Results are written to {options['output']}."))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('index_generator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='Create Time')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='Update Time')),
+                ('key', models.CharField(db_index=True, max_length=64, verbose_name='Key')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('params', django.contrib.postgres.fields.jsonb.JSONField(verbose_name='Parameters')),
+                ('progress', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, verbose_name='Progress')),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True, verbose_name='Result')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
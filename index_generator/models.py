@@ -2,6 +2,7 @@ import itertools
 
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.fields import JSONField
 
 from common.models import DateTimeMixin
 from library.models import Library
@@ -54,3 +55,25 @@ class Pool(DateTimeMixin):
             # Update the pool name after receiving a Pool id
             self.name = f'Pool_{self.pk}'
             self.save()
+
+
+class GenerationJob(DateTimeMixin):
+    """ Index generation running in the background (see jobs.py). """
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    key = models.CharField('Key', max_length=64, db_index=True)
+    status = models.CharField(
+        'Status', max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    params = JSONField('Parameters')
+    progress = JSONField('Progress', default=dict, blank=True)
+    result = JSONField('Result', null=True, blank=True)
+    message = models.TextField('Message', blank=True)
+
+    def __str__(self):
+        return f'{self.key} ({self.status})'
@@ -0,0 +1,125 @@
+import math
+import time
+import random
+from collections import Counter
+
+import numpy as np
+
+from .scoring import MAX_SCORE, color_distribution
+
+
+class PoolOptimizer:
+    """
+    Refine a complete index assignment of a pool with simulated annealing.
+
+    Each variable is an index (or an index pair) of a sample which can be
+    replaced with another candidate from the same kit. The per-cycle color
+    distribution of the whole pool is kept up to date, so evaluating
+    a move costs O(index_length) regardless of the pool size.
+
+    The cost of an assignment is the average per-cycle score of the pool
+    (see `scoring.score_candidates()`), the lower the better.
+    """
+
+    def __init__(self, colors, depths, keys):
+        """
+        `colors` is the color matrix of all records (one row per record,
+        indices I7 and I5 concatenated), `depths` are their sequencing
+        depths and `keys` are the record keys which must stay unique.
+        """
+        self.depths = np.asarray(depths, dtype=float)
+        self.green, self.red = color_distribution(colors, self.depths)
+        self.total_depth = self.depths.sum()
+        self.tolerance = self.total_depth * 1e-9
+        self.keys = [tuple(x) for x in keys]
+        self.variables = []
+
+    def add_variable(self, record, parts, candidates, colors, current):
+        """
+        Allow the record `record` to take any of the `candidates`.
+
+        `parts` are the positions of the record key the variable sets
+        (e.g., (0,) for an index I7 or (0, 1) for an index pair),
+        `candidates` are their keys, `colors` is the candidates' color
+        matrix and `current` is the position of the current candidate.
+        """
+        self.variables.append({
+            'record': record,
+            'parts': parts,
+            'candidates': candidates,
+            'green': (colors > 0).astype(float),
+            'red': (colors < 0).astype(float),
+            'current': current,
+        })
+
+    def cost(self, green, red):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(
+                (green > self.tolerance) & (red > self.tolerance),
+                np.abs(green - red) / self.total_depth * 100,
+                MAX_SCORE,
+            )
+        return float(scores.mean()) if len(scores) else 0.0
+
+    def run(self, iterations, time_budget=None, t_start=10.0, t_end=0.01,
+            progress=None):
+        """
+        Run the annealing and return the best found candidate position
+        for each variable (in the order they were added).
+
+        `progress` is called with the best cost every 1000 iterations.
+        """
+        best = [x['current'] for x in self.variables]
+        if not any(len(x['candidates']) > 1 for x in self.variables):
+            return best
+
+        deadline = time.monotonic() + time_budget if time_budget else None
+        used = Counter(self.keys)
+        green, red = self.green.copy(), self.red.copy()
+        cost = best_cost = self.cost(green, red)
+
+        for i in range(iterations):
+            if deadline and i % 100 == 0 and time.monotonic() > deadline:
+                break
+            if progress and i % 1000 == 0:
+                progress(best_cost)
+
+            temperature = t_start * (t_end / t_start) ** (i / iterations)
+            variable = random.choice(self.variables)
+            current = variable['current']
+            new = random.randrange(len(variable['candidates']))
+            if new == current:
+                continue
+
+            # Keep the record keys unique
+            record = variable['record']
+            key = list(self.keys[record])
+            for part, value in zip(variable['parts'],
+                                   variable['candidates'][new]):
+                key[part] = value
+            key = tuple(key)
+            if used[key]:
+                continue
+
+            depth = self.depths[record]
+            new_green = green + depth * (
+                variable['green'][new] - variable['green'][current])
+            new_red = red + depth * (
+                variable['red'][new] - variable['red'][current])
+            new_cost = self.cost(new_green, new_red)
+
+            delta = new_cost - cost
+            if delta > 0 and random.random() >= math.exp(-delta / temperature):
+                continue
+
+            used[self.keys[record]] -= 1
+            used[key] += 1
+            self.keys[record] = key
+            variable['current'] = new
+            green, red, cost = new_green, new_red, new_cost
+
+            if cost < best_cost:
+                best_cost = cost
+                best = [x['current'] for x in self.variables]
+
+        return best
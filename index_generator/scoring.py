@@ -0,0 +1,155 @@
+import numpy as np
+
+# Color channel of each nucleotide: T/G are read in the green channel (1),
+# A/C in the red channel (-1). Anything else (e.g., N) gives no signal (0)
+COLORS = np.zeros(256, dtype=np.int8)
+COLORS[[ord('G'), ord('T')]] = 1
+COLORS[[ord('A'), ord('C')]] = -1
+
+MAX_SCORE = 100.0
+
+
+def encode_indices(indices, length=None):
+    """
+    Encode index sequences as a color matrix with one row per index and
+    one column per cycle (1 - green, -1 - red, 0 - no signal).
+
+    Shorter indices are padded with 0 and longer ones are truncated
+    to `length` (the longest index by default).
+    """
+    indices = [x or '' for x in indices]
+    if length is None:
+        length = max(map(len, indices), default=0)
+
+    if all(len(x) == length for x in indices):
+        codes = np.frombuffer(
+            ''.join(indices).encode('ascii', 'replace'), dtype=np.uint8)
+        return COLORS[codes].reshape(len(indices), length)
+
+    colors = np.zeros((len(indices), length), dtype=np.int8)
+    for i, index in enumerate(indices):
+        index = index[:length].encode('ascii', 'replace')
+        colors[i, :len(index)] = COLORS[np.frombuffer(index, dtype=np.uint8)]
+    return colors
+
+
+def color_distribution(colors, depths):
+    """
+    Calculate the per-cycle color distribution of encoded indices
+    weighted by their sequencing depths.
+
+    Return a (2, length) array: green depths and red depths per cycle.
+    """
+    depths = np.asarray(depths, dtype=float)
+    return np.stack([depths @ (colors > 0), depths @ (colors < 0)])
+
+
+def score_candidates(colors, distribution, depth, total_depth):
+    """
+    Calculate the average scores of all candidate indices at once.
+
+    Score is an absolute difference between the sequencing depths of
+    the two colors divided by the total sequencing depth (in %).
+
+    The ideal score is 0.0 (50% green and 50% red),
+    an acceptable score is 60.0 (80%/20% or 20%/80%).
+
+    If one of the colors is missing in a cycle, the cycle
+    gets the maximum score of 100.0.
+
+    As in the original per-candidate loop, the depth of every scored
+    candidate stays in the distribution, i.e., each candidate is scored
+    together with all candidates before it. This favours the first
+    candidates of the (shuffled) list and keeps the generated
+    indices diverse.
+    """
+    if not len(colors):
+        return np.empty(0)
+
+    green = distribution[0] + depth * np.cumsum(colors > 0, axis=0)
+    red = distribution[1] + depth * np.cumsum(colors < 0, axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(
+            (green > 0) & (red > 0),
+            np.abs(green - red) / total_depth * 100,
+            MAX_SCORE,
+        )
+
+    return scores.mean(axis=1)
+
+
+def max_imbalance(colors, depths):
+    """
+    Get the worst per-cycle color imbalance of a pool, i.e., the maximum
+    (over all cycles) absolute difference between the sequencing depths
+    of the two colors divided by the total sequencing depth (in %).
+    """
+    depths = np.asarray(depths, dtype=float)[:len(colors)]
+    if not len(colors) or not colors.shape[1]:
+        return 0.0
+
+    green, red = color_distribution(colors, depths)
+    total_depth = depths.sum()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(
+            (green > 0) & (red > 0),
+            np.abs(green - red) / total_depth * 100,
+            MAX_SCORE,
+        )
+
+    return float(scores.max())
+
+
+def find_best(scores):
+    """
+    Return the position of the first candidate with the lowest score
+    or None if no candidate scores better than MAX_SCORE.
+    """
+    if not len(scores):
+        return None
+    best = int(np.argmin(scores))
+    return best if scores[best] < MAX_SCORE else None
+
+
+class ColorDistribution:
+    """
+    Running per-cycle color distribution (green and red sequencing depths)
+    of the indices accepted into a pool.
+
+    Adding an index costs O(index_length), so the distribution doesn't
+    have to be rebuilt from all accepted indices for every new sample.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.depths = np.zeros((2, length))
+        self.total_depth = 0.0
+
+    @classmethod
+    def from_indices(cls, indices, depths, length):
+        distribution = cls(length)
+        depths = depths[:len(indices)]
+        distribution.depths = color_distribution(
+            encode_indices(indices, length), depths)
+        distribution.total_depth = float(sum(depths))
+        return distribution
+
+    def add(self, index, depth):
+        colors = encode_indices([index], self.length)[0]
+        self.depths[0] += depth * (colors > 0)
+        self.depths[1] += depth * (colors < 0)
+        self.total_depth += depth
+
+    def checkpoint(self):
+        return self.depths.copy(), self.total_depth
+
+    def rollback(self, state):
+        depths, self.total_depth = state
+        self.depths = depths.copy()
+
+    def score(self, colors, depth):
+        """ Score candidate indices for a sample with a given depth. """
+        return score_candidates(
+            colors, self.depths, depth, self.total_depth + depth)
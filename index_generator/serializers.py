@@ -3,11 +3,12 @@ from django.apps import apps
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (
     ModelSerializer,
-    ListSerializer,
     SerializerMethodField,
     IntegerField,
 )
 
+from library_sample_shared.serializers import LibrarySampleBaseListSerializer
+
 from .models import PoolSize
 
 Request = apps.get_model('request', 'Request')
@@ -26,28 +27,13 @@ class PoolSizeSerializer(ModelSerializer):
         return f'{obj.multiplier}x{obj.size}'
 
 
-class IndexGeneratorListSerializer(ListSerializer):
-    def update(self, instance, validated_data):
-        # Maps for id->instance and id->data item.
-        object_mapping = {obj.pk: obj for obj in instance}
-        data_mapping = {item['pk']: item for item in validated_data}
-
-        # Perform updates
-        ret = []
-        for obj_id, data in data_mapping.items():
-            obj = object_mapping.get(obj_id, None)
-            if obj is not None:
-                ret.append(self.child.update(obj, data))
-        return ret
-
-
 class IndexGeneratorBaseSerializer(ModelSerializer):
     pk = IntegerField()
     record_type = SerializerMethodField()
     library_protocol_name = SerializerMethodField()
 
     class Meta:
-        list_serializer_class = IndexGeneratorListSerializer
+        list_serializer_class = LibrarySampleBaseListSerializer
         fields = ('pk', 'record_type', 'name', 'barcode', 'sequencing_depth',
                   'library_protocol_name', 'read_length', 'index_type',
                   'index_i7_id', 'index_i7', 'index_i5_id', 'index_i5',)
@@ -0,0 +1,37 @@
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .index_generator import IndexRegistry
+
+IndexI7 = apps.get_model('library_sample_shared', 'IndexI7')
+IndexI5 = apps.get_model('library_sample_shared', 'IndexI5')
+IndexPair = apps.get_model('library_sample_shared', 'IndexPair')
+IndexType = apps.get_model('library_sample_shared', 'IndexType')
+
+
+@receiver(post_save, sender=IndexI7)
+@receiver(post_save, sender=IndexI5)
+@receiver(post_save, sender=IndexPair)
+@receiver(post_save, sender=IndexType)
+@receiver(post_delete, sender=IndexI7)
+@receiver(post_delete, sender=IndexI5)
+@receiver(post_delete, sender=IndexPair)
+@receiver(post_delete, sender=IndexType)
+def invalidate_index_registry(sender, **kwargs):
+    """
+    When an index, an index pair or an index type is changed,
+    clear the cached index registry.
+    """
+    IndexRegistry.clear_cache()
+
+
+@receiver(m2m_changed, sender=IndexType.indices_i7.through)
+@receiver(m2m_changed, sender=IndexType.indices_i5.through)
+def invalidate_index_registry_m2m(sender, action, **kwargs):
+    """
+    When indices are added to or removed from an index type,
+    clear the cached index registry.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        IndexRegistry.clear_cache()
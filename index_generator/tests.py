@@ -1,7 +1,19 @@
+import io
 import json
+import time
+import random
 import string
+import tempfile
 from collections import namedtuple
+from unittest.mock import patch
 
+import numpy as np
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+
+from common.models import CacheVersion
 from common.tests import BaseTestCase
 from common.utils import get_random_name
 
@@ -17,11 +29,30 @@ from library_sample_shared.models import (
     IndexI5,
     IndexPair,
 )
+from library_sample_shared.encoding import pack_index
 from library.models import Library
 from sample.models import Sample
-
-from .models import Pool, PoolSize
-from .index_generator import IndexRegistry, IndexGenerator
+from library_preparation.models import LibraryPreparation
+
+from . import jobs
+from .models import Pool, PoolSize, GenerationJob
+from .index_generator import (
+    IndexRegistry,
+    IndexGenerator,
+    run_restart,
+    get_process_pool,
+    reset_process_pool,
+)
+from .optimizer import PoolOptimizer
+from .collisions import find_collisions
+from .scoring import (
+    ColorDistribution,
+    encode_indices,
+    color_distribution,
+    score_candidates,
+    max_imbalance,
+    find_best,
+)
 
 
 Index = namedtuple('Index', ['prefix', 'number', 'index'])
@@ -444,6 +475,44 @@ class TestIndexRegistry(BaseTestCase):
             IndexRegistry('dual', [self.index_type2], 'Z50')
         self.assertIn('No index pairs', str(context.exception))
 
+    def test_cached_registry(self):
+        IndexRegistry('dual', [self.index_type2], 'C3', 'down')
+        # only the cache version is fetched
+        with self.assertNumQueries(1):
+            index_registry = IndexRegistry(
+                'dual', [self.index_type2], 'C3', 'down')
+        self.assertEqual(len(index_registry.pairs[self.index_type2.pk]), 25)
+
+    def test_cache_invalidated_by_another_process(self):
+        IndexRegistry('single', [self.index_type1])
+        key = (self.index_type1.pk, 'single', 'A1', 'right')
+        self.assertIn(key, IndexRegistry._cache)
+
+        # the version is bumped without clearing this process's cache
+        CacheVersion.objects.update_or_create(
+            key=IndexRegistry.cache_key, defaults={'version': 'other'})
+        IndexRegistry('single', [self.index_type2])
+        self.assertNotIn(key, IndexRegistry._cache)
+        self.assertEqual(IndexRegistry._cache_version, 'other')
+
+    def test_cache_invalidation(self):
+        index_registry = IndexRegistry('single', [self.index_type1])
+        self.assertEqual(
+            len(index_registry.indices[self.index_type1.pk]['i7']), 6)
+
+        index = IndexI7(prefix='A', number='07', index='ACGTAC')
+        index.save()
+        self.index_type1.indices_i7.add(index)
+
+        index_registry = IndexRegistry('single', [self.index_type1])
+        self.assertEqual(
+            len(index_registry.indices[self.index_type1.pk]['i7']), 7)
+
+        index.delete()
+        index_registry = IndexRegistry('single', [self.index_type1])
+        self.assertEqual(
+            len(index_registry.indices[self.index_type1.pk]['i7']), 6)
+
 
 class TestIndexGenerator(BaseTestCase):
     def setUp(self):
@@ -537,6 +606,47 @@ class TestIndexGenerator(BaseTestCase):
             samples__id__in=[sample1.pk, sample2.pk]
         ).distinct().count(), 1)
 
+    def test_save_pool_bulk(self):
+        """ Ensure the number of queries doesn't depend on the pool size. """
+        def save_pool(num_samples):
+            samples = [
+                create_sample(
+                    get_random_name(),
+                    read_length=self.read_length,
+                    index_type=self.index_type1,
+                ) for _ in range(num_samples)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    '/api/index_generator/save_pool/', {
+                        'pool_size_id': self.pool_size.pk,
+                        'samples': json.dumps([{
+                            'pk': sample.pk,
+                            'index_i7': INDICES_1[i].index,
+                            'index_i5': '',
+                        } for i, sample in enumerate(samples)]),
+                    })
+            self.assertTrue(response.json()['success'])
+            return samples, len(queries)
+
+        _, num_queries = save_pool(2)
+        samples, num_queries_bulk = save_pool(6)
+        self.assertEqual(num_queries, num_queries_bulk)
+
+        for i, sample in enumerate(samples):
+            update_time = sample.update_time
+            sample.refresh_from_db()
+            self.assertEqual(sample.index_i7, INDICES_1[i].index)
+            self.assertEqual(
+                sample.index_i7_packed, pack_index(INDICES_1[i].index))
+            self.assertEqual(sample.index_i7_id, INDICES_1[i].prefix +
+                             INDICES_1[i].number)
+            self.assertGreater(sample.update_time, update_time)
+            self.assertTrue(sample.is_pooled)
+            self.assertEqual(sample.barcode[2], 'L')
+            self.assertTrue(
+                LibraryPreparation.objects.filter(sample=sample).exists())
+
     def test_one_sample_format_tube_mode_single(self):
         """ Generate index for one sample (format=tube, mode=single). """
         sample = create_sample(
@@ -678,6 +788,197 @@ class TestIndexGenerator(BaseTestCase):
         self.assertIn(data['data'][1]['index_i7_id'], index_i7_ids)
         self.assertIn(data['data'][1]['index_i5_id'], index_i5_ids)
 
+    def test_search_format_tube_mode_dual(self):
+        samples = [
+            create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            ) for _ in range(3)
+        ]
+
+        index_generator = IndexGenerator(
+            [], [x.pk for x in samples], None, None)
+        result = index_generator.generate(
+            restarts=4, time_budget=10, processes=1)
+        self.assertEqual(len(result), 3)
+
+        pairs = [(x['index_i7_id'], x['index_i5_id']) for x in result]
+        self.assertEqual(len(pairs), len(set(pairs)))
+
+    @override_settings(INDEX_GENERATOR_PROCESSES=2)
+    def test_search_processes(self):
+        samples = [
+            create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            ) for _ in range(3)
+        ]
+
+        self.addCleanup(reset_process_pool)
+        index_generator = IndexGenerator(
+            [], [x.pk for x in samples], None, None)
+        result = index_generator.generate(
+            restarts=4, time_budget=10, processes=4)
+        self.assertEqual(len(result), 3)
+
+        pairs = [(x['index_i7_id'], x['index_i5_id']) for x in result]
+        self.assertEqual(len(pairs), len(set(pairs)))
+
+        # The pool is created once and shared by the searches
+        pool = get_process_pool()
+        self.assertEqual(pool._max_workers, 2)
+        IndexGenerator([], [x.pk for x in samples], None, None).generate(
+            restarts=2, time_budget=10)
+        self.assertIs(get_process_pool(), pool)
+
+    def test_restart_seed(self):
+        samples = [
+            create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            ) for _ in range(3)
+        ]
+
+        index_generator = IndexGenerator(
+            [], [x.pk for x in samples], None, None)
+        task = index_generator.prepare_task()
+
+        # A pass has its own generator and doesn't reseed the global one
+        state = random.getstate()
+        result = run_restart(index_generator, task, 1)
+        self.assertEqual(random.getstate(), state)
+        self.assertEqual(run_restart(index_generator, task, 1), result)
+
+    def test_restart_deadline(self):
+        samples = [
+            create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            ) for _ in range(3)
+        ]
+
+        index_generator = IndexGenerator(
+            [], [x.pk for x in samples], None, None)
+        task = index_generator.prepare_task()
+        self.assertIsNotNone(run_restart(index_generator, task, 1))
+
+        # A pass which has run past its deadline stops by itself
+        self.assertIsNone(
+            run_restart(index_generator, task, 1, time.time() - 1))
+        self.assertIsNone(index_generator.deadline)
+
+    @patch.object(jobs.executor, 'submit',
+                  lambda fn, job_id: jobs.run_job(job_id))
+    def test_generation_job(self):
+        samples = [
+            create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            ) for _ in range(3)
+        ]
+        params = {
+            'samples': json.dumps([x.pk for x in samples]),
+            'job': 'true',
+        }
+
+        response = self.client.post(
+            '/api/index_generator/generate_indices/', params)
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        job_id = data['job_id']
+
+        response = self.client.get(
+            '/api/index_generator/job_status/', {'job_id': job_id})
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['status'], GenerationJob.DONE)
+        self.assertEqual(data['progress']['samples_placed'], 3)
+        self.assertEqual(len(data['data']), 3)
+
+        # The same request reuses the finished job
+        response = self.client.post(
+            '/api/index_generator/generate_indices/', params)
+        data = response.json()
+        self.assertEqual(data['job_id'], job_id)
+        self.assertEqual(data['status'], GenerationJob.DONE)
+        self.assertEqual(GenerationJob.objects.count(), 1)
+
+    @patch.object(jobs.executor, 'submit',
+                  lambda fn, job_id: jobs.run_job(job_id))
+    def test_generation_job_stale(self):
+        samples = [
+            create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            ) for _ in range(3)
+        ]
+        params = {
+            'libraries': [],
+            'samples': [x.pk for x in samples],
+            'start_coord': None,
+            'direction': None,
+            'restarts': 0,
+            'time_budget': None,
+            'optimize': False,
+        }
+
+        # A running job whose worker has stopped sending heartbeats
+        stale_job = GenerationJob.objects.create(
+            key=jobs.job_key(params), params=params,
+            status=GenerationJob.RUNNING)
+        GenerationJob.objects.filter(pk=stale_job.pk).update(
+            update_time=stale_job.update_time - jobs.JOB_STALE_TIMEOUT * 2)
+
+        # It is marked as failed instead of being reused
+        job = jobs.submit_job(params)
+        self.assertNotEqual(job.pk, stale_job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.DONE)
+
+        stale_job.refresh_from_db()
+        self.assertEqual(stale_job.status, GenerationJob.FAILED)
+        response = self.client.get(
+            '/api/index_generator/job_status/', {'job_id': stale_job.pk})
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['status'], GenerationJob.FAILED)
+
+        # A job which has been marked as failed before it started is skipped
+        pending_job = GenerationJob.objects.create(
+            key=job.key, params=params, status=GenerationJob.FAILED)
+        jobs.run_job(pending_job.pk)
+        pending_job.refresh_from_db()
+        self.assertEqual(pending_job.status, GenerationJob.FAILED)
+
+    def test_optimize_format_plate_and_tube_mode_dual(self):
+        samples = [
+            create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=index_type,
+            ) for index_type in [self.index_type2] * 3 + [self.index_type5]
+        ]
+
+        response = self.client.post('/api/index_generator/generate_indices/', {
+            'samples': json.dumps([x.pk for x in samples]),
+            'optimize': 'true',
+        })
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['data']), 4)
+
+        pairs = [(x['index_i7_id'], x['index_i5_id']) for x in data['data']]
+        self.assertEqual(len(pairs), len(set(pairs)))
+
     def test_two_samples_format_plate_mode_single(self):
         index_i7_ids = [x.index_id for x in self.index_type6.indices_i7.all()]
 
@@ -1070,6 +1371,33 @@ class TestIndexGenerator(BaseTestCase):
 
     # Test failing data
 
+    def test_check_collisions(self):
+        response = self.client.post('/api/index_generator/check_collisions/', {
+            'libraries': json.dumps([
+                {'pk': 1, 'name': 'A', 'index_i7': 'ATCACG', 'index_i5': ''},
+                {'pk': 2, 'name': 'B', 'index_i7': 'ATCAGG', 'index_i5': ''},
+            ]),
+            'samples': json.dumps([
+                {'pk': 1, 'name': 'C', 'index_i7': 'GCTAAT', 'index_i5': ''},
+            ]),
+            'min_distance': 2,
+        })
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['data']['min_distance'], 1)
+        self.assertEqual(data['data']['collisions'], [
+            {'record1': 'A', 'record2': 'B', 'distance': 1},
+        ])
+
+    def test_job_status_invalid_id(self):
+        response = self.client.get(
+            '/api/index_generator/job_status/', {'job_id': 'blah'})
+        data = response.json()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'Invalid job id.')
+
     def test_save_pool_not_unique(self):
         """ Ensure error is thrown if a pool contains non-unique indices. """
         library1 = create_library(
@@ -1322,3 +1650,118 @@ class TestIndexGenerator(BaseTestCase):
             'index_i7': {},
             'index_i5': {},
         })
+
+
+class TestColorScoring(BaseTestCase):
+    def test_encode_indices(self):
+        colors = encode_indices(['ATCACG', 'TTGG'])
+        self.assertEqual(colors.tolist(), [
+            [-1, 1, -1, -1, -1, 1],
+            [1, 1, 1, 1, 0, 0],
+        ])
+
+    def test_encode_indices_fixed_length(self):
+        colors = encode_indices(['ATCACGTT'], 6)
+        self.assertEqual(colors.shape, (1, 6))
+
+    def test_color_distribution(self):
+        distribution = color_distribution(
+            encode_indices(['TA', 'AA']), [10, 5])
+        self.assertEqual(distribution.tolist(), [[10, 0], [5, 15]])
+
+    def test_score_candidates(self):
+        distribution = color_distribution(
+            encode_indices(['ATGTGG']), [10])
+
+        # Compare with the scores calculated cycle by cycle
+        for index in ['GTAAAT', 'TACGTT', 'CGTTTA']:
+            scores = score_candidates(
+                encode_indices([index]), distribution, 10, 20)
+            converted_index = IndexGenerator.convert_index(index)
+            expected = [
+                0.0 if x != y else 100.0
+                for x, y in zip(converted_index, 'RGGGGG')
+            ]
+            self.assertAlmostEqual(scores[0], sum(expected) / 6)
+
+    def test_score_candidates_cumulative(self):
+        """
+        Ensure the depth of each scored candidate is carried over
+        to the next candidates.
+        """
+        distribution = color_distribution(
+            encode_indices(['AAAAAA']), [10])
+        scores = score_candidates(
+            encode_indices(['TTTTTT', 'TTTTTT']), distribution, 10, 20)
+        self.assertEqual(scores.tolist(), [0.0, 50.0])
+
+    def test_color_distribution_add_and_rollback(self):
+        distribution = ColorDistribution.from_indices(['TA'], [10, 5], 2)
+        state = distribution.checkpoint()
+
+        distribution.add('AA', 5)
+        self.assertEqual(distribution.depths.tolist(), [[10, 0], [5, 15]])
+        self.assertEqual(distribution.total_depth, 15)
+
+        distribution.rollback(state)
+        self.assertEqual(distribution.depths.tolist(), [[10, 0], [0, 10]])
+        self.assertEqual(distribution.total_depth, 10)
+
+    def test_max_imbalance(self):
+        colors = encode_indices(['GA', 'AA'])
+        self.assertEqual(max_imbalance(colors, [1, 1]), 100.0)
+        self.assertEqual(max_imbalance(colors, [3, 1]), 100.0)
+        colors = encode_indices(['GA', 'AG'])
+        self.assertAlmostEqual(max_imbalance(colors, [3, 1]), 50.0)
+        self.assertEqual(max_imbalance(encode_indices([]), []), 0.0)
+
+    def test_pool_optimizer(self):
+        # Two samples, the second one can take any of the candidates
+        colors = encode_indices(['GG', 'GT'])
+        optimizer = PoolOptimizer(colors, [1, 1], [('GG',), ('GT',)])
+        optimizer.add_variable(
+            1, (0,), [('GT',), ('AC',), ('GG',)],
+            encode_indices(['GT', 'AC', 'GG']), 0,
+        )
+        self.assertEqual(optimizer.run(1000), [1])
+
+    def test_find_collisions(self):
+        indices = [pack_index(x) for x in ['ACGTAC', 'ACGTTT', 'CGTACG']]
+        self.assertEqual(
+            find_collisions(indices, min_distance=3), (2, [(0, 1, 2)]))
+        self.assertEqual(find_collisions(
+            indices, min_distance=3, edit_distance=True),
+            (1, [(0, 1, 2), (0, 2, 1)]))
+        self.assertEqual(find_collisions(indices[:1] + [None]), (None, []))
+
+    def test_find_best(self):
+        self.assertEqual(find_best(np.array([50.0, 10.0, 10.0])), 1)
+        self.assertIsNone(find_best(np.array([100.0, 100.0])))
+        self.assertIsNone(find_best(np.empty(0)))
+
+
+class TestBenchmark(BaseTestCase):
+    def test_benchmark(self):
+        num_index_types = IndexType.objects.count()
+        output = tempfile.NamedTemporaryFile(suffix='.json')
+
+        call_command(
+            'benchmark_index_generator',
+            samples=[2, 24], mode='dual', format='plate', index_length='6',
+            output=output.name, stdout=io.StringIO(),
+        )
+
+        with open(output.name) as f:
+            results = json.load(f)
+        self.assertEqual([x['num_samples'] for x in results], [2, 24])
+
+        for result in results:
+            self.assertTrue(result['success'])
+            self.assertEqual(result['mode'], 'dual')
+            self.assertEqual(result['format'], 'plate')
+            self.assertGreater(result['queries'], 0)
+            self.assertGreaterEqual(result['attempts'], 1)
+            self.assertLessEqual(result['worst_cycle_score'], 100.0)
+
+        # All synthetic objects are rolled back
+        self.assertEqual(IndexType.objects.count(), num_index_types)
@@ -3,6 +3,7 @@ import logging
 import itertools
 
 from django.apps import apps
+from django.db import transaction
 from django.db.models import Prefetch, Q
 
 from rest_framework import viewsets
@@ -11,9 +12,13 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser
 
 from common.mixins import LibrarySampleMultiEditMixin
+from common.utils import get_barcode_key
+from library_sample_shared.utils import bulk_update_records
 
-from .models import Pool, PoolSize
+from .models import Pool, PoolSize, GenerationJob
 from .index_generator import IndexGenerator
+from .jobs import submit_job, fail_stale_jobs
+from .collisions import pack_records, get_pool_records, check_records
 # from .forms import LibraryResetForm, SampleResetForm
 from .serializers import (
     PoolSizeSerializer,
@@ -84,26 +89,26 @@ class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
 
         libraries_qs = Library.objects.select_related(
             'library_protocol', 'read_length', 'index_type',
-        ).prefetch_related(
-            'index_type__indices_i7', 'index_type__indices_i5',
+            'index_i7_ref', 'index_i5_ref',
         ).filter(
             Q(is_pooled=False) & Q(index_i7__isnull=False) &
             (Q(status=2) | Q(status=-2))
         ).only('id', 'name', 'barcode', 'index_i7', 'index_i5',
                'sequencing_depth', 'library_protocol__name',
                'read_length__id', 'index_type__id', 'index_type__format',
-               'index_type__indices_i7', 'index_type__indices_i5',)
+               'index_i7_ref__prefix', 'index_i7_ref__number',
+               'index_i5_ref__prefix', 'index_i5_ref__number',)
 
         samples_qs = Sample.objects.select_related(
             'library_protocol', 'read_length', 'index_type',
-        ).prefetch_related(
-            'index_type__indices_i7', 'index_type__indices_i5',
+            'index_i7_ref', 'index_i5_ref',
         ).filter(
             Q(is_pooled=False) & (Q(status=2) | Q(status=-2))
         ).only('id', 'name', 'barcode', 'index_i7', 'index_i5',
                'sequencing_depth', 'library_protocol__name',
                'read_length__id', 'index_type__id', 'index_type__format',
-               'index_type__indices_i7', 'index_type__indices_i5',)
+               'index_i7_ref__prefix', 'index_i7_ref__number',
+               'index_i5_ref__prefix', 'index_i5_ref__number',)
 
         queryset = Request.objects.prefetch_related(
             Prefetch('libraries', queryset=libraries_qs),
@@ -112,7 +117,8 @@ class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
 
         serializer = IndexGeneratorSerializer(queryset, many=True)
         data = list(itertools.chain(*serializer.data))
-        data = sorted(data, key=lambda x: x['barcode'][3:])
+        data = sorted(
+            data, key=lambda x: get_barcode_key(x['barcode']) or 0)
         return Response(data)
 
     @action(methods=['post'], detail=False)
@@ -124,9 +130,79 @@ class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
         direction = request.data.get('direction', None)
 
         try:
+            # Optional multi-restart search (see IndexGenerator.search())
+            restarts = int(request.data.get('restarts', 0) or 0)
+            time_budget = request.data.get('time_budget', None)
+            time_budget = float(time_budget) if time_budget else None
+
+            # Optional refinement (see IndexGenerator.optimize())
+            optimize = json.loads(request.data.get('optimize', 'false'))
+
+            # Optionally run in the background (see jobs.py)
+            if json.loads(request.data.get('job', 'false')):
+                job = submit_job({
+                    'libraries': sorted(libraries),
+                    'samples': sorted(samples),
+                    'start_coord': start_coord,
+                    'direction': direction,
+                    'restarts': restarts,
+                    'time_budget': time_budget,
+                    'optimize': bool(optimize),
+                })
+                return Response({
+                    'success': True,
+                    'job_id': job.pk,
+                    'status': job.status,
+                })
+
             index_generator = IndexGenerator(
                 libraries, samples, start_coord, direction)
-            data = index_generator.generate()
+            data = index_generator.generate(
+                restarts, time_budget, optimize=optimize)
+        except Exception as e:
+            return Response({'success': False, 'message': str(e)}, 400)
+        return Response({'success': True, 'data': data})
+
+    @action(methods=['get'], detail=False)
+    def job_status(self, request):
+        """ Get the progress and the result of a generation job. """
+        try:
+            job = GenerationJob.objects.get(pk=request.query_params['job_id'])
+        except (KeyError, ValueError, GenerationJob.DoesNotExist):
+            return Response({
+                'success': False,
+                'message': 'Invalid job id.',
+            }, 400)
+
+        if fail_stale_jobs(GenerationJob.objects.filter(pk=job.pk)):
+            job.refresh_from_db()
+
+        return Response({
+            'success': job.status != GenerationJob.FAILED,
+            'status': job.status,
+            'progress': job.progress,
+            'data': job.result,
+            'message': job.message,
+        })
+
+    @action(methods=['post'], detail=False)
+    def check_collisions(self, request):
+        """
+        Calculate the minimum pairwise distance between the indices of
+        given libraries and samples (or of the records in given pools)
+        and find the records which are closer than `min_distance`.
+        """
+        libraries = json.loads(request.data.get('libraries', '[]'))
+        samples = json.loads(request.data.get('samples', '[]'))
+        pool_ids = json.loads(request.data.get('pools', '[]'))
+        edit_distance = json.loads(request.data.get('edit_distance', 'false'))
+
+        try:
+            min_distance = int(request.data.get('min_distance', 3))
+            records = pack_records(libraries + samples)
+            pool_records = get_pool_records(pool_ids)
+            records += list(itertools.chain(*pool_records.values()))
+            data = check_records(records, min_distance, edit_distance)
         except Exception as e:
             return Response({'success': False, 'message': str(e)}, 400)
         return Response({'success': True, 'data': data})
@@ -137,6 +213,9 @@ class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
         Create a pool after generating indices, add libraries and "converted"
         samples to it, update the pool size, and create a Library Preparation
         object and a Pooling object for each added library/sample.
+
+        All records are validated first, the pool is created in a single
+        transaction.
         """
         pool_size_id = request.data.get('pool_size_id', None)
         libraries = json.loads(request.data.get('libraries', '[]'))
@@ -151,9 +230,6 @@ class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
             except (ValueError, PoolSize.DoesNotExist):
                 raise ValueError('Invalid Pool Size id.')
 
-            pool = Pool(user=request.user, size=pool_size)
-            pool.save()
-
             library_ids = [x['pk'] for x in libraries]
             sample_ids = [x['pk'] for x in samples]
 
@@ -163,34 +239,44 @@ class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
             if len(pairs) != len(set(pairs)):
                 raise ValueError('Some of the indices are not unique.')
 
-            try:
-                for s in samples:
-                    sample = Sample.objects.get(pk=s['pk'])
-                    dual = sample.index_type.is_dual
-                    index_i7 = s['index_i7']
-                    index_i5 = s['index_i5']
+            sample_objects = Sample.objects.filter(
+                pk__in=sample_ids).select_related('index_type').in_bulk()
 
-                    if index_i7 == '':
-                        raise ValueError(
-                            f'Index I7 is not set for "{sample.name}".')
+            for s in samples:
+                sample = sample_objects.get(s['pk'])
+                if sample is None:
+                    raise ValueError(f'Sample with id "{s["pk"]}" not found.')
 
-                    if dual and index_i5 == '':
-                        raise ValueError(
-                            f'Index I5 is not set for "{sample.name}".')
+                dual = sample.index_type.is_dual
+                index_i7 = s['index_i7']
+                index_i5 = s['index_i5']
 
-                    # Update sample fields
-                    sample.index_i7 = index_i7
-                    sample.index_i5 = index_i5
-                    sample.save(update_fields=['index_i7', 'index_i5'])
+                if index_i7 == '':
+                    raise ValueError(
+                        f'Index I7 is not set for "{sample.name}".')
 
-            except ValueError as e:
-                pool.delete()
-                raise e
+                if dual and index_i5 == '':
+                    raise ValueError(
+                        f'Index I5 is not set for "{sample.name}".')
+
+                sample.index_i7 = index_i7
+                sample.index_i5 = index_i5
+
+            with transaction.atomic():
+                pool = Pool(user=request.user, size=pool_size)
+                pool.save()
+
+                # Update the indices of all samples at once (with the
+                # packed indices and the index references)
+                bulk_update_records(
+                    list(sample_objects.values()), ['index_i7', 'index_i5'])
+
+                # Library Preparation and Pooling objects are created
+                # in bulk by the m2m_changed signals
+                pool.libraries.add(*library_ids)
+                pool.samples.add(*sample_ids)
 
         except Exception as e:
             return Response({'success': False, 'message': str(e)}, 400)
 
-        pool.libraries.add(*library_ids)
-        pool.samples.add(*sample_ids)
-
         return Response({'success': True})
@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from .models import (
     InvoicingReport,
+    InvoicingSnapshot,
     FixedCosts,
     LibraryPreparationCosts,
     SequencingCosts,
@@ -13,6 +14,12 @@ class InvoicingReportAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(InvoicingSnapshot)
+class InvoicingSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'update_time',)
+    exclude = ('data',)
+
+
 @admin.register(FixedCosts)
 class FixedCostsAdmin(admin.ModelAdmin):
     list_display = ('sequencer', 'price_amount',)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class InvoiceConfig(AppConfig):
     name = 'invoicing'
+
+    def ready(self):
+        import invoicing.signals
@@ -0,0 +1,260 @@
+import logging
+from decimal import Decimal
+from functools import reduce
+from collections import defaultdict
+
+from django.apps import apps
+from django.db.models import Q, Count, Sum, Min
+
+from common.utils import ProcessCache
+
+from .models import FixedCosts, LibraryPreparationCosts, SequencingCosts
+
+Library = apps.get_model('library', 'Library')
+Sample = apps.get_model('sample', 'Sample')
+Pool = apps.get_model('index_generator', 'Pool')
+Lane = apps.get_model('flowcell', 'Lane')
+
+logger = logging.getLogger('db')
+
+
+class PriceCatalog(ProcessCache):
+    """
+    Look up the prices of the sequencers, the (sequencer, read length)
+    pairs and the library protocols, e.g.,
+    PriceCatalog().sequencing.get((sequencer_id, read_length_id), 0).
+
+    The cost tables are fetched once and cached in the process until
+    a cost is changed (see signals.py).
+    """
+
+    cache_key = 'invoicing.prices'
+    _cache = {}
+
+    def __init__(self):
+        self.check_cache_version()
+
+        if not self._cache:
+            fixed = dict(FixedCosts.objects.values_list('sequencer', 'price'))
+
+            preparation = {}
+            quality_control = None
+            for library_protocol, name, price in \
+                    LibraryPreparationCosts.objects.values_list(
+                        'library_protocol', 'library_protocol__name',
+                        'price'):
+                preparation[library_protocol] = price
+                if name == 'Quality Control':
+                    quality_control = price
+
+            sequencing = {
+                (sequencer, read_length): price
+                for sequencer, read_length, price in
+                SequencingCosts.objects.values_list(
+                    'sequencer', 'read_length', 'price')
+            }
+
+            self._cache.update({
+                'fixed': fixed,
+                'preparation': preparation,
+                'sequencing': sequencing,
+                'quality_control': quality_control,
+            })
+
+        self.version = self._cache_version
+        self.fixed = self._cache['fixed']
+        self.preparation = self._cache['preparation']
+        self.sequencing = self._cache['sequencing']
+        self.quality_control = self._cache['quality_control']
+
+
+class InvoicingEngine:
+    """
+    Compute the invoicing of given requests with a fixed number of
+    aggregate queries:
+
+    - the number of lanes per (flowcell, pool),
+    - the sequencing depth per pool and per (pool, request),
+    - the read lengths, library protocols and numbers of the requests'
+      libraries and samples,
+    - the prices (cached, see PriceCatalog).
+
+    The costs are then calculated over these in-memory tables, regardless
+    of how many requests, flowcells and pools there are.
+
+    The requests must have their flowcells (with the sequencers) prefetched.
+    """
+
+    def __init__(self, requests):
+        request_ids = [x.pk for x in requests]
+        flowcell_ids = {
+            flowcell.pk
+            for request in requests
+            for flowcell in request.flowcell.all()
+        }
+
+        # flowcell id -> {pool id: number of lanes}
+        self.lanes = defaultdict(dict)
+        lanes = Lane.objects.filter(
+            flowcell__in=flowcell_ids,
+        ).values('flowcell', 'pools').annotate(count=Count('pk'))
+        for x in lanes:
+            if x['pools'] is not None:
+                self.lanes[x['flowcell']][x['pools']] = x['count']
+
+        pool_ids = {pool for x in self.lanes.values() for pool in x}
+        self.pool_names = dict(Pool.objects.filter(
+            pk__in=pool_ids).values_list('pk', 'name'))
+
+        self.pool_depth = defaultdict(float)     # pool -> depth
+        self.depth = defaultdict(float)          # (pool, request) -> depth
+        self.read_lengths = {}                   # (pool, request) -> id
+        self.request_pools = defaultdict(set)    # request -> pools
+
+        # Libraries go first: the read length of a request's pool is taken
+        # from its first library or, if there are none, its first sample
+        for model in [Library, Sample]:
+            totals = model.objects.filter(
+                pool__in=pool_ids,
+            ).order_by().values('pool').annotate(
+                depth=Sum('sequencing_depth'))
+            for x in totals:
+                self.pool_depth[x['pool']] += x['depth'] or 0
+
+            depths = model.objects.filter(
+                pool__in=pool_ids,
+                request__in=request_ids,
+            ).values('pool', 'request', 'read_length').annotate(
+                depth=Sum('sequencing_depth'),
+                first_id=Min('pk'),
+            ).order_by('first_id')
+            for x in depths:
+                key = (x['pool'], x['request'])
+                self.depth[key] += x['depth'] or 0
+                self.read_lengths.setdefault(key, x['read_length'])
+                self.request_pools[x['request']].add(x['pool'])
+
+        # request -> the read lengths, library protocols and the numbers
+        # of the pooled libraries and samples
+        self.records = defaultdict(lambda: {
+            'read_lengths': set(),
+            'library_protocols': set(),
+            'libraries': 0,
+            'samples': 0,
+        })
+        for model, key, filters in [
+            (Library, 'libraries', ~Q(pool=None)),
+            (Sample, 'samples', ~Q(pool=None) & ~Q(status=-1)),
+        ]:
+            records = model.objects.filter(
+                filters,
+                request__in=request_ids,
+            ).values('request', 'read_length', 'library_protocol').annotate(
+                count=Count('pk', distinct=True))
+            for x in records:
+                item = self.records[x['request']]
+                item['read_lengths'].add(x['read_length'])
+                item['library_protocols'].add(x['library_protocol'])
+                item[key] += x['count']
+
+        self.prices = PriceCatalog()
+
+    def get_pools(self, request):
+        """
+        Get the ids of the pools which contain the request's libraries or
+        samples and are loaded on the request's flowcells.
+        """
+        flowcell_pools = {
+            pool
+            for flowcell in request.flowcell.all()
+            for pool in self.lanes[flowcell.pk]
+        }
+        return sorted(self.request_pools[request.pk] & flowcell_pools)
+
+    def get_pool_names(self, request):
+        return [self.pool_names[x] for x in self.get_pools(request)]
+
+    def get_percentage(self, request):
+        """
+        Get the request's share of each pool on each flowcell
+        ('<share of the pool's depth>*<number of lanes>').
+        """
+        pools = self.get_pools(request)
+        data = []
+
+        for flowcell in request.flowcell.all():
+            count = self.lanes[flowcell.pk]
+            flowcell_dict = {
+                'flowcell_id': flowcell.flowcell_id,
+                'sequencer': flowcell.sequencer_id,
+                'pools': [],
+            }
+
+            for pool in pools:
+                if pool not in count:
+                    continue
+
+                depth = self.depth[pool, request.pk]
+                total_depth = self.pool_depth[pool]
+                percentage = round(depth / total_depth, 2) \
+                    if total_depth else 0
+                if percentage == 1.0:
+                    percentage = 1
+
+                flowcell_dict['pools'].append({
+                    'name': self.pool_names[pool],
+                    'read_length': self.read_lengths[pool, request.pk],
+                    'percentage': f'{percentage}*{count[pool]}',
+                })
+            data.append(flowcell_dict)
+
+        return data
+
+    def get_read_lengths(self, request):
+        return self.records[request.pk]['read_lengths']
+
+    def get_num_libraries_samples(self, request):
+        records = self.records[request.pk]
+        if records['libraries'] > 0:
+            return f"{records['libraries']} libraries"
+        else:
+            return f"{records['samples']} samples"
+
+    def get_library_protocol(self, request):
+        protocols = set(self.records[request.pk]['library_protocols'])
+        return protocols.pop() if protocols else ''
+
+    def get_costs(self, percentage, library_protocol, num_libraries_samples):
+        """
+        Calculate the fixed, sequencing and preparation costs
+        (see get_percentage() and get_num_libraries_samples()).
+        """
+        fixed_costs = 0
+        sequencing_costs = 0
+        for flowcell in percentage:
+            for pool in flowcell['pools']:
+                share = reduce(lambda x, y: Decimal(x) * Decimal(y),
+                               pool['percentage'].split('*'))
+                fixed_costs += \
+                    self.prices.fixed.get(flowcell['sequencer'], 0) * share
+                key = (flowcell['sequencer'], pool['read_length'])
+                sequencing_costs += self.prices.sequencing.get(key, 0) * share
+
+        preparation_costs = 0
+        count, record_type = num_libraries_samples.split(' ')
+        if record_type == 'samples':
+            preparation_costs = \
+                self.prices.preparation.get(library_protocol, 0) * \
+                Decimal(count)
+        elif self.prices.quality_control is not None:
+            preparation_costs = Decimal(count) * self.prices.quality_control
+        else:
+            logger.error('Preparation Cost for libraries is not set.')
+
+        return {
+            'fixed_costs': fixed_costs,
+            'sequencing_costs': sequencing_costs,
+            'preparation_costs': preparation_costs,
+            'variable_costs': sequencing_costs + preparation_costs,
+            'total_costs': fixed_costs + sequencing_costs + preparation_costs,
+        }
@@ -0,0 +1,39 @@
+import datetime
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from invoicing.utils import update_invoice
+
+Flowcell = apps.get_model('flowcell', 'Flowcell')
+
+
+class Command(BaseCommand):
+    help = 'Compute the invoicing snapshots of the closed months.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, dest='year',
+                            help='only the months of a year')
+        parser.add_argument('--month', type=int, dest='month',
+                            help='only a month (1-12)')
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+
+        months = sorted({
+            (dt.year, dt.month)
+            for dt in Flowcell.objects.datetimes('create_time', 'month')
+        })
+        months = [
+            (year, month) for year, month in months
+            if (year, month) < (today.year, today.month)
+            and options['year'] in (None, year)
+            and options['month'] in (None, month)
+        ]
+
+        for year, month in months:
+            data = update_invoice(year, month)
+            self.stdout.write(f'{year}-{month:02d}: {len(data)} requests')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(months)} snapshot(s) updated.'))
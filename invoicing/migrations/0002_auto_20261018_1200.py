@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import month.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoicingSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='Create Time')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='Update Time')),
+                ('month', month.models.MonthField(unique=True, verbose_name='Month')),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField(default=list, verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Invoicing Snapshot',
+                'verbose_name_plural': 'Invoicing Snapshots',
+                'ordering': ['-month'],
+            },
+        ),
+    ]
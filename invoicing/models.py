@@ -1,6 +1,7 @@
 import calendar
 
 from django.db import models
+from django.contrib.postgres.fields import JSONField
 from month.models import MonthField
 
 from common.models import DateTimeMixin
@@ -24,6 +25,23 @@ class InvoicingReport(DateTimeMixin):
         return f'{calendar.month_name[self.month.month]} {self.month.year}'
 
 
+class InvoicingSnapshot(DateTimeMixin):
+    """
+    Invoicing of a closed month, as returned by InvoicingViewSet.list()
+    (see invoicing.utils.get_invoice()).
+    """
+    month = MonthField('Month', unique=True)
+    data = JSONField('Data', default=list)
+
+    class Meta:
+        verbose_name = 'Invoicing Snapshot'
+        verbose_name_plural = 'Invoicing Snapshots'
+        ordering = ['-month']
+
+    def __str__(self):
+        return f'{calendar.month_name[self.month.month]} {self.month.year}'
+
+
 class FixedCosts(models.Model):
     sequencer = models.OneToOneField(Sequencer)
     price = models.DecimalField(max_digits=8, decimal_places=2)
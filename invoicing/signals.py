@@ -0,0 +1,193 @@
+from django.apps import apps
+from django.db.models.signals import (
+    post_save,
+    post_delete,
+    pre_delete,
+    m2m_changed,
+)
+from django.dispatch import receiver
+from django.db.models import Q
+
+from common.signals import post_bulk_update
+
+from .models import (
+    InvoicingSnapshot,
+    FixedCosts,
+    LibraryPreparationCosts,
+    SequencingCosts,
+)
+from .engine import PriceCatalog
+from .utils import invalidate_invoices, invalidate_flowcell_invoices
+
+Flowcell = apps.get_model('flowcell', 'Flowcell')
+Lane = apps.get_model('flowcell', 'Lane')
+Pool = apps.get_model('index_generator', 'Pool')
+Request = apps.get_model('request', 'Request')
+Library = apps.get_model('library', 'Library')
+Sample = apps.get_model('sample', 'Sample')
+
+M2M_ACTIONS = ('post_add', 'post_remove', 'pre_clear')
+
+# The fields of libraries and samples the invoicing is computed from
+RECORD_FIELDS = {'sequencing_depth', 'read_length', 'library_protocol',
+                 'status'}
+
+
+@receiver(post_save, sender=Flowcell)
+@receiver(post_delete, sender=Flowcell)
+def invalidate_flowcell(sender, instance, **kwargs):
+    """ When a flowcell is changed, delete the snapshot of its month. """
+    invalidate_invoices([instance.create_time])
+
+
+@receiver(m2m_changed, sender=Flowcell.lanes.through)
+@receiver(m2m_changed, sender=Flowcell.requests.through)
+def invalidate_flowcell_m2m(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    """
+    When lanes or requests are added to or removed from a flowcell,
+    delete the snapshot of its month.
+    """
+    if action not in M2M_ACTIONS:
+        return
+
+    if not reverse:
+        invalidate_invoices([instance.create_time])
+    elif pk_set:
+        invalidate_flowcell_invoices(Flowcell.objects.filter(pk__in=pk_set))
+    else:
+        invalidate_flowcell_invoices(instance.flowcell.all())
+
+
+@receiver(post_save, sender=Lane)
+@receiver(pre_delete, sender=Lane)
+def invalidate_lane(sender, instance, **kwargs):
+    """
+    When a lane is changed, delete the snapshots of its flowcells' months.
+    """
+    invalidate_flowcell_invoices(instance.flowcell.all())
+
+
+@receiver(post_save, sender=Pool)
+@receiver(pre_delete, sender=Pool)
+def invalidate_pool(sender, instance, **kwargs):
+    """
+    When a pool is changed, delete the snapshots of the months
+    it was sequenced in.
+    """
+    invalidate_flowcell_invoices(
+        Flowcell.objects.filter(lanes__pools=instance))
+
+
+@receiver(m2m_changed, sender=Pool.libraries.through)
+@receiver(m2m_changed, sender=Pool.samples.through)
+def invalidate_pool_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    When libraries or samples are added to or removed from a pool,
+    delete the snapshots of the months it was sequenced in.
+    """
+    if action not in M2M_ACTIONS:
+        return
+
+    if not reverse:
+        flowcells = Flowcell.objects.filter(lanes__pools=instance)
+    elif pk_set:
+        flowcells = Flowcell.objects.filter(lanes__pools__in=pk_set)
+    else:
+        flowcells = Flowcell.objects.filter(
+            lanes__pools__in=instance.pool.all())
+    invalidate_flowcell_invoices(flowcells)
+
+
+def invalidate_record_invoices(model, pks):
+    """
+    Delete the snapshots of the months of given libraries' or samples'
+    requests and pools.
+    """
+    relation = 'libraries' if model is Library else 'samples'
+    invalidate_flowcell_invoices(Flowcell.objects.filter(
+        Q(**{f'requests__{relation}__in': pks}) |
+        Q(**{f'lanes__pools__{relation}__in': pks})
+    ))
+
+
+@receiver(post_save, sender=Library)
+@receiver(post_save, sender=Sample)
+@receiver(pre_delete, sender=Library)
+@receiver(pre_delete, sender=Sample)
+def invalidate_record(sender, instance, update_fields=None, **kwargs):
+    """
+    When a library or a sample is changed, delete the snapshots of
+    the months it was sequenced in.
+    """
+    if kwargs.get('created') or \
+            update_fields and not RECORD_FIELDS & set(update_fields):
+        return
+    invalidate_record_invoices(sender, [instance.pk])
+
+
+@receiver(post_bulk_update, sender=Library)
+@receiver(post_bulk_update, sender=Sample)
+def invalidate_records(sender, objects, fields, **kwargs):
+    """
+    When libraries or samples are saved in bulk (see
+    common.utils.bulk_update()), delete the snapshots of the months
+    they were sequenced in.
+    """
+    if RECORD_FIELDS & set(fields):
+        invalidate_record_invoices(sender, [x.pk for x in objects])
+
+
+@receiver(post_save, sender=Request)
+@receiver(pre_delete, sender=Request)
+def invalidate_request(sender, instance, **kwargs):
+    """
+    When a request is changed (e.g., its cost unit or whether it is
+    sequenced), delete the snapshots of its flowcells' months.
+    """
+    if not kwargs.get('created'):
+        invalidate_flowcell_invoices(instance.flowcell.all())
+
+
+@receiver(post_bulk_update, sender=Request)
+def invalidate_requests(sender, objects, **kwargs):
+    """
+    When requests are saved in bulk (see common.utils.bulk_update()),
+    delete the snapshots of their flowcells' months.
+    """
+    invalidate_flowcell_invoices(Flowcell.objects.filter(
+        requests__in=[x.pk for x in objects]))
+
+
+@receiver(post_save, sender=FixedCosts)
+@receiver(post_delete, sender=FixedCosts)
+@receiver(post_save, sender=LibraryPreparationCosts)
+@receiver(post_delete, sender=LibraryPreparationCosts)
+@receiver(post_save, sender=SequencingCosts)
+@receiver(post_delete, sender=SequencingCosts)
+def invalidate_price_catalog(sender, **kwargs):
+    """ When a cost is changed, clear the cached price catalog. """
+    PriceCatalog.clear_cache()
+
+
+@receiver(post_save, sender=FixedCosts)
+@receiver(post_delete, sender=FixedCosts)
+@receiver(post_save, sender=SequencingCosts)
+@receiver(post_delete, sender=SequencingCosts)
+def invalidate_sequencer_costs(sender, instance, **kwargs):
+    """
+    When a sequencer's price is changed, delete the snapshots of the months
+    the sequencer was used in.
+    """
+    invalidate_flowcell_invoices(
+        Flowcell.objects.filter(sequencer=instance.sequencer_id))
+
+
+@receiver(post_save, sender=LibraryPreparationCosts)
+@receiver(post_delete, sender=LibraryPreparationCosts)
+def invalidate_preparation_costs(sender, instance, **kwargs):
+    """
+    When a library preparation price is changed, delete all snapshots
+    (the price of quality control applies to all libraries).
+    """
+    InvoicingSnapshot.objects.all().delete()
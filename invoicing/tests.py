@@ -2,6 +2,8 @@ import json
 import pytz
 from datetime import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.core.urlresolvers import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework import status
@@ -9,15 +11,21 @@ from rest_framework import status
 from month import Month
 
 from common.tests import BaseTestCase, BaseAPITestCase
-from common.utils import get_random_name
+from common.utils import get_random_name, bulk_update
 from library_sample_shared.tests import (
     create_read_length,
     create_library_protocol,
 )
-from flowcell.tests import create_sequencer, create_flowcell
+from flowcell.tests import create_sequencer, create_flowcell, create_lane
+from index_generator.tests import create_pool
+from library.models import Library
+from library.tests import create_library
+from request.tests import create_request
 
+from .engine import PriceCatalog
 from .models import (
     InvoicingReport,
+    InvoicingSnapshot,
     FixedCosts,
     LibraryPreparationCosts,
     SequencingCosts,
@@ -96,6 +104,30 @@ class TestSequencingCostsModel(BaseTestCase):
         self.assertEqual(self.cost.price_amount, f'{self.cost.price} €')
 
 
+class TestPriceCatalog(BaseTestCase):
+    def setUp(self):
+        self.sequencer = create_sequencer(get_random_name())
+        self.read_length = create_read_length(get_random_name())
+        self.cost = create_sequencing_cost(
+            self.sequencer, self.read_length, 10)
+
+    def test_prices(self):
+        key = (self.sequencer.pk, self.read_length.pk)
+        catalog = PriceCatalog()
+        self.assertEqual(catalog.sequencing[key], 10)
+
+        # The prices are cached until a cost is changed (only the cache
+        # version is fetched)
+        with self.assertNumQueries(1):
+            PriceCatalog()
+
+        self.cost.price = 20
+        self.cost.save()
+        new_catalog = PriceCatalog()
+        self.assertNotEqual(new_catalog.version, catalog.version)
+        self.assertEqual(new_catalog.sequencing[key], 20)
+
+
 # Views
 
 class TestFixedCostsViewSet(BaseAPITestCase):
@@ -243,6 +275,26 @@ class TestInvoicingViewSet(BaseAPITestCase):
             {'name': 'December 2017', 'value': [2017, 12], 'report_url': ''},
         ])
 
+    def test_billing_periods_report_url(self):
+        sequencer = create_sequencer(get_random_name())
+        flowcell = create_flowcell(get_random_name(), sequencer)
+        flowcell.create_time = datetime(2017, 10, 1, 0, 0, 0, tzinfo=pytz.UTC)
+        flowcell.save()
+        self.client.get(reverse('invoicing-billing-periods'))
+
+        # A new report is listed right away
+        report = InvoicingReport(
+            month=Month(2017, 10),
+            report=SimpleUploadedFile('file.txt', b'content'),
+        )
+        report.save()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('invoicing-billing-periods'))
+        self.assertLessEqual(len(context.captured_queries), 4)
+        self.assertTrue(response.data[0]['report_url'].endswith(
+            report.report.name))
+
     def test_report_upload(self):
         month = datetime.now().strftime('%Y-%m')
         response = self.client.post(reverse('invoicing-upload'), {
@@ -252,3 +304,249 @@ class TestInvoicingViewSet(BaseAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(
             InvoicingReport.objects.filter(month=month).count(), 1)
+
+    def _create_sequenced_request(self, sequencer, read_length):
+        """ Create a request whose library shares a pool with another one. """
+        user = self.create_user(email=f'{get_random_name()}@test.io')
+        request = create_request(user)
+        request.sequenced = True
+        request.save()
+
+        library1 = create_library(get_random_name(), read_length=read_length)
+        library2 = create_library(get_random_name(), read_length=read_length)
+        request.libraries.add(library1)
+
+        pool = create_pool(user)
+        pool.libraries.add(library1, library2)
+
+        flowcell = create_flowcell(get_random_name(), sequencer)
+        flowcell.lanes.add(create_lane('Lane 1', pool),
+                           create_lane('Lane 2', pool))
+        flowcell.requests.add(request)
+        return request
+
+    def test_invoicing_list(self):
+        sequencer = create_sequencer(get_random_name())
+        read_length = create_read_length(get_random_name())
+        create_fixed_cost(sequencer, 10)
+        create_sequencing_cost(sequencer, read_length, 100)
+        request = self._create_sequenced_request(sequencer, read_length)
+
+        response = self.client.get(reverse('invoicing-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        item = [x for x in data if x['request'] == request.name][0]
+        self.assertEqual(item['percentage'][0]['pools'][0]['percentage'],
+                         '0.5*2')
+        self.assertEqual(item['num_libraries_samples'], '1 libraries')
+        self.assertEqual(float(item['fixed_costs']), 10)
+        self.assertEqual(float(item['sequencing_costs']), 100)
+
+    def test_invoicing_list_constant_queries(self):
+        sequencer = create_sequencer(get_random_name())
+        read_length = create_read_length(get_random_name())
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('invoicing-list'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(context.captured_queries)
+
+        self._create_sequenced_request(sequencer, read_length)
+        count_queries()  # fill the price catalog
+        num_queries = count_queries()
+
+        for _ in range(3):
+            self._create_sequenced_request(sequencer, read_length)
+        self.assertEqual(count_queries(), num_queries)
+
+    def test_invoicing_snapshot(self):
+        sequencer = create_sequencer(get_random_name())
+        read_length = create_read_length(get_random_name())
+        fixed_cost = create_fixed_cost(sequencer, 10)
+        request = self._create_sequenced_request(sequencer, read_length)
+
+        flowcell = request.flowcell.first()
+        flowcell.create_time = datetime(2017, 11, 1, 0, 0, 0, tzinfo=pytz.UTC)
+        flowcell.save()
+
+        url = reverse('invoicing-list') + '?year=2017&month=11'
+        response = self.client.get(url)
+        data = json.loads(response.content)
+        self.assertEqual(float(data[0]['fixed_costs']), 10)
+        self.assertEqual(
+            InvoicingSnapshot.objects.filter(month='2017-11').count(), 1)
+
+        # Changing a price deletes the snapshots of the sequencer's months
+        fixed_cost.price = 20
+        fixed_cost.save()
+        self.assertFalse(
+            InvoicingSnapshot.objects.filter(month='2017-11').exists())
+
+        response = self.client.get(url)
+        data = json.loads(response.content)
+        self.assertEqual(float(data[0]['fixed_costs']), 20)
+
+    def test_invoicing_snapshot_pool_changed(self):
+        sequencer = create_sequencer(get_random_name())
+        read_length = create_read_length(get_random_name())
+        request = self._create_sequenced_request(sequencer, read_length)
+
+        flowcell = request.flowcell.first()
+        flowcell.create_time = datetime(2017, 11, 1, 0, 0, 0, tzinfo=pytz.UTC)
+        flowcell.save()
+        pool = flowcell.lanes.first().pools.first()
+
+        def snapshot_exists():
+            return InvoicingSnapshot.objects.filter(month='2017-11').exists()
+
+        url = reverse('invoicing-list') + '?year=2017&month=11'
+        self.client.get(url)
+        self.assertTrue(snapshot_exists())
+
+        # Saving a pool deletes the snapshots of the months it was sequenced
+        pool.save()
+        self.assertFalse(snapshot_exists())
+
+        self.client.get(url)
+        self.assertTrue(snapshot_exists())
+
+        # So does adding a library to it
+        pool.libraries.add(create_library(get_random_name()))
+        self.assertFalse(snapshot_exists())
+
+    def test_invoicing_snapshot_records_changed(self):
+        sequencer = create_sequencer(get_random_name())
+        read_length = create_read_length(get_random_name())
+        request = self._create_sequenced_request(sequencer, read_length)
+
+        flowcell = request.flowcell.first()
+        flowcell.create_time = datetime(2017, 11, 1, 0, 0, 0, tzinfo=pytz.UTC)
+        flowcell.save()
+        library = request.libraries.first()
+        # the other library of the pool (not in the request)
+        other_library = Library.objects.filter(
+            pool__in=library.pool.all()).exclude(pk=library.pk).get()
+
+        def snapshot_exists():
+            return InvoicingSnapshot.objects.filter(month='2017-11').exists()
+
+        url = reverse('invoicing-list') + '?year=2017&month=11'
+        self.client.get(url)
+        self.assertTrue(snapshot_exists())
+
+        # Saving a library deletes the snapshots of its months
+        library.sequencing_depth = 10
+        library.save()
+        self.assertFalse(snapshot_exists())
+
+        # Other fields don't matter
+        self.client.get(url)
+        library.comments = 'Comments'
+        library.save(update_fields=['comments'])
+        self.assertTrue(snapshot_exists())
+
+        # Libraries saved in bulk are handled as well
+        other_library.sequencing_depth = 20
+        bulk_update([other_library], ['sequencing_depth'])
+        self.assertFalse(snapshot_exists())
+
+        # So are requests
+        self.client.get(url)
+        request.sequenced = False
+        request.save()
+        self.assertFalse(snapshot_exists())
+
+    def test_invoicing_snapshot_deep_sequencing_request(self):
+        sequencer = create_sequencer(get_random_name())
+        read_length = create_read_length(get_random_name())
+        request = self._create_sequenced_request(sequencer, read_length)
+
+        flowcell = request.flowcell.first()
+        flowcell.create_time = datetime(2017, 11, 1, 0, 0, 0, tzinfo=pytz.UTC)
+        flowcell.save()
+
+        url = reverse('invoicing-list') + '?year=2017&month=11'
+        self.client.get(url)
+        self.assertTrue(
+            InvoicingSnapshot.objects.filter(month='2017-11').exists())
+
+        # Another request with the other library of the pool (the request
+        # itself isn't on the flowcell)
+        library = Library.objects.filter(
+            pool__in=request.libraries.get().pool.all(),
+        ).exclude(request=request).get()
+        other_request = create_request(request.user)
+        other_request.libraries.add(library)
+
+        # Uploading the signed request resets the records' statuses
+        response = self.client.post(
+            f'/api/requests/{other_request.pk}/'
+            'upload_deep_sequencing_request/',
+            {'file': SimpleUploadedFile('request.pdf', b'content')},
+        )
+        self.assertTrue(response.json()['success'])
+        library.refresh_from_db()
+        self.assertEqual(library.status, 1)
+        self.assertFalse(
+            InvoicingSnapshot.objects.filter(month='2017-11').exists())
+
+    def test_invoicing_snapshot_flowcell_created(self):
+        sequencer = create_sequencer(get_random_name())
+        read_length = create_read_length(get_random_name())
+        request = self._create_sequenced_request(sequencer, read_length)
+
+        flowcell = request.flowcell.first()
+        flowcell.create_time = datetime(2017, 11, 1, 0, 0, 0, tzinfo=pytz.UTC)
+        flowcell.save()
+
+        # The pool is loaded on two lanes and will be fully loaded
+        # on the third one
+        pool = flowcell.lanes.first().pools.get()
+        pool.size.multiplier = 3
+        pool.size.save()
+        pool.libraries.update(status=4)
+
+        url = reverse('invoicing-list') + '?year=2017&month=11'
+        self.client.get(url)
+        self.assertTrue(
+            InvoicingSnapshot.objects.filter(month='2017-11').exists())
+
+        # Loading the pool on a new flowcell updates the records' statuses
+        # and the request (sequenced)
+        response = self.client.post(reverse('flowcells-list'), {
+            'data': json.dumps({
+                'flowcell_id': get_random_name(),
+                'sequencer': create_sequencer(
+                    get_random_name(), lanes=1).pk,
+                'lanes': [{'name': 'Lane 1', 'pool_id': pool.pk}],
+            })
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(request.libraries.get().status, 5)
+        self.assertFalse(
+            InvoicingSnapshot.objects.filter(month='2017-11').exists())
+
+    def test_download_invalid_month(self):
+        response = self.client.get(
+            reverse('invoicing-download') + '?year=2017&month=13')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.data['success'])
+
+    def test_download_constant_queries(self):
+        sequencer = create_sequencer(get_random_name())
+        read_length = create_read_length(get_random_name())
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('invoicing-download'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(context.captured_queries)
+
+        self._create_sequenced_request(sequencer, read_length)
+        count_queries()  # fill the price catalog
+        num_queries = count_queries()
+
+        for _ in range(3):
+            self._create_sequenced_request(sequencer, read_length)
+        self.assertEqual(count_queries(), num_queries)
@@ -0,0 +1,121 @@
+import json
+import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Prefetch, Min, Max
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from month import Month
+
+from .models import InvoicingReport, InvoicingSnapshot
+from .serializers import InvoicingSerializer
+
+Request = apps.get_model('request', 'Request')
+Flowcell = apps.get_model('flowcell', 'Flowcell')
+
+
+def get_invoicing_requests(year, month):
+    """ Get the requests sequenced in a given month. """
+    flowcell_qs = Flowcell.objects.select_related(
+        'sequencer',
+    ).order_by('flowcell_id')
+
+    return Request.objects.filter(
+        flowcell__create_time__year=year,
+        flowcell__create_time__month=month,
+        sequenced=True,
+    ).select_related(
+        'cost_unit',
+    ).prefetch_related(
+        Prefetch('flowcell', queryset=flowcell_qs),
+    ).distinct().annotate(
+        sequencing_date=Min('flowcell__create_time')
+    ).only(
+        'name',
+        'cost_unit__name',
+    ).order_by('sequencing_date', 'pk')
+
+
+def compute_invoice(year, month):
+    """ Compute the invoicing rows of a month from the live tables. """
+    data = InvoicingSerializer(
+        get_invoicing_requests(year, month), many=True).data
+    # Store the rows exactly as they are sent to the client
+    return json.loads(JSONRenderer().render(data))
+
+
+def update_invoice(year, month):
+    """ Compute and store the snapshot of a month. """
+    data = compute_invoice(year, month)
+    InvoicingSnapshot.objects.update_or_create(
+        month=Month(year, month), defaults={'data': data})
+    return data
+
+
+def get_invoice(year, month):
+    """
+    Get the invoicing rows of a month. Closed months are read from their
+    snapshots (computed on the first request), the current month is
+    always computed from the live tables.
+    """
+    today = datetime.date.today()
+    if (year, month) >= (today.year, today.month):
+        return compute_invoice(year, month)
+
+    data = InvoicingSnapshot.objects.filter(
+        month=Month(year, month),
+    ).values_list('data', flat=True).first()
+
+    if data is None:
+        data = update_invoice(year, month)
+
+    return data
+
+
+def invalidate_invoices(dates):
+    """ Delete the snapshots of the months of given dates or datetimes. """
+    months = set()
+    for dt in dates:
+        if isinstance(dt, datetime.datetime) and timezone.is_aware(dt):
+            dt = timezone.localtime(dt)
+        months.add(Month(dt.year, dt.month))
+
+    if months:
+        InvoicingSnapshot.objects.filter(month__in=months).delete()
+
+
+def invalidate_flowcell_invoices(flowcells):
+    """ Delete the snapshots of the months of given flowcells. """
+    invalidate_invoices(flowcells.datetimes('create_time', 'month'))
+
+
+def get_billing_periods():
+    """
+    Get the months from the first to the last flowcell with the URLs of
+    their reports (two queries regardless of the number of months).
+    """
+    dates = Flowcell.objects.aggregate(
+        start=Min('create_time'), end=Max('create_time'))
+
+    data = []
+    if dates['start'] is not None:
+        reports = {
+            (x.month.year, x.month.month): settings.MEDIA_URL + x.report.name
+            for x in InvoicingReport.objects.all()
+        }
+
+        start = timezone.localtime(dates['start'])
+        end = timezone.localtime(dates['end'])
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            data.append({
+                'name': datetime.date(year, month, 1).strftime('%B %Y'),
+                'value': [year, month],
+                'report_url': reports.get((year, month), ''),
+            })
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return data
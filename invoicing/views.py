@@ -1,12 +1,8 @@
 import datetime
 import calendar
-import numpy as np
-from dateutil.relativedelta import relativedelta
 
 from django.apps import apps
-from django.conf import settings
 from django.http import HttpResponse, JsonResponse
-from django.db.models import Q, Prefetch, Min
 
 from rest_framework import mixins, viewsets
 from rest_framework.response import Response
@@ -30,13 +26,14 @@ from .serializers import (
     LibraryPreparationCostsSerializer,
     SequencingCostsSerializer,
 )
+from .utils import (
+    get_invoicing_requests,
+    get_invoice,
+    get_billing_periods,
+)
 
-Request = apps.get_model('request', 'Request')
 ReadLength = apps.get_model('library_sample_shared', 'ReadLength')
 LibraryProtocol = apps.get_model('library_sample_shared', 'LibraryProtocol')
-Library = apps.get_model('library', 'Library')
-Sample = apps.get_model('sample', 'Sample')
-Flowcell = apps.get_model('flowcell', 'Flowcell')
 
 
 class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
@@ -44,72 +41,23 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = InvoicingSerializer
 
     def get_queryset(self):
-        today = datetime.date.today()
-        year = self.request.query_params.get('year', today.year)
-        month = self.request.query_params.get('month', today.month)
-
-        flowcell_qs = Flowcell.objects.select_related(
-            'sequencer',
-        ).order_by('flowcell_id')
-
-        libraries_qs = Library.objects.filter(
-            ~Q(pool=None)
-        ).select_related(
-            'read_length', 'library_protocol',
-        ).only('read_length', 'library_protocol__name')
-
-        samples_qs = Sample.objects.filter(
-            ~Q(pool=None) & ~Q(status=-1)
-        ).select_related(
-            'read_length', 'library_protocol',
-        ).only('read_length', 'library_protocol__name')
-
-        queryset = Request.objects.filter(
-            flowcell__create_time__year=year,
-            flowcell__create_time__month=month,
-            sequenced=True,
-        ).select_related(
-            'cost_unit',
-        ).prefetch_related(
-            Prefetch('flowcell', queryset=flowcell_qs),
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
-        ).distinct().annotate(
-            sequencing_date=Min('flowcell__create_time')
-        ).only(
-            'name',
-            'cost_unit__name',
-        ).order_by('sequencing_date', 'pk')
-
-        return queryset
+        year, month = self._get_month()
+        return get_invoicing_requests(year, month)
+
+    def list(self, request):
+        """ Get the invoicing of a month (from its snapshot if closed). """
+        try:
+            year, month = self._get_month()
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Invalid payload.',
+            }, 400)
+        return Response(get_invoice(year, month))
 
     @action(methods=['get'], detail=False)
     def billing_periods(self, request):
-        flowcells = Flowcell.objects.all()
-        data = []
-
-        if flowcells.count() == 0:
-            return Response(data)
-
-        start_date = flowcells.first().create_time
-        end_date = flowcells.last().create_time
-        end_date = end_date + relativedelta(months=1)
-
-        dates = np.arange(start_date, end_date, dtype='datetime64[M]').tolist()
-        for dt in dates:
-            try:
-                report = InvoicingReport.objects.get(
-                    month=dt.strftime('%Y-%m'))
-                report_url = settings.MEDIA_URL + report.report.name
-            except InvoicingReport.DoesNotExist:
-                report_url = ''
-            data.append({
-                'name': dt.strftime('%B %Y'),
-                'value': [dt.year, dt.month],
-                'report_url': report_url,
-            })
-
-        return Response(data)
+        return Response(get_billing_periods())
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
@@ -140,16 +88,19 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
     @action(methods=['get'], detail=False)
     def download(self, request):
         """ Download Invoicing Report. """
-        today = datetime.date.today()
-        year = self.request.query_params.get('year', today.year)
-        month = int(self.request.query_params.get('month', today.month))
+        try:
+            year, month = self._get_month()
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Invalid payload.',
+            }, 400)
 
         filename = f'Invoicing_Report_{calendar.month_name[month]}_{year}.xls'
         response = HttpResponse(content_type='application/ms-excel')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
-        queryset = self.filter_queryset(self.get_queryset())
-        data = self.get_serializer(queryset, many=True).data
+        data = get_invoice(year, month)
 
         wb = Workbook(encoding='utf-8')
 
@@ -188,6 +139,15 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
         ]
         write_header(ws, row_num, header)
 
+        # Resolve the names of all rows' read lengths and library protocols
+        read_length_names = dict(ReadLength.objects.filter(pk__in={
+            x for item in data for x in item['read_length']
+        }).values_list('pk', 'name'))
+        library_protocol_names = dict(LibraryProtocol.objects.filter(pk__in={
+            item['library_protocol'] for item in data
+            if item['library_protocol'] != ''
+        }).values_list('pk', 'name'))
+
         for item in data:
             row_num += 1
 
@@ -204,11 +164,10 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
                 )
             ))
 
-            read_lengths = '; '.join(ReadLength.objects.filter(
-                pk__in=item['read_length']
-            ).order_by('name').values_list('name', flat=True))
-
-            protocol = LibraryProtocol.objects.get(pk=item['library_protocol'])
+            read_lengths = '; '.join(sorted(
+                read_length_names[x] for x in item['read_length']
+                if x in read_length_names
+            ))
 
             row = [
                 item['request'],
@@ -219,7 +178,7 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
                 percentage,
                 read_lengths,
                 item['num_libraries_samples'],
-                protocol.name,
+                library_protocol_names.get(item['library_protocol'], ''),
                 item['fixed_costs'],
                 item['sequencing_costs'],
                 item['preparation_costs'],
@@ -233,7 +192,7 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
         row_num = 0
         header = ['Sequencer', 'Price']
         write_header(ws, row_num, header)
-        for item in FixedCosts.objects.all():
+        for item in FixedCosts.objects.select_related('sequencer'):
             row_num += 1
             row = [item.sequencer.name, item.price]
             write_row(ws, row_num, row)
@@ -243,7 +202,8 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
         row_num = 0
         header = ['Library Protocol', 'Price']
         write_header(ws, row_num, header)
-        for item in LibraryPreparationCosts.objects.all():
+        for item in LibraryPreparationCosts.objects.select_related(
+                'library_protocol'):
             row_num += 1
             row = [item.library_protocol.name, item.price]
             write_row(ws, row_num, row)
@@ -253,7 +213,8 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
         row_num = 0
         header = ['Sequencer + Read Length', 'Price']
         write_header(ws, row_num, header)
-        for item in SequencingCosts.objects.all():
+        for item in SequencingCosts.objects.select_related(
+                'sequencer', 'read_length'):
             row_num += 1
             row = [
                 f'{item.sequencer.name} {item.read_length.name}',
@@ -264,6 +225,14 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
         wb.save(response)
         return response
 
+    def _get_month(self):
+        today = datetime.date.today()
+        year = int(self.request.query_params.get('year', today.year))
+        month = int(self.request.query_params.get('month', today.month))
+        if not 1 <= month <= 12:
+            raise ValueError('Invalid month.')
+        return year, month
+
 
 class FixedCostsViewSet(mixins.UpdateModelMixin,
                         viewsets.ReadOnlyModelViewSet):
@@ -6,8 +6,10 @@ from rest_framework.serializers import (
     ModelSerializer,
     SerializerMethodField,
     IntegerField,
+    FloatField,
 )
 
+from common.utils import get_barcode_key
 from library_sample_shared.serializers import LibrarySampleBaseSerializer
 from sample.serializers import SampleSerializer
 
@@ -36,7 +38,14 @@ class LibrarySerializer(LibrarySampleBaseSerializer):
 
 
 class RequestParentNodeSerializer(ModelSerializer):
+    """
+    Serialize requests annotated with `num_records` and
+    `sum_sequencing_depth` (see LibrarySampleTree.get_queryset()).
+    """
     id = SerializerMethodField()
+    total_records_count = IntegerField(source='num_records', read_only=True)
+    total_sequencing_depth = FloatField(
+        source='sum_sequencing_depth', read_only=True)
     cls = SerializerMethodField()
     leaf = SerializerMethodField()
 
@@ -123,5 +132,6 @@ class RequestChildrenNodesSerializer(ModelSerializer):
             )))
 
         return {
-            'children': sorted(result, key=lambda x: x['barcode'][3:])
+            'children': sorted(
+                result, key=lambda x: get_barcode_key(x['barcode']) or 0)
         }
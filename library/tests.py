@@ -16,6 +16,7 @@ from library_sample_shared.models import (
     LibraryProtocol,
     LibraryType,
     IndexType,
+    IndexI7,
     BarcodeCounter,
 )
 from library.models import Library
@@ -126,6 +127,25 @@ class TestLibrarySampleTree(BaseTestCase):
         data = response.json()['children'][0]
         self.assertEqual(response.status_code, 200)
         self.assertIn(self.request.name, data['name'])
+        self.assertEqual(data['total_records_count'], 2)
+        self.assertEqual(data['total_sequencing_depth'], 2)
+
+    def test_libraries_and_samples_list_paginated(self):
+        """ Ensure get the requests with pagination works correctly. """
+        request = Request(user=self.request.user)
+        request.save()
+
+        response = self.client.get(reverse('libraries-and-samples-list'), {
+            'page': 1,
+            'page_size': 1,
+        })
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(len(data['children']), 1)
+        self.assertEqual(data['children'][0]['name'], request.name)
+        self.assertEqual(data['children'][0]['total_records_count'], 0)
+        self.assertEqual(data['children'][0]['total_sequencing_depth'], 0)
 
 
 class TestLibraries(BaseTestCase):
@@ -306,6 +326,53 @@ class TestLibraries(BaseTestCase):
         self.assertTrue(response.json()['success'])
         self.assertEqual(Library.objects.get(pk=library.pk).name, new_name)
 
+    def test_update_libraries_index_bulk(self):
+        """
+        Ensure changing the index type and indices of several libraries
+        at once behaves correctly (some of the indices can't be resolved).
+        """
+        index_type = IndexType(name=self._get_random_name(),
+                               index_length='6')
+        index_type.save()
+        index = IndexI7(prefix='A', number='01', index='ACGTAC')
+        index.save()
+        index_type.indices_i7.add(index)
+
+        library1 = create_library(self._get_random_name())
+        library2 = create_library(self._get_random_name())
+
+        response = self.client.post(reverse('libraries-edit'), {
+            'data': json.dumps([{
+                'pk': library.pk,
+                'name': library.name,
+                'organism': library.organism.pk,
+                'concentration': 1.0,
+                'concentration_method': library.concentration_method.pk,
+                'read_length': library.read_length.pk,
+                'sequencing_depth': 1,
+                'library_protocol': library.library_protocol.pk,
+                'library_type': library.library_type.pk,
+                'amplification_cycles': 1,
+                'index_type': index_type.pk,
+                'index_reads': 0,
+                'index_i7': index_i7,
+                'mean_fragment_size': 1,
+            } for library, index_i7 in [
+                (library1, 'ACGTAC'),
+                (library2, 'TTTTTT'),
+            ]])
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+
+        library1 = Library.objects.get(pk=library1.pk)
+        library2 = Library.objects.get(pk=library2.pk)
+        self.assertEqual(library1.index_type_id, index_type.pk)
+        self.assertEqual(library1.index_i7_ref_id, index.pk)
+        self.assertEqual(library2.index_i7, 'TTTTTT')
+        self.assertIsNone(library2.index_i7_ref_id)
+        self.assertIsNone(library2.index_i5_ref_id)
+
     def test_update_library_contains_invalid(self):
         """ Ensure update library containing invalid data behaves correctly."""
         library1 = create_library(self._get_random_name())
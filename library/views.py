@@ -1,11 +1,13 @@
 import logging
 
 from django.apps import apps
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Count, Sum, IntegerField, FloatField
 
 from rest_framework import viewsets
 from rest_framework.response import Response
 
+from common.views import StandardResultsSetPagination
+from request.utils import aggregate_records
 from library_sample_shared.views import LibrarySampleBaseViewSet
 
 from .serializers import (
@@ -23,12 +25,10 @@ logger = logging.getLogger('db')
 
 class LibrarySampleTree(viewsets.ViewSet):
     def get_queryset(self):
-        libraries_qs = Library.objects.all().only('sequencing_depth')
-        samples_qs = Sample.objects.all().only('sequencing_depth')
-
-        queryset = Request.objects.prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
+        queryset = Request.objects.annotate(
+            num_records=aggregate_records(Count('pk'), IntegerField()),
+            sum_sequencing_depth=aggregate_records(
+                Sum('sequencing_depth'), FloatField()),
         ).only('name').order_by('-create_time')
 
         if not self.request.user.is_staff:
@@ -37,7 +37,12 @@ class LibrarySampleTree(viewsets.ViewSet):
         return queryset
 
     def list(self, request):
-        """ Get the list of libraries and samples. """
+        """
+        Get the list of requests (the parent nodes) or, if the `node`
+        query parameter is set, the libraries and samples of a request.
+
+        If the `page` query parameter is set, the requests are paginated.
+        """
         queryset = self.get_queryset()
         request_id = self.request.query_params.get('node', None)
 
@@ -79,9 +84,22 @@ class LibrarySampleTree(viewsets.ViewSet):
                     'children': [],
                 }, 400)
 
-        serializer = RequestParentNodeSerializer(queryset, many=True)
-        return Response({'success': True, 'children': serializer.data})
+        if 'page' not in request.query_params:
+            serializer = RequestParentNodeSerializer(queryset, many=True)
+            return Response({'success': True, 'children': serializer.data})
+
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = RequestParentNodeSerializer(page, many=True)
+        return Response({
+            'success': True,
+            'count': paginator.page.paginator.count,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'children': serializer.data,
+        })
 
 
 class LibraryViewSet(LibrarySampleBaseViewSet):
     serializer_class = LibrarySerializer
+    select_related = LibrarySampleBaseViewSet.select_related + ('index_type',)
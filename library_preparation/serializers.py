@@ -1,43 +1,57 @@
+from django.apps import apps
+
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (
     ModelSerializer,
-    ListSerializer,
     SerializerMethodField,
     IntegerField,
     CharField,
 )
 
+from common.serializers import BulkListSerializer
+from common.utils import bulk_update
+
 from .models import LibraryPreparation
 
+Pooling = apps.get_model('pooling', 'Pooling')
+
 
-class LibraryPreparationListSerializer(ListSerializer):
+class LibraryPreparationListSerializer(BulkListSerializer):
     def update(self, instance, validated_data):
-        # Maps for id->instance and id->data item.
-        object_mapping = {obj.pk: obj for obj in instance}
-        data_mapping = {item['pk']: item for item in validated_data}
-
-        # Perform updates
-        ret = []
-        for obj_id, data in data_mapping.items():
-            obj = object_mapping.get(obj_id, None)
-            if obj is not None:
-                if 'concentration_sample' in data.keys():
-                    obj.sample.concentration_facility = \
-                        data['concentration_sample']
-                if 'comments_facility' in data.keys():
-                    obj.sample.comments_facility = data['comments_facility']
-                obj.sample.save(update_fields=['concentration_facility',
-                                               'comments_facility'])
-
-                if 'quality_check' in data.keys():
-                    if data['quality_check'] == 'passed':
-                        obj.sample.status = 3
-                    elif data['quality_check'] == 'failed':
-                        obj.sample.status = -1
-                    obj.sample.save(update_fields=['status'])
-
-                ret.append(self.child.update(obj, data))
-        return ret
+        return super().update(
+            instance.select_related('sample'), validated_data)
+
+    def update_object(self, obj, data):
+        if 'concentration_sample' in data.keys():
+            obj.sample.concentration_facility = data['concentration_sample']
+        if 'comments_facility' in data.keys():
+            obj.sample.comments_facility = data['comments_facility']
+
+        if 'quality_check' in data.keys():
+            if data['quality_check'] == 'passed':
+                obj.sample.status = 3
+            elif data['quality_check'] == 'failed':
+                obj.sample.status = -1
+
+        return super().update_object(obj, data)
+
+    def save_objects(self, objects, fields):
+        super().save_objects(objects, fields)
+
+        samples = [x.sample for x in objects]
+        bulk_update(samples, [
+            'concentration_facility', 'comments_facility', 'status'])
+
+        # bulk_update() doesn't send post_save, so create the Pooling
+        # objects of the pooled samples which have passed the quality check
+        # here (see pooling.signals.create_pooling_objects_sample())
+        passed = {x.pk for x in samples if x.is_pooled and x.status == 3}
+        existing = Pooling.objects.filter(
+            sample__in=passed).values_list('sample', flat=True)
+        Pooling.objects.bulk_create([
+            Pooling(sample_id=sample_id)
+            for sample_id in passed - set(existing)
+        ])
 
 
 class LibraryPreparationSerializer(ModelSerializer):
@@ -7,14 +7,16 @@ from .models import LibraryPreparation
 
 
 @receiver(m2m_changed, sender=Pool.samples.through)
-def update_samples(sender, instance, action, **kwargs):
+def update_samples(sender, instance, action, pk_set, **kwargs):
     """
-    When a sample is added to a pool, set its is_pooled and is_converted
-    to True, update the barcode, and for each sample in the pool create a
-    LibraryPreparation object.
+    When samples are added to a pool, set their is_pooled and is_converted
+    to True, update the barcodes, and create the missing LibraryPreparation
+    objects (in bulk).
     """
-    if action == 'post_add':
-        instance.samples.all().update(
+    if action == 'post_add' and pk_set:
+        # The barcode keys stay the same (the year and the counter
+        # don't change, see common.utils.get_barcode_key)
+        instance.samples.filter(pk__in=pk_set).update(
             is_pooled=True,
             is_converted=True,
             barcode=Func(
@@ -24,9 +26,9 @@ def update_samples(sender, instance, action, **kwargs):
             ),
         )
 
-        # TODO: maybe there is a better way to create multiple objects at once
-        for sample in instance.samples.all():
-            obj, created = LibraryPreparation.objects.get_or_create(
-                sample=sample)
-            if created:
-                obj.save()
+        existing = LibraryPreparation.objects.filter(
+            sample__in=pk_set).values_list('sample', flat=True)
+        LibraryPreparation.objects.bulk_create([
+            LibraryPreparation(sample_id=sample_id)
+            for sample_id in pk_set - set(existing)
+        ])
@@ -15,13 +15,13 @@ from xlwt import Workbook, XFStyle, Formula
 
 from common.views import CsrfExemptSessionAuthentication
 from common.mixins import MultiEditMixin
+from library_sample_shared.utils import IndexCoordinates
 
 from .models import LibraryPreparation
 from .serializers import LibraryPreparationSerializer
 
 Request = apps.get_model('request', 'Request')
 IndexType = apps.get_model('library_sample_shared', 'IndexType')
-IndexPair = apps.get_model('library_sample_shared', 'IndexPair')
 IndexI7 = apps.get_model('library_sample_shared', 'IndexI7')
 IndexI5 = apps.get_model('library_sample_shared', 'IndexI5')
 Pool = apps.get_model('index_generator', 'Pool')
@@ -39,11 +39,12 @@ class LibraryPreparationViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
         return LibraryPreparation.objects.select_related(
             'sample',
             'sample__index_type',
+            'sample__index_i7_ref',
+            'sample__index_i5_ref',
             'sample__library_protocol',
-        ).prefetch_related(
-            'sample__index_type__indices_i7',
-            'sample__index_type__indices_i5',
-        ).filter(Q(sample__status=2) | Q(sample__status=-2))
+        ).filter(
+            Q(sample__status=2) | Q(sample__status=-2)
+        ).order_by('sample__barcode_key')
 
     def get_context(self, queryset):
         sample_ids = queryset.values_list('sample', flat=True)
@@ -62,22 +63,11 @@ class LibraryPreparationViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
         index_types = {
             x.sample.index_type.pk for x in queryset if x.sample.index_type
         }
-        index_pairs = IndexPair.objects.filter(
-            index_type__pk__in=index_types,
-        ).select_related('index_type', 'index1', 'index2').distinct()
-        coordinates_map = {
-            (
-                ip.index_type.pk,
-                ip.index1.index_id,
-                ip.index2.index_id if ip.index2 else '',
-            ): ip.coordinate
-            for ip in index_pairs
-        }
 
         return {
             'requests': requests_map,
             'pools': pools_map,
-            'coordinates': coordinates_map,
+            'coordinates': IndexCoordinates(index_types),
         }
 
     def list(self, request):
@@ -85,8 +75,7 @@ class LibraryPreparationViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
         serializer = LibraryPreparationSerializer(
             queryset, many=True, context=self.get_context(queryset)
         )
-        data = sorted(serializer.data, key=lambda x: x['barcode'][3:])
-        return Response(data)
+        return Response(serializer.data)
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
@@ -103,7 +92,7 @@ class LibraryPreparationViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
         serializer = LibraryPreparationSerializer(
             queryset, many=True, context=self.get_context(queryset)
         )
-        data = sorted(serializer.data, key=lambda x: x['barcode'][3:])
+        data = serializer.data
 
         font_style = XFStyle()
         font_style.alignment.wrap = 1
@@ -0,0 +1,31 @@
+"""
+Compact integer encoding of index sequences.
+
+Each nucleotide takes 2 bits (A - 00, C - 01, G - 10, T - 11), the first
+nucleotide being the most significant. The high bit of each code is the
+color channel of the nucleotide (1 - green: G/T, 0 - red: A/C).
+A leading 1 bit marks the length of the sequence, so that, e.g., 'A'
+and 'AA' get different codes and equal sequences get equal codes.
+"""
+
+NUCLEOTIDES = 'ACGT'
+CODES = {x: i for i, x in enumerate(NUCLEOTIDES)}
+
+
+def pack_index(sequence):
+    """ Pack an index sequence into an integer (None if not possible). """
+    if not sequence:
+        return None
+
+    packed = 1
+    for nucleotide in sequence.upper():
+        code = CODES.get(nucleotide)
+        if code is None:
+            return None
+        packed = packed << 2 | code
+    return packed
+
+
+def packed_length(packed):
+    return (packed.bit_length() - 1) // 2
+
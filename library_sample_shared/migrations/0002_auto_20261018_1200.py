@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from library_sample_shared.encoding import pack_index
+
+
+def pack_indices(apps, schema_editor):
+    for model_name in ['IndexI7', 'IndexI5']:
+        model = apps.get_model('library_sample_shared', model_name)
+        for index in model.objects.all():
+            index.index_packed = pack_index(index.index)
+            index.save(update_fields=['index_packed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_sample_shared', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexi5',
+            name='index_packed',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Packed Index'),
+        ),
+        migrations.AddField(
+            model_name='indexi7',
+            name='index_packed',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Packed Index'),
+        ),
+        migrations.RunPython(pack_indices, migrations.RunPython.noop),
+    ]
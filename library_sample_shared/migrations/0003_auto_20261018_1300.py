@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 13:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_sample_shared', '0002_auto_20261018_1200'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='indexi5',
+            name='index_packed',
+        ),
+        migrations.RemoveField(
+            model_name='indexi7',
+            name='index_packed',
+        ),
+    ]
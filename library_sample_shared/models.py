@@ -1,14 +1,35 @@
 from datetime import datetime
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, RegexValidator
 
 from common.models import DateTimeMixin
+from common.utils import get_barcode_key
+from .encoding import pack_index
 
 AlphaValidator = RegexValidator(
     r'^[A-Z]$', 'Only capital alpha characters are allowed.')
 
 
+def add_update_fields(update_fields, dependent_fields):
+    """
+    Add the fields which are computed from other fields to `update_fields`
+    if the latter are being updated (`dependent_fields` maps a field
+    to a dependent field or to a list of them).
+    """
+    if update_fields is None:
+        return None
+    update_fields = list(update_fields)
+    for field, dependent in dependent_fields.items():
+        if field not in update_fields:
+            continue
+        for dependent_field in ([dependent] if isinstance(dependent, str)
+                                else dependent):
+            if dependent_field not in update_fields:
+                update_fields.append(dependent_field)
+    return update_fields
+
+
 class Organism(models.Model):
     name = models.CharField('Name', max_length=100)
 
@@ -167,6 +188,23 @@ class BarcodeCounter(models.Model):
         obj, created = cls.objects.get_or_create(year=year)
         return obj
 
+    @classmethod
+    def reserve(cls, count, year=None):
+        """
+        Reserve a contiguous range of `count` ids and return it.
+
+        The counter row is locked until the end of the transaction,
+        so concurrent submissions never get overlapping ranges.
+        """
+        year = year or datetime.now().year
+        with transaction.atomic():
+            counter, _ = cls.objects.select_for_update().get_or_create(
+                year=year)
+            first_id = counter.last_id + 1
+            counter.last_id += count
+            counter.save(update_fields=['last_id'])
+        return range(first_id, first_id + count)
+
     def increment(self):
         self.last_id += 1
 
@@ -281,6 +319,15 @@ class GenericLibrarySample(DateTimeMixin):
 
     barcode = models.CharField('Barcode', max_length=9)
 
+    # Integer sort key of the barcode (see common.utils.get_barcode_key)
+    barcode_key = models.PositiveIntegerField(
+        'Barcode Key',
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+    )
+
     index_type = models.ForeignKey(
         IndexType,
         verbose_name='Index Type',
@@ -310,17 +357,52 @@ class GenericLibrarySample(DateTimeMixin):
         blank=True,
     )
 
+    # Packed index sequences (see encoding.py)
+    index_i7_packed = models.PositiveIntegerField(
+        'Packed Index I7',
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+    )
+
+    index_i5_packed = models.PositiveIntegerField(
+        'Packed Index I5',
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+    )
+
+    # Indices I7/I5 of the index type with the record's index sequences
+    # (kept in sync on save, see resolve_indices())
+    index_i7_ref = models.ForeignKey(
+        IndexI7,
+        related_name='+',
+        verbose_name='Index I7 Reference',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+    )
+
+    index_i5_ref = models.ForeignKey(
+        IndexI5,
+        related_name='+',
+        verbose_name='Index I5 Reference',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+    )
+
     @property
     def index_i7_id(self):
-        indices = self.index_type.indices_i7.all() if self.index_type else []
-        index_id = [x.index_id for x in indices if x.index == self.index_i7]
-        return index_id[0] if any(index_id) else ''
+        return self.index_i7_ref.index_id if self.index_i7_ref_id else ''
 
     @property
     def index_i5_id(self):
-        indices = self.index_type.indices_i5.all() if self.index_type else []
-        index_id = [x.index_id for x in indices if x.index == self.index_i5]
-        return index_id[0] if any(index_id) else ''
+        return self.index_i5_ref.index_id if self.index_i5_ref_id else ''
 
     # Facility
 
@@ -369,27 +451,90 @@ class GenericLibrarySample(DateTimeMixin):
         blank=True,
     )
 
+    # Fields -> the fields computed from them
+    COMPUTED_FIELDS = {
+        'barcode': 'barcode_key',
+        'index_type': ['index_i7_ref', 'index_i5_ref'],
+        'index_i7': ['index_i7_packed', 'index_i7_ref'],
+        'index_i5': ['index_i5_packed', 'index_i5_ref'],
+    }
+
     class Meta:
         abstract = True
 
     def generate_barcode(self):
-        counter = BarcodeCounter.load()
-        counter.increment()
-        counter.save()
+        self.assign_barcodes([self])
+        self.save(update_fields=['barcode'])
 
-        record_type = self.__class__.__name__[0]
-        barcode = datetime.now().strftime('%y') + record_type
-        barcode += '0' * (6 - len(str(counter))) + str(counter)
+    @classmethod
+    def assign_barcodes(cls, records):
+        """
+        Set the barcodes of given records (without saving them)
+        from a single reserved range of the barcode counter.
+        """
+        if not records:
+            return
+
+        prefix = datetime.now().strftime('%y') + cls.__name__[0]
+        ids = BarcodeCounter.reserve(len(records))
+        for record, counter in zip(records, ids):
+            record.barcode = f'{prefix}{counter:06d}'
+            record.barcode_key = get_barcode_key(record.barcode)
 
-        self.barcode = barcode
-        self.save(update_fields=['barcode'])
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'index_type_id', 'index_i7', 'index_i5'} <= set(field_names):
+            instance._resolved_indices = instance._index_key()
+        return instance
+
+    def _index_key(self):
+        return (self.index_type_id, self.index_i7, self.index_i5)
+
+    def resolve_indices(self):
+        """
+        Find the indices I7/I5 of the record's index type which match its
+        index sequences (unless they haven't changed since the last time).
+        """
+        if getattr(self, '_resolved_indices', None) == self._index_key():
+            return
+
+        for index_group, model in [('i7', IndexI7), ('i5', IndexI5)]:
+            index = getattr(self, f'index_{index_group}')
+            ref = None
+            if self.index_type_id and index:
+                ref = model.objects.filter(
+                    index_type=self.index_type_id, index=index,
+                ).order_by('pk').first()
+            setattr(self, f'index_{index_group}_ref', ref)
+
+        self._resolved_indices = self._index_key()
 
     def save(self, *args, **kwargs):
         created = self.pk is None
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or \
+                {'index_type', 'index_i7', 'index_i5'} & set(update_fields):
+            self.resolve_indices()
+
+        self.set_computed_fields()
+        kwargs['update_fields'] = add_update_fields(
+            kwargs.get('update_fields'), self.COMPUTED_FIELDS)
+
         super().save(*args, **kwargs)
 
         if created:
             self.generate_barcode()
 
+    def set_computed_fields(self):
+        """
+        Set the fields which are computed from other fields
+        (also needed before bulk_create(), which doesn't call save()).
+        """
+        self.barcode_key = get_barcode_key(self.barcode)
+        self.index_i7_packed = pack_index(self.index_i7)
+        self.index_i5_packed = pack_index(self.index_i5)
+
     def __str__(self):
         return self.name
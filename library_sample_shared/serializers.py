@@ -1,9 +1,10 @@
 from rest_framework.serializers import (
     ModelSerializer,
-    ListSerializer,
     SerializerMethodField,
 )
 
+from common.serializers import BulkListSerializer
+
 from .models import (
     Organism,
     ReadLength,
@@ -14,6 +15,7 @@ from .models import (
     IndexI5,
     ConcentrationMethod,
 )
+from .utils import bulk_create_records, bulk_update_records
 
 
 class OrganismSerializer(ModelSerializer):
@@ -88,23 +90,17 @@ class LibraryTypeSerializer(ModelSerializer):
             'library_protocol__id', flat=True)
 
 
-class LibrarySampleBaseListSerializer(ListSerializer):
-
-    def update(self, instance, validated_data):
-        # Maps for id->instance and id->data item.
-        object_mapping = {obj.pk: obj for obj in instance}
-        data_mapping = {item['pk']: item for item in validated_data}
+class LibrarySampleBaseListSerializer(BulkListSerializer):
+    """
+    Save libraries or samples in bulk, keeping their barcodes and
+    the computed fields up to date.
+    """
 
-        # Perform updates
-        ret = []
-        for obj_id, data in data_mapping.items():
-            obj = object_mapping.get(obj_id, None)
-            if obj is not None:
-                ret.append(self.child.update(obj, data))
-        return ret
+    def create_objects(self, objects):
+        return bulk_create_records(self.child.Meta.model, objects)
 
-    # def delete(self, instance):
-    #     pass
+    def save_objects(self, objects, fields):
+        bulk_update_records(objects, fields)
 
 
 class LibrarySampleBaseSerializer(ModelSerializer):
@@ -128,9 +124,14 @@ class LibrarySampleBaseSerializer(ModelSerializer):
         extra_kwargs = {'barcode': {'required': False}}
 
     def get_request_id(self, obj):
+        # The request id and name can be annotated on the queryset
+        if hasattr(obj, 'request_pk'):
+            return obj.request_pk
         return obj.request.get().pk
 
     def get_request_name(self, obj):
+        if hasattr(obj, 'request_name'):
+            return obj.request_name
         return obj.request.get().name
 
     def get_library_protocol_name(self, obj):
@@ -0,0 +1,54 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import IndexType, IndexI7, IndexI5, IndexPair
+from .utils import IndexCoordinates, update_index_references
+
+
+@receiver(post_save, sender=IndexPair)
+@receiver(post_save, sender=IndexI7)
+@receiver(post_save, sender=IndexI5)
+@receiver(post_delete, sender=IndexPair)
+@receiver(post_delete, sender=IndexI7)
+@receiver(post_delete, sender=IndexI5)
+@receiver(post_delete, sender=IndexType)
+def invalidate_index_coordinates(sender, **kwargs):
+    """
+    When an index pair or an index is changed,
+    clear the cached index pair coordinates.
+    """
+    IndexCoordinates.clear_cache()
+
+
+@receiver(post_save, sender=IndexI7)
+@receiver(post_save, sender=IndexI5)
+def update_references_index(sender, instance, created, raw, **kwargs):
+    """
+    When an index sequence is changed, update the index references
+    of the libraries and samples.
+    """
+    if created or raw:
+        return
+    update_index_references(instance.index_type.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=IndexType.indices_i7.through)
+@receiver(m2m_changed, sender=IndexType.indices_i5.through)
+def update_references_index_type(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    """
+    When indices are added to or removed from an index type,
+    update the index references of the libraries and samples.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        index_type_ids = [instance.pk]
+    elif action == 'post_clear':
+        # pk_set is not provided, the index types are already unlinked
+        return
+    else:
+        index_type_ids = list(pk_set)
+
+    update_index_references(index_type_ids)
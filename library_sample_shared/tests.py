@@ -13,12 +13,16 @@ from .models import (
     GenericIndex,
     IndexI7,
     IndexI5,
+    IndexPair,
     BarcodeCounter,
     LibraryProtocol,
     LibraryType,
     GenericLibrarySample,
 )
 
+from .utils import IndexResolver, IndexCoordinates
+from .encoding import pack_index
+
 User = get_user_model()
 
 
@@ -109,6 +113,16 @@ class GenericIndexTest(TestCase):
         self.assertEqual(self.index2.type(), '')
 
 
+class IndexEncodingTest(TestCase):
+    def test_pack_index(self):
+        self.assertEqual(pack_index('ACGT'), 0b100011011)
+        self.assertNotEqual(pack_index('A'), pack_index('AA'))
+        self.assertEqual(pack_index('acgt'), pack_index('ACGT'))
+        self.assertIsNone(pack_index('ACGN'))
+        self.assertIsNone(pack_index(''))
+        self.assertIsNone(pack_index(None))
+
+
 class BarcodeCounterTest(TestCase):
     def setUp(self):
         counter1 = BarcodeCounter.load(2017)
@@ -129,6 +143,14 @@ class BarcodeCounterTest(TestCase):
         counter = BarcodeCounter.load()
         self.assertEqual(str(counter), str(counter.last_id))
 
+    def test_reserve(self):
+        ids1 = BarcodeCounter.reserve(3, 2017)
+        ids2 = BarcodeCounter.reserve(2, 2017)
+
+        self.assertEqual(list(ids1), [1, 2, 3])
+        self.assertEqual(list(ids2), [4, 5])
+        self.assertEqual(BarcodeCounter.load(2017).last_id, 5)
+
 
 class LibraryProtocolTest(TestCase):
     def setUp(self):
@@ -339,6 +361,49 @@ class TestIndices(BaseTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data, [])
 
+    def test_index_resolver(self):
+        """ Ensure indices of given index types are resolved in bulk. """
+        with self.assertNumQueries(2):
+            resolver = IndexResolver(
+                [self.index_type1.pk, self.index_type2.pk, None])
+
+        self.assertEqual(resolver.get_id(
+            'i7', self.index_type1.pk, self.index1.index), 'I1')
+        self.assertEqual(resolver.get_id(
+            'i5', self.index_type2.pk, self.index3.index), 'I3')
+        self.assertEqual(resolver.get_id(
+            'i7', self.index_type1.pk, self.index2.index), '')
+        self.assertEqual(resolver.get_id(
+            'i7', self.index_type2.pk, self.index1.index), '')
+
+    def test_index_coordinates(self):
+        """ Ensure index pair coordinates are cached until changed. """
+        index_pair = IndexPair(
+            index_type=self.index_type1,
+            index1=self.index1,
+            char_coord='A',
+            num_coord=1,
+        )
+        index_pair.save()
+        key = (self.index_type1.pk, self.index1.index_id, '')
+
+        # the cache version and the coordinates
+        with self.assertNumQueries(2):
+            coordinates = IndexCoordinates([self.index_type1.pk, None])
+        self.assertEqual(coordinates.get(key), 'A1')
+        self.assertEqual(coordinates.get(
+            (self.index_type2.pk, self.index1.index_id, '')), '')
+
+        # only the cache version
+        with self.assertNumQueries(1):
+            coordinates = IndexCoordinates([self.index_type1.pk])
+        self.assertEqual(coordinates.get(key), 'A1')
+
+        index_pair.num_coord = 2
+        index_pair.save()
+        coordinates = IndexCoordinates([self.index_type1.pk])
+        self.assertEqual(coordinates.get(key), 'A2')
+
 
 class TestLibraryProtocols(BaseTestCase):
     """ Tests for library protocols. """
@@ -1,4 +1,180 @@
-from .models import IndexType
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from common.utils import ProcessCache, bulk_update
+
+from .models import (
+    IndexType,
+    IndexI7,
+    IndexI5,
+    IndexPair,
+    GenericLibrarySample,
+    add_update_fields,
+)
+
+
+class IndexResolver:
+    """
+    Resolve index sequences to the indices (prefix and number) of given
+    index types. All indices are fetched at once (one query for I7 and
+    one for I5) instead of querying them for each record separately.
+    """
+
+    def __init__(self, index_type_ids):
+        index_type_ids = set(filter(None, index_type_ids))
+        self.indices = {}
+
+        for index_group, model in [('i7', IndexI7), ('i5', IndexI5)]:
+            indices = model.objects.filter(
+                index_type__in=index_type_ids,
+            ).order_by('pk').values(
+                'pk', 'index_type', 'prefix', 'number', 'index')
+
+            for index in indices:
+                key = (index_group, index['index_type'], index['index'])
+                self.indices.setdefault(key, index)
+
+    @classmethod
+    def for_records(cls, records):
+        return cls([x.index_type_id for x in records])
+
+    def get(self, index_group, index_type_id, index):
+        """ Return a dict with the index prefix, number and sequence. """
+        return self.indices.get((index_group, index_type_id, index))
+
+    def get_id(self, index_group, index_type_id, index):
+        index = self.get(index_group, index_type_id, index)
+        return f'{index["prefix"]}{index["number"]}' if index else ''
+
+    def get_ids(self, obj):
+        """ Get Index I7/I5 ids for a given library/sample. """
+        return (
+            self.get_id('i7', obj.index_type_id, obj.index_i7),
+            self.get_id('i5', obj.index_type_id, obj.index_i5),
+        )
+
+    def resolve(self, obj):
+        """
+        Set the index references of a library/sample without querying
+        the database (see GenericLibrarySample.resolve_indices()).
+        """
+        for index_group in ['i7', 'i5']:
+            index = self.get(index_group, obj.index_type_id,
+                             getattr(obj, f'index_{index_group}'))
+            setattr(obj, f'index_{index_group}_ref_id',
+                    index['pk'] if index else None)
+        obj._resolved_indices = obj._index_key()
+
+
+class IndexCoordinates(ProcessCache):
+    """
+    Look up the plate coordinates of index pairs by the index type and
+    the index I7/I5 ids, e.g., coordinates.get((1, 'A01', 'B01'), '').
+
+    The coordinates of each index type are fetched once and cached in the
+    process until an index pair or an index is changed (see signals.py).
+    """
+
+    cache_key = 'library_sample_shared.coordinates'
+
+    # index type id -> {(index I7 id, index I5 id): coordinate}
+    _cache = {}
+
+    def __init__(self, index_type_ids):
+        self.check_cache_version()
+
+        index_type_ids = set(filter(None, index_type_ids))
+        missing = index_type_ids - self._cache.keys()
+        if missing:
+            coordinates = {x: {} for x in missing}
+            index_pairs = IndexPair.objects.filter(
+                index_type__in=missing,
+            ).values(
+                'index_type', 'char_coord', 'num_coord',
+                'index1__prefix', 'index1__number',
+                'index2__prefix', 'index2__number',
+            )
+            for pair in index_pairs:
+                # Index ids (prefix + number), index 2 may be missing
+                key = tuple(
+                    (pair[f'{x}__prefix'] or '') + (pair[f'{x}__number'] or '')
+                    for x in ['index1', 'index2']
+                )
+                coordinates[pair['index_type']][key] = \
+                    f'{pair["char_coord"]}{pair["num_coord"]}'
+            self._cache.update(coordinates)
+
+    def get(self, key, default=''):
+        index_type_id, index_i7_id, index_i5_id = key
+        return self._cache.get(index_type_id, {}).get(
+            (index_i7_id, index_i5_id), default)
+
+
+def update_index_references(index_type_ids):
+    """
+    Resolve the indices of all libraries and samples of given index types
+    again (e.g., after an index sequence has been changed).
+    """
+    resolver = IndexResolver(index_type_ids)
+    fields = ['index_i7_ref', 'index_i5_ref']
+
+    for model in [apps.get_model('library', 'Library'),
+                  apps.get_model('sample', 'Sample')]:
+        records = model.objects.filter(
+            index_type__in=index_type_ids,
+        ).only('index_type', 'index_i7', 'index_i5', *fields)
+
+        changed = []
+        for record in records:
+            refs = (record.index_i7_ref_id, record.index_i5_ref_id)
+            resolver.resolve(record)
+            if refs != (record.index_i7_ref_id, record.index_i5_ref_id):
+                changed.append(record)
+
+        bulk_update(changed, fields)
+
+
+def bulk_create_records(model, records):
+    """
+    Insert new libraries or samples with a single query. The barcodes are
+    taken from one reserved range of the barcode counter and the index
+    references are resolved for all records at once.
+    """
+    if not records:
+        return []
+
+    resolver = IndexResolver.for_records(records)
+    with transaction.atomic():
+        model.assign_barcodes(records)
+        for record in records:
+            resolver.resolve(record)
+            record.set_computed_fields()
+        return model.objects.bulk_create(records)
+
+
+def bulk_update_records(records, fields):
+    """
+    Save the given fields of libraries or samples (of the same model)
+    with a single query, keeping the computed fields and the update time
+    up to date.
+    """
+    fields = add_update_fields(
+        fields, GenericLibrarySample.COMPUTED_FIELDS)
+    if 'update_time' not in fields:
+        fields.append('update_time')
+
+    if {'index_type', 'index_i7', 'index_i5'} & set(fields):
+        resolver = IndexResolver.for_records(records)
+        for record in records:
+            resolver.resolve(record)
+
+    now = timezone.now()
+    for record in records:
+        record.set_computed_fields()
+        record.update_time = now
+
+    return bulk_update(records, fields)
 
 
 def get_indices_ids(obj):
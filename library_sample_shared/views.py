@@ -1,7 +1,7 @@
 import json
 import logging
 
-from django.apps import apps
+from django.db.models import F
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -30,8 +30,6 @@ from .serializers import (
     ConcentrationMethodSerializer,
 )
 
-Request = apps.get_model('request', 'Request')
-
 logger = logging.getLogger('db')
 
 
@@ -160,40 +158,65 @@ class LibraryTypeViewSet(MoveOtherMixin, viewsets.ReadOnlyModelViewSet):
 class LibrarySampleBaseViewSet(viewsets.ModelViewSet):
     pagination_class = StandardResultsSetPagination
 
+    # Related objects used by the serializers
+    select_related = (
+        'library_protocol',
+        'library_type',
+        'concentration_method',
+        'read_length',
+        'organism',
+    )
+
     def get_queryset(self):
-        return self.get_serializer().Meta.model.objects.all()
+        return self._get_model().objects.select_related(*self.select_related)
+
+    def get_list_queryset(self):
+        """
+        Get the libraries/samples of all requests (or of the user's ones)
+        with the request id and name in one query, newest requests first.
+        """
+        request_id = self.request.query_params.get('request_id', None)
+        ids = json.loads(self.request.query_params.get('ids', '[]'))
+
+        queryset = self.get_queryset().filter(
+            request__isnull=False,
+        ).annotate(
+            request_pk=F('request__pk'),
+            request_name=F('request__name'),
+        )
+
+        if request_id:
+            queryset = queryset.filter(request__pk=int(request_id))
+
+        if ids:
+            queryset = queryset.filter(pk__in=ids)
+
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(request__user=self.request.user)
+
+        return queryset.order_by('-request__create_time', 'pk')
 
-    # TODO: add pagination
     def list(self, request):
-        """ Get the list of all libraries or samples. """
-        data = []
+        """
+        Get the list of all libraries or samples.
+
+        If the `page` query parameter is set, the records are paginated.
+        """
+        try:
+            queryset = self.get_list_queryset()
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Invalid payload.',
+            }, 400)
 
-        request_id = request.query_params.get('request_id', None)
-        ids = json.loads(request.query_params.get('ids', '[]'))
+        if 'page' not in request.query_params:
+            serializer = self.serializer_class(queryset, many=True)
+            return Response({'success': True, 'data': serializer.data})
 
-        if request_id:
-            request_queryset = Request.objects.all().filter(pk=request_id)
-        else:
-            request_queryset = Request.objects.all().order_by('-create_time')
-
-        if not request.user.is_staff:
-            request_queryset = request_queryset.filter(user=request.user)
-
-        for request_obj in request_queryset:
-            # TODO: sort by item['barcode'][3:]
-            records = getattr(request_obj, self._get_model_name_plural())
-            if ids:
-                try:
-                    records = records.filter(pk__in=ids)
-                except ValueError:
-                    return Response({
-                        'success': False,
-                        'message': 'Invalid payload.',
-                    }, 400)
-            serializer = self.serializer_class(records, many=True)
-            data += serializer.data
-
-        return Response({'success': True, 'data': data})
+        page = self.paginate_queryset(queryset)
+        serializer = self.serializer_class(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request):
         """ Add new libraries/samples. """
@@ -216,35 +239,31 @@ class LibrarySampleBaseViewSet(viewsets.ModelViewSet):
             } for obj in objects]
             return Response({'success': True, 'data': data}, 201)
 
+        elif serializer.valid_data:
+            # Create the valid records
+            message = 'Invalid payload. Some records cannot be added.'
+            objects = serializer.save_valid()
+
+            data = [{
+                'pk': obj.pk,
+                'record_type': obj.__class__.__name__,
+                'name': obj.name,
+                'barcode': obj.barcode,
+            } for obj in objects]
+
+            return Response({
+                'success': True,
+                'message': message,
+                'data': data,
+                'errors': serializer.errors,
+            }, 201)
+
         else:
-            # Try to create valid records
-            valid_data = [item[1] for item in zip(serializer.errors, post_data)
-                          if not item[0]]
-
-            if any(valid_data):
-                message = 'Invalid payload. Some records cannot be added.'
-                objects = self._create_or_update_valid(valid_data)
-
-                data = [{
-                    'pk': obj.pk,
-                    'record_type': obj.__class__.__name__,
-                    'name': obj.name,
-                    'barcode': obj.barcode,
-                } for obj in objects]
-
-                return Response({
-                    'success': True,
-                    'message': message,
-                    'data': data,
-                }, 201)
-
-            else:
-                # logger.debug('POST DATA', post_data)
-                # logger.debug('VALIDATION ERRORS', serializer.errors)
-                return Response({
-                    'success': False,
-                    'message': 'Invalid payload.',
-                }, 400)
+            return Response({
+                'success': False,
+                'message': 'Invalid payload.',
+                'errors': serializer.errors,
+            }, 400)
 
     @action(methods=['post'], detail=False)
     def edit(self, request):
@@ -266,36 +285,22 @@ class LibrarySampleBaseViewSet(viewsets.ModelViewSet):
             serializer.save()
             return Response({'success': True})
 
+        elif serializer.valid_data:
+            # Update the valid records
+            message = 'Invalid payload. Some records cannot be updated.'
+            serializer.save_valid()
+            return Response({
+                'success': True,
+                'message': message,
+                'errors': serializer.errors,
+            }, 200)
+
         else:
-            # Try to update valid records
-            valid_data = [item[1] for item in zip(serializer.errors, post_data)
-                          if not item[0]]
-
-            if any(valid_data):
-                message = 'Invalid payload. Some records cannot be updated.'
-                ids = [x['pk'] for x in valid_data]
-                self._create_or_update_valid(valid_data, ids)
-                return Response({'success': True, 'message': message}, 200)
-
-            else:
-                return Response({
-                    'success': False,
-                    'message': 'Invalid payload.',
-                }, 400)
-
-    def _create_or_update_valid(self, valid_data, ids=None):
-        """ Create or update valid objects. """
-        if not ids:
-            serializer = self.serializer_class(data=valid_data, many=True)
-        else:
-            objects = self._get_model().objects.filter(pk__in=ids)
-            serializer = self.serializer_class(
-                data=valid_data, instance=objects, many=True)
-        serializer.is_valid()
-        return serializer.save()
+            return Response({
+                'success': False,
+                'message': 'Invalid payload.',
+                'errors': serializer.errors,
+            }, 400)
 
     def _get_model(self):
         return self.get_serializer().Meta.model
-
-    def _get_model_name_plural(self):
-        return self._get_model()._meta.verbose_name_plural.lower()
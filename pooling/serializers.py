@@ -3,35 +3,41 @@ from django.apps import apps
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (
     ModelSerializer,
-    ListSerializer,
     SerializerMethodField,
     IntegerField,
     CharField,
 )
 
+from common.utils import bulk_update
+from library_sample_shared.serializers import LibrarySampleBaseListSerializer
+
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 Pool = apps.get_model('index_generator', 'Pool')
 
 
-class BaseListSerializer(ListSerializer):
+class BaseListSerializer(LibrarySampleBaseListSerializer):
     def update(self, instance, validated_data):
-        # Maps for id->instance and id->data item.
-        object_mapping = {obj.pk: obj for obj in instance}
-        data_mapping = {item['pk']: item for item in validated_data}
-
-        # Perform updates
-        ret = []
-        for obj_id, data in data_mapping.items():
-            obj = object_mapping.get(obj_id, None)
-            if obj is not None:
-                if 'quality_check' in data.keys():
-                    if data['quality_check'] == 'passed':
-                        obj.status = 4
-                    elif data['quality_check'] == 'failed':
-                        obj.status = -1
-                ret.append(self.child.update(obj, data))
-        return ret
+        return super().update(
+            instance.select_related('pooling'), validated_data)
+
+    def update_object(self, obj, data):
+        # Only the status and the concentration C1 can be changed
+        fields = []
+        if 'quality_check' in data.keys():
+            if data['quality_check'] == 'passed':
+                obj.status = 4
+                fields.append('status')
+            elif data['quality_check'] == 'failed':
+                obj.status = -1
+                fields.append('status')
+        if 'concentration_c1' in data.keys():
+            obj.pooling.concentration_c1 = data['concentration_c1']
+        return fields
+
+    def save_objects(self, objects, fields):
+        super().save_objects(objects, fields)
+        bulk_update([x.pooling for x in objects], ['concentration_c1'])
 
 
 class PoolingBaseSerializer(ModelSerializer):
@@ -8,19 +8,21 @@ from .models import Pooling
 
 
 @receiver(m2m_changed, sender=Pool.libraries.through)
-def update_libraries_create_pooling_obj(sender, instance, action, **kwargs):
+def update_libraries_create_pooling_obj(sender, instance, action, pk_set,
+                                        **kwargs):
     """
-    When a library is added to a pool, set its is_pooled to True, and
-    for each library create a Pooling object.
+    When libraries are added to a pool, set their is_pooled to True, and
+    create the missing Pooling objects (in bulk).
     """
-    if action == 'post_add':
-        instance.libraries.all().update(is_pooled=True)
-
-        # TODO: maybe there is a better way to create multiple objects at once
-        for library in instance.libraries.all():
-            obj, created = Pooling.objects.get_or_create(library=library)
-            if created:
-                obj.save()
+    if action == 'post_add' and pk_set:
+        instance.libraries.filter(pk__in=pk_set).update(is_pooled=True)
+
+        existing = Pooling.objects.filter(
+            library__in=pk_set).values_list('library', flat=True)
+        Pooling.objects.bulk_create([
+            Pooling(library_id=library_id)
+            for library_id in pk_set - set(existing)
+        ])
 
 
 @receiver(post_save, sender=Sample)
@@ -120,6 +120,42 @@ class TestPooling(BaseTestCase):
         self.assertIn(pooling_object2.sample.name, objects)
         self.assertNotIn(failed_sample.name, objects)
 
+    def test_pooling_list_paginated(self):
+        """ Ensure get paginated and filtered pooling list works. """
+        pooling_object1 = create_pooling_object(self.user, add_library=True)
+        pooling_object2 = create_pooling_object(self.user, add_sample=True)
+        create_pooling_object(self.user, add_sample=True, sample_failed=True)
+
+        response = self.client.get('/api/pooling/', {
+            'page': 1,
+            'page_size': 1,
+            'ordering': 'create_time',
+        })
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        # The pool with the failed sample is skipped
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(
+            [x['name'] for x in data['results']],
+            [pooling_object1.library.name],
+        )
+
+        pool = pooling_object2.sample.pool.get()
+        response = self.client.get('/api/pooling/', {
+            'page': 1,
+            'pool_id': pool.pk,
+            'status': json.dumps([3]),
+        })
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['name'],
+                         pooling_object2.sample.name)
+
+    def test_pooling_list_invalid_ordering(self):
+        response = self.client.get('/api/pooling/', {'ordering': 'blah'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
     def test_pooling_list_non_staff(self):
         """Ensure error is thrown if a non-staff user tries to get the list."""
         self.create_user('non-staff@test.io', 'test', False)
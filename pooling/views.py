@@ -5,7 +5,7 @@ import itertools
 
 from django.apps import apps
 from django.http import HttpResponse
-from django.db.models import Q, Prefetch
+from django.db.models import Q, Prefetch, Exists, OuterRef
 
 from rest_framework import viewsets
 from rest_framework.response import Response
@@ -14,8 +14,13 @@ from rest_framework.permissions import IsAdminUser
 
 from xlwt import Workbook, XFStyle, Formula
 
-from common.views import CsrfExemptSessionAuthentication
+from common.views import (
+    CsrfExemptSessionAuthentication,
+    StandardResultsSetPagination,
+)
 from common.mixins import LibrarySampleMultiEditMixin
+from common.utils import get_barcode_key
+from library_sample_shared.utils import IndexCoordinates
 
 from .models import Pooling
 
@@ -26,7 +31,6 @@ from .serializers import (
 )
 
 Request = apps.get_model('request', 'Request')
-IndexPair = apps.get_model('library_sample_shared', 'IndexPair')
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 Pool = apps.get_model('index_generator', 'Pool')
@@ -43,14 +47,42 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
     library_serializer = PoolingLibrarySerializer
     sample_serializer = PoolingSampleSerializer
 
+    # Statuses of the records which are shown in the pooling list
+    library_statuses = [2, -2]
+    sample_statuses = [3, 2, -2]
+
+    ordering_fields = ['pk', 'name', 'create_time']
+
     def get_queryset(self):
+        """
+        Get the pools which contain records in a pooling-relevant status,
+        filtered by the query parameters `status` (a list of statuses),
+        `pool_id` and `request_id` and ordered by `ordering`.
+        """
+        params = self.request.query_params
+        statuses = json.loads(params.get('status', '[]'))
+        if not isinstance(statuses, list):
+            statuses = [statuses]
+        pool_id = params.get('pool_id', None)
+        request_id = params.get('request_id', None)
+        ordering = params.get('ordering', '-create_time')
+
+        if ordering.lstrip('-') not in self.ordering_fields:
+            raise ValueError('Invalid ordering.')
+
+        library_filter = Q(status__in=self.library_statuses)
+        sample_filter = Q(status__in=self.sample_statuses)
+        if statuses:
+            library_filter &= Q(status__in=statuses)
+            sample_filter &= Q(status__in=statuses)
+        if request_id:
+            library_filter &= Q(request=int(request_id))
+            sample_filter &= Q(request=int(request_id))
+
         libraries_qs = Library.objects.filter(
-            Q(status=2) | Q(status=-2)
+            library_filter
         ).select_related(
-            'index_type',
-        ).prefetch_related(
-            'index_type__indices_i7',
-            'index_type__indices_i5',
+            'index_type', 'index_i7_ref', 'index_i5_ref',
         ).only(
             'name',
             'barcode',
@@ -58,18 +90,19 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
             'index_type',
             'index_i7',
             'index_i5',
+            'index_i7_ref__prefix',
+            'index_i7_ref__number',
+            'index_i5_ref__prefix',
+            'index_i5_ref__number',
             'sequencing_depth',
             'mean_fragment_size',
             'concentration_facility'
-        )
+        ).order_by('barcode_key')
 
         samples_qs = Sample.objects.filter(
-            Q(status=3) | Q(status=2) | Q(status=-2)
+            sample_filter
         ).select_related(
-            'index_type',
-        ).prefetch_related(
-            'index_type__indices_i7',
-            'index_type__indices_i5',
+            'index_type', 'index_i7_ref', 'index_i5_ref',
         ).only(
             'name',
             'barcode',
@@ -77,20 +110,37 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
             'index_type',
             'index_i7',
             'index_i5',
+            'index_i7_ref__prefix',
+            'index_i7_ref__number',
+            'index_i5_ref__prefix',
+            'index_i5_ref__number',
             'sequencing_depth',
             'is_converted',
+        ).order_by('barcode_key')
+
+        # Skip the pools without any matching records
+        queryset = Pool.objects.annotate(
+            has_libraries=Exists(Library.objects.filter(
+                library_filter, pool=OuterRef('pk'))),
+            has_samples=Exists(Sample.objects.filter(
+                sample_filter, pool=OuterRef('pk'))),
+        ).filter(
+            Q(has_libraries=True) | Q(has_samples=True)
         )
 
-        return Pool.objects.select_related(
+        if pool_id:
+            queryset = queryset.filter(pk=int(pool_id))
+
+        return queryset.select_related(
             'size'
         ).prefetch_related(
             Prefetch('libraries', queryset=libraries_qs),
             Prefetch('samples', queryset=samples_qs),
-        )
+        ).order_by(ordering)
 
-    def get_context(self, queryset):
-        library_ids = queryset.values_list('libraries', flat=True)
-        sample_ids = queryset.values_list('samples', flat=True)
+    def get_context(self, pools):
+        library_ids = [x.pk for pool in pools for x in pool.libraries.all()]
+        sample_ids = [x.pk for pool in pools for x in pool.samples.all()]
 
         # Get Requests in one query
         requests = Request.objects.filter(
@@ -138,44 +188,53 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
         # Get coordinates
         index_types1 = {
             l.index_type.pk
-            for pool in queryset
+            for pool in pools
             for l in pool.libraries.all()
             if l.index_type
         }
         index_types2 = {
             s.index_type.pk
-            for pool in queryset
+            for pool in pools
             for s in pool.samples.all()
             if s.index_type
         }
         index_types = index_types1 | index_types2
-        index_pairs = IndexPair.objects.filter(
-            index_type__pk__in=index_types,
-        ).select_related('index_type', 'index1', 'index2').distinct()
-        coordinates_map = {
-            (
-                ip.index_type.pk,
-                ip.index1.index_id,
-                ip.index2.index_id if ip.index2 else '',
-            ): ip.coordinate
-            for ip in index_pairs
-        }
 
         return {
             'requests': requests_map,
             'library_preparation': library_reparation_map,
             'pooling': pooling_map,
-            'coordinates': coordinates_map,
+            'coordinates': IndexCoordinates(index_types),
         }
 
     def list(self, request):
-        """ Get the list of all pooling objects. """
-        queryset = self.get_queryset()
+        """
+        Get the list of all pooling objects.
+
+        If the `page` query parameter is set, the pools are paginated
+        and the records are returned in the database order (by pool,
+        then by barcode).
+        """
+        try:
+            queryset = self.get_queryset()
+        except ValueError as e:
+            return Response({'success': False, 'message': str(e)}, 400)
+
+        if 'page' not in request.query_params:
+            pools = list(queryset)
+            serializer = PoolSerializer(
+                pools, many=True, context=self.get_context(pools))
+            data = list(itertools.chain(*serializer.data))
+            data = sorted(
+                data, key=lambda x: get_barcode_key(x['barcode']) or 0)
+            return Response(data)
+
+        paginator = StandardResultsSetPagination()
+        pools = paginator.paginate_queryset(queryset, request, view=self)
         serializer = PoolSerializer(
-            queryset, many=True, context=self.get_context(queryset))
+            pools, many=True, context=self.get_context(pools))
         data = list(itertools.chain(*serializer.data))
-        data = sorted(data, key=lambda x: x['barcode'][3:])
-        return Response(data)
+        return paginator.get_paginated_response(data)
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
@@ -191,7 +250,7 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
             Library.objects.filter(pk__in=libraries),
             Sample.objects.filter(pk__in=samples),
         ))
-        records = sorted(records, key=lambda x: x.barcode[3:])
+        records = sorted(records, key=lambda x: x.barcode_key or 0)
 
         f_name = 'Pooling_Benchtop_Protocol.xls'
         response['Content-Disposition'] = 'attachment; filename="%s"' % f_name
@@ -389,7 +448,7 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
             Library.objects.filter(pk__in=libraries),
             Sample.objects.filter(pk__in=samples),
         ))
-        records = sorted(records, key=lambda x: x.barcode[3:])
+        records = sorted(records, key=lambda x: x.barcode_key or 0)
 
         f_name = 'QC_Normalization_and_Pooling_Template.xls'
         response['Content-Disposition'] = 'attachment; filename="%s"' % f_name
@@ -52,12 +52,16 @@ class Report:
             'user__pi__name',
         )
 
-        lanes_qs = Lane.objects.select_related('pool').prefetch_related(
-            Prefetch('pool__libraries', queryset=libraries_qs,
+        pools_qs = Pool.objects.prefetch_related(
+            Prefetch('libraries', queryset=libraries_qs,
                      to_attr='fetched_libraries'),
-            Prefetch('pool__samples', queryset=samples_qs,
+            Prefetch('samples', queryset=samples_qs,
                      to_attr='fetched_samples'),
-        ).only('id', 'pool__libraries', 'pool__samples')
+        ).only('id')
+
+        lanes_qs = Lane.objects.prefetch_related(
+            Prefetch('pools', queryset=pools_qs, to_attr='fetched_pools'),
+        ).only('id')
 
         self.flowcells = Flowcell.objects.select_related(
             'sequencer',
@@ -149,7 +153,11 @@ class Report:
                     'libraries': 0, 'samples': 0, 'runs': 0}
             counts[sequencer_name]['runs'] += 1
 
-            pools = {x.pool for x in flowcell.fetched_lanes}
+            pools = {
+                pool
+                for lane in flowcell.fetched_lanes
+                for pool in lane.fetched_pools
+            }
             for pool in pools:
                 counts[sequencer_name]['libraries'] += \
                     len(pool.fetched_libraries)
@@ -175,7 +183,11 @@ class Report:
         sequencer_mapping = {}
         for flowcell in self.flowcells:
             sequencer_name = flowcell.sequencer.name
-            pools = {x.pool for x in flowcell.fetched_lanes}
+            pools = {
+                pool
+                for lane in flowcell.fetched_lanes
+                for pool in lane.fetched_pools
+            }
             for pool in pools:
                 records = pool.fetched_libraries + pool.fetched_samples
                 for record in records:
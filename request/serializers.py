@@ -8,6 +8,7 @@ from .models import Request, FileRequest
 class RequestSerializer(ModelSerializer):
     user_full_name = SerializerMethodField()
     restrict_permissions = SerializerMethodField()
+    total_sequencing_depth = SerializerMethodField()
     deep_seq_request_name = SerializerMethodField()
     deep_seq_request_path = SerializerMethodField()
     files = SerializerMethodField()
@@ -37,8 +38,17 @@ class RequestSerializer(ModelSerializer):
         Don't allow the users to modify the requests and libraries/samples
         if they have reached status 1 or higher (or failed).
         """
-        return True if not obj.user.is_staff and obj.statuses.count(0) == 0 \
-            else False
+        # The counts can be annotated on the queryset
+        if hasattr(obj, 'num_new_records'):
+            num_new_records = obj.num_new_records
+        else:
+            num_new_records = obj.statuses.count(0)
+        return not obj.user.is_staff and num_new_records == 0
+
+    def get_total_sequencing_depth(self, obj):
+        if hasattr(obj, 'sum_sequencing_depth'):
+            return obj.sum_sequencing_depth
+        return obj.total_sequencing_depth
 
     def get_deep_seq_request_name(self, obj):
         return obj.deep_seq_request.name.split('/')[-1] \
@@ -136,6 +136,23 @@ class TestRequests(BaseTestCase):
         self.assertIn(request1.name, requests)
         self.assertNotIn(request2.name, requests)
 
+    def test_request_list_status_summary(self):
+        """ Ensure the totals and the permissions are annotated correctly. """
+        self.login('non-staff@test.io', 'test')
+        request1 = create_request(self.non_staff)
+        request1.libraries.add(create_library(get_random_name()))
+        request1.samples.add(create_sample(get_random_name(), status=1))
+        request2 = create_request(self.non_staff)
+        request2.samples.add(create_sample(get_random_name(), status=1))
+
+        response = self.client.get('/api/requests/')
+        self.assertEqual(response.status_code, 200)
+        requests = {x['name']: x for x in response.json()['results']}
+        self.assertEqual(requests[request1.name]['total_sequencing_depth'], 2)
+        self.assertFalse(requests[request1.name]['restrict_permissions'])
+        self.assertEqual(requests[request2.name]['total_sequencing_depth'], 1)
+        self.assertTrue(requests[request2.name]['restrict_permissions'])
+
     def test_search(self):
         """ Ensure search behaves correctly. """
         request1 = create_request(self.user)
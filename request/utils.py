@@ -0,0 +1,24 @@
+from django.apps import apps
+
+from common.utils import aggregate_subquery
+
+
+def aggregate_records(aggregate, output_field, **filters):
+    """
+    Aggregate the libraries and samples of each request, e.g.,
+    Request.objects.annotate(x=aggregate_records(Count('pk'), ...)).
+
+    Libraries and samples are aggregated in separate subqueries and
+    the results are added together.
+    """
+    Library = apps.get_model('library', 'Library')
+    Sample = apps.get_model('sample', 'Sample')
+
+    return (
+        aggregate_subquery(
+            Library.objects.filter(**filters), 'request', aggregate,
+            output_field) +
+        aggregate_subquery(
+            Sample.objects.filter(**filters), 'request', aggregate,
+            output_field)
+    )
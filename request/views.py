@@ -12,7 +12,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.template.loader import render_to_string
 from django.core.mail import send_mail
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Count, Sum, IntegerField, FloatField
 
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
@@ -26,8 +26,11 @@ from common.views import (
     CsrfExemptSessionAuthentication,
     StandardResultsSetPagination,
 )
+from library_sample_shared.utils import bulk_update_records
+
 from .models import Request, FileRequest
 from .serializers import RequestSerializer, RequestFileSerializer
+from .utils import aggregate_records
 
 User = get_user_model()
 Library = apps.get_model('library', 'Library')
@@ -209,13 +212,13 @@ class RequestViewSet(viewsets.ModelViewSet):
                      'user__last_name',)
 
     def get_queryset(self):
-        libraries_qs = Library.objects.all().only('status', 'sequencing_depth')
-        samples_qs = Sample.objects.all().only('status', 'sequencing_depth')
-
         queryset = Request.objects.select_related('user').prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
             'files',
+        ).annotate(
+            num_new_records=aggregate_records(
+                Count('pk'), IntegerField(), status=0),
+            sum_sequencing_depth=aggregate_records(
+                Sum('sequencing_depth'), FloatField()),
         ).order_by('-create_time')
 
         if self.request.user.is_staff:
@@ -296,10 +299,12 @@ class RequestViewSet(viewsets.ModelViewSet):
         libraries_qs = Library.objects.all().only(
             'name',
             'barcode',
+            'barcode_key',
         )
         samples_qs = Sample.objects.all().only(
             'name',
             'barcode',
+            'barcode_key',
             'is_converted',
         )
 
@@ -315,9 +320,9 @@ class RequestViewSet(viewsets.ModelViewSet):
             'record_type': obj.__class__.__name__,
             'is_converted': True
             if hasattr(obj, 'is_converted') and obj.is_converted else False,
-        } for obj in instance.records]
+        } for obj in sorted(
+            instance.records, key=lambda x: x.barcode_key or 0)]
 
-        data = sorted(data, key=lambda x: x['barcode'][3:])
         return Response(data)
 
     @action(methods=['get'], detail=True)
@@ -335,17 +340,16 @@ class RequestViewSet(viewsets.ModelViewSet):
         user = instance.user
         organization = user.organization.name if user.organization else ''
         cost_unit = instance.cost_unit.name if instance.cost_unit else ''
-        objects = list(itertools.chain(
+        objects = sorted(itertools.chain(
             instance.samples.all(),
             instance.libraries.all(),
-        ))
+        ), key=lambda x: x.barcode_key or 0)
         records = [{
             'name': obj.name,
             'type': obj.__class__.__name__,
             'barcode': obj.barcode,
             'depth': obj.sequencing_depth,
         } for obj in objects]
-        records = sorted(records, key=lambda x: x['barcode'][3:])
 
         pdf = PDF('Deep Sequencing Request')
         pdf.set_draw_color(217, 217, 217)
@@ -437,8 +441,13 @@ class RequestViewSet(viewsets.ModelViewSet):
         file_name = instance.deep_seq_request.name.split('/')[-1]
         file_path = settings.MEDIA_URL + instance.deep_seq_request.name
 
-        instance.libraries.all().update(status=1)
-        instance.samples.all().update(status=1)
+        # Save the records in bulk, so that post_bulk_update is sent
+        # (e.g., to invalidate the invoicing snapshots)
+        for records in [instance.libraries.all(), instance.samples.all()]:
+            records = list(records)
+            for record in records:
+                record.status = 1
+            bulk_update_records(records, ['status'])
 
         return JsonResponse({
              'success': True,
@@ -467,7 +476,8 @@ class RequestViewSet(viewsets.ModelViewSet):
             if include_failed_records:
                 records = list(instance.libraries.filter(status=-1)) + \
                     list(instance.samples.filter(status=-1))
-                records = sorted(records, key=lambda x: x.barcode[3:])
+                records = sorted(
+                    records, key=lambda x: x.barcode_key or 0)
 
             send_mail(
                 subject=subject,
@@ -494,7 +504,7 @@ class RequestViewSet(viewsets.ModelViewSet):
         records = sorted(list(itertools.chain(
             instance.libraries.all(),
             instance.samples.all(),
-        )), key=lambda x: x.barcode[3:])
+        )), key=lambda x: x.barcode_key or 0)
 
         pdf = Report('Deep Sequencing Request')
         pdf.set_draw_color(217, 217, 217)
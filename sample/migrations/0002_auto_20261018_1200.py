@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from library_sample_shared.encoding import pack_index
+
+
+def pack_indices(apps, schema_editor):
+    Sample = apps.get_model('sample', 'Sample')
+    for obj in Sample.objects.exclude(index_i7__isnull=True, index_i5__isnull=True):
+        obj.index_i7_packed = pack_index(obj.index_i7)
+        obj.index_i5_packed = pack_index(obj.index_i5)
+        obj.save(update_fields=['index_i7_packed', 'index_i5_packed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sample', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sample',
+            name='index_i5_packed',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Packed Index I5'),
+        ),
+        migrations.AddField(
+            model_name='sample',
+            name='index_i7_packed',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Packed Index I7'),
+        ),
+        migrations.RunPython(pack_indices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def resolve_indices(apps, schema_editor):
+    Sample = apps.get_model('sample', 'Sample')
+
+    indices = {}
+    for index_group, model_name in [('i7', 'IndexI7'), ('i5', 'IndexI5')]:
+        model = apps.get_model('library_sample_shared', model_name)
+        for index in model.objects.order_by('pk').values(
+                'pk', 'index_type', 'index'):
+            key = (index_group, index['index_type'], index['index'])
+            indices.setdefault(key, index['pk'])
+
+    for obj in Sample.objects.filter(index_type__isnull=False):
+        obj.index_i7_ref_id = indices.get(
+            ('i7', obj.index_type_id, obj.index_i7))
+        obj.index_i5_ref_id = indices.get(
+            ('i5', obj.index_type_id, obj.index_i5))
+        obj.save(update_fields=['index_i7_ref', 'index_i5_ref'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_sample_shared', '0002_auto_20261018_1200'),
+        ('sample', '0002_auto_20261018_1200'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sample',
+            name='index_i5_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='library_sample_shared.IndexI5', verbose_name='Index I5 Reference'),
+        ),
+        migrations.AddField(
+            model_name='sample',
+            name='index_i7_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='library_sample_shared.IndexI7', verbose_name='Index I7 Reference'),
+        ),
+        migrations.RunPython(resolve_indices, migrations.RunPython.noop),
+    ]
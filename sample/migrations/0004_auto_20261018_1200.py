@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from common.utils import get_barcode_key
+
+
+def set_barcode_keys(apps, schema_editor):
+    Sample = apps.get_model('sample', 'Sample')
+    for obj in Sample.objects.only('barcode'):
+        obj.barcode_key = get_barcode_key(obj.barcode)
+        obj.save(update_fields=['barcode_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sample', '0003_auto_20261018_1200'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sample',
+            name='barcode_key',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Barcode Key'),
+        ),
+        migrations.RunPython(set_barcode_keys, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,14 @@
 import json
 from datetime import datetime
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.core.urlresolvers import reverse
 from django.contrib.auth import get_user_model
 
 from common.tests import BaseTestCase
-from common.utils import get_random_name
+from common.utils import get_random_name, get_barcode_key
 
 from request.models import Request
 from library_sample_shared.models import (
@@ -16,7 +18,11 @@ from library_sample_shared.models import (
     LibraryProtocol,
     LibraryType,
     BarcodeCounter,
+    IndexType,
+    IndexI7,
+    IndexI5,
 )
+from library_sample_shared.encoding import pack_index
 
 from .models import NucleicAcidType, Sample
 
@@ -100,6 +106,59 @@ class TestSampleModel(TestCase):
         updated_sample = Sample.objects.get(pk=self.sample.pk)
         self.assertEqual(updated_sample.barcode, barcode)
 
+    def test_barcode_key(self):
+        self.sample.save()
+        counter = BarcodeCounter.load().last_id
+        year = int(datetime.now().strftime('%y'))
+
+        updated_sample = Sample.objects.get(pk=self.sample.pk)
+        self.assertEqual(updated_sample.barcode_key, year * 1000000 + counter)
+        self.assertEqual(get_barcode_key('18L000123'), 18000123)
+        self.assertIsNone(get_barcode_key('blah'))
+
+    def test_index_packing(self):
+        self.sample.save()
+        self.assertIsNone(self.sample.index_i7_packed)
+
+        self.sample.index_i7 = 'ATCACG'
+        self.sample.index_i5 = 'CGATGT'
+        self.sample.save(update_fields=['index_i7', 'index_i5'])
+
+        updated_sample = Sample.objects.get(pk=self.sample.pk)
+        self.assertEqual(updated_sample.index_i7_packed, pack_index('ATCACG'))
+        self.assertEqual(updated_sample.index_i5_packed, pack_index('CGATGT'))
+
+    def test_index_references(self):
+        index_type = IndexType(name=get_random_name(), is_dual=True)
+        index_type.save()
+        index_i7 = IndexI7(prefix='A', number='01', index='ATCACG')
+        index_i7.save()
+        index_i5 = IndexI5(prefix='B', number='01', index='CGATGT')
+        index_i5.save()
+        index_type.indices_i7.add(index_i7)
+        index_type.indices_i5.add(index_i5)
+
+        self.sample.index_type = index_type
+        self.sample.index_i7 = 'ATCACG'
+        self.sample.index_i5 = 'CGATGT'
+        self.sample.save()
+
+        sample = Sample.objects.get(pk=self.sample.pk)
+        self.assertEqual(sample.index_i7_id, 'A01')
+        self.assertEqual(sample.index_i5_id, 'B01')
+
+        # Changing the index sequence updates the references
+        index_i7.index = 'TTAGGC'
+        index_i7.save()
+        sample = Sample.objects.get(pk=self.sample.pk)
+        self.assertEqual(sample.index_i7_id, '')
+        self.assertEqual(sample.index_i5_id, 'B01')
+
+        sample.index_i7 = 'TTAGGC'
+        sample.save(update_fields=['index_i7'])
+        sample = Sample.objects.get(pk=self.sample.pk)
+        self.assertEqual(sample.index_i7_id, 'A01')
+
 
 class NucleicAcidTypeTest(TestCase):
     def setUp(self):
@@ -183,6 +242,37 @@ class TestSamples(BaseTestCase):
         self.assertIn(sample2.name, samples)
         self.assertNotIn(sample3.name, samples)
 
+    def test_samples_paginated(self):
+        """ Ensure get samples with pagination behaves correctly. """
+        request = Request(user=self.user, name=self._get_random_name())
+        request.save()
+        samples = [create_sample(get_random_name()) for _ in range(3)]
+        request.samples.add(*samples)
+
+        def get_list():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('samples-list'), {
+                    'page': 1,
+                    'page_size': 2,
+                })
+            self.assertEqual(response.status_code, 200)
+            return response.json(), len(queries)
+
+        data, num_queries = get_list()
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(data['results'][0]['name'], samples[0].name)
+        self.assertEqual(data['results'][0]['request_id'], request.pk)
+        self.assertEqual(data['results'][0]['request_name'], request.name)
+
+        # The number of queries doesn't depend on the number of requests
+        for _ in range(3):
+            other_request = Request(user=self.user)
+            other_request.save()
+            other_request.samples.add(create_sample(get_random_name()))
+        _, num_queries_more = get_list()
+        self.assertEqual(num_queries, num_queries_more)
+
     def test_multiple_sample_contains_invalid(self):
         """
         Ensure get multiple samples containing invalid ids behaves correctly.
@@ -224,6 +314,39 @@ class TestSamples(BaseTestCase):
         self.assertEqual(name, data['data'][0]['name'])
         self.assertEqual('Sample', data['data'][0]['record_type'])
 
+    def test_add_multiple_samples(self):
+        """ Ensure multiple samples get consecutive barcodes. """
+        counter = BarcodeCounter.load().last_id
+        data = [{
+            'name': self._get_random_name(),
+            'organism': self.sample.organism.pk,
+            'concentration': 1.0,
+            'concentration_method': self.sample.concentration_method.pk,
+            'read_length': self.sample.read_length.pk,
+            'sequencing_depth': 1,
+            'library_protocol': self.sample.library_protocol.pk,
+            'library_type': self.sample.library_type.pk,
+            'nucleic_acid_type': self.sample.nucleic_acid_type.pk,
+        } for _ in range(3)]
+
+        response = self.client.post(reverse('samples-list'), {
+            'data': json.dumps(data),
+        })
+        data = response.json()
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(data['success'])
+
+        prefix = datetime.now().strftime('%y') + 'S'
+        barcodes = [x['barcode'] for x in data['data']]
+        self.assertEqual(barcodes, [
+            f'{prefix}{counter + i:06d}' for i in range(1, 4)])
+
+        samples = Sample.objects.filter(pk__in=[x['pk'] for x in data['data']])
+        self.assertEqual(len(samples), 3)
+        for sample in samples:
+            self.assertEqual(
+                sample.barcode_key, get_barcode_key(sample.barcode))
+
     def test_add_sample_contains_invalid(self):
         """ Ensure add sample containing invalid data behaves correctly. """
         name = self._get_random_name()
@@ -331,6 +454,48 @@ class TestSamples(BaseTestCase):
         self.assertEqual(Sample.objects.get(
             pk=sample2.pk).name, sample2.name)
 
+    def test_add_update_samples_bulk(self):
+        """
+        Ensure the number of queries doesn't depend on the number of
+        samples being added or updated.
+        """
+        def post(url, rows):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse(url), {
+                    'data': json.dumps(rows),
+                })
+            self.assertTrue(response.json()['success'])
+            return response.json(), len(queries)
+
+        def add_update(num_samples):
+            rows = [{
+                'name': self._get_random_name(),
+                'organism': self.sample.organism.pk,
+                'concentration': 1.0,
+                'concentration_method': self.sample.concentration_method.pk,
+                'read_length': self.sample.read_length.pk,
+                'sequencing_depth': 1,
+                'library_protocol': self.sample.library_protocol.pk,
+                'library_type': self.sample.library_type.pk,
+                'nucleic_acid_type': self.sample.nucleic_acid_type.pk,
+            } for _ in range(num_samples)]
+            data, num_create_queries = post('samples-list', rows)
+
+            for row, item in zip(rows, data['data']):
+                row.update(pk=item['pk'], sequencing_depth=5)
+            _, num_update_queries = post('samples-edit', rows)
+
+            return data, num_create_queries, num_update_queries
+
+        _, num_create_queries, num_update_queries = add_update(2)
+        data, num_create_queries_bulk, num_update_queries_bulk = add_update(6)
+        self.assertEqual(num_create_queries, num_create_queries_bulk)
+        self.assertEqual(num_update_queries, num_update_queries_bulk)
+
+        samples = Sample.objects.filter(pk__in=[x['pk'] for x in data['data']])
+        self.assertEqual(len(samples), 6)
+        self.assertTrue(all(x.sequencing_depth == 5 for x in samples))
+
     def test_delete_sample(self):
         """ Ensure delete sample behaves correctly. """
         sample = create_sample(self._get_random_name())
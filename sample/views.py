@@ -20,3 +20,5 @@ class NucleicAcidTypeViewSet(viewsets.ReadOnlyModelViewSet):
 
 class SampleViewSet(LibrarySampleBaseViewSet):
     serializer_class = SampleSerializer
+    select_related = LibrarySampleBaseViewSet.select_related + (
+        'nucleic_acid_type',)
@@ -2,6 +2,8 @@ from django.apps import apps
 
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 
+from common.utils import get_barcode_key
+
 Flowcell = apps.get_model('flowcell', 'Flowcell')
 
 
@@ -21,9 +23,13 @@ class RunsSerializer(ModelSerializer):
 
         lanes = {}
         for lane in instance.fetched_lanes:
-            records = lane.pool.fetched_libraries or lane.pool.fetched_samples
+            pools = lane.fetched_pools
+            records = [x for pool in pools for x in pool.fetched_libraries] \
+                or [x for pool in pools for x in pool.fetched_samples]
+            if not records:
+                continue
             lanes[lane.name] = {
-                'pool': lane.pool.name,
+                'pool': ', '.join(x.name for x in pools),
                 'loading_concentration': lane.loading_concentration,
                 'phix': lane.phix,
                 'read_length': records[0].read_length.name,
@@ -79,14 +85,14 @@ class SequencesSerializer(ModelSerializer):
 
         pools, lanes = {}, {}
         for lane in instance.fetched_lanes:
-            pool = lane.pool
-            records = pool.fetched_libraries + pool.fetched_samples
-            for record in records:
-                barcode = record.barcode
-                pools[barcode] = pool.name
-                if barcode not in lanes:
-                    lanes[barcode] = []
-                lanes[barcode].append(lane.name.split(' ')[1])
+            for pool in lane.fetched_pools:
+                records = pool.fetched_libraries + pool.fetched_samples
+                for record in records:
+                    barcode = record.barcode
+                    pools[barcode] = pool.name
+                    if barcode not in lanes:
+                        lanes[barcode] = []
+                    lanes[barcode].append(lane.name.split(' ')[1])
 
         items, processed_requests = {}, {}
         for request in instance.fetched_requests:
@@ -123,4 +129,5 @@ class SequencesSerializer(ModelSerializer):
                 'reads_pf_requested': obj.get('reads_pf_requested', ''),
             }, **item})
 
-        return sorted(result, key=lambda x: x['barcode'][3:])
+        return sorted(
+            result, key=lambda x: get_barcode_key(x['barcode']) or 0)
@@ -9,10 +9,9 @@ from request.tests import create_request
 from library.tests import create_library
 from sample.tests import create_sample
 from index_generator.tests import create_pool
-from flowcell.tests import create_flowcell, create_sequencer
+from flowcell.tests import create_flowcell, create_sequencer, create_lane
 
 Flowcell = apps.get_model('flowcell', 'Flowcell')
-Lane = apps.get_model('flowcell', 'Lane')
 
 
 class TestRunStatistics(BaseTestCase):
@@ -45,8 +44,7 @@ class TestRunStatistics(BaseTestCase):
         matrix = []
         for i in range(8):
             name = 'Lane {}'.format(i + 1)
-            lane = Lane(name=name, pool=pool)
-            lane.save()
+            lane = create_lane(name, pool)
 
             lanes.append(lane.pk)
             matrix.append({
@@ -162,8 +160,7 @@ class TestSequencesStatistics(BaseTestCase):
         lanes = []
         for i in range(8):
             name = 'Lane {}'.format(i + 1)
-            lane = Lane(name=name, pool=pool)
-            lane.save()
+            lane = create_lane(name, pool)
             lanes.append(lane.pk)
 
         flowcell.lanes.add(*lanes)
@@ -24,6 +24,7 @@ Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 Flowcell = apps.get_model('flowcell', 'Flowcell')
 Lane = apps.get_model('flowcell', 'Lane')
+Pool = apps.get_model('index_generator', 'Pool')
 
 
 class RunStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
@@ -57,24 +58,25 @@ class RunStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
             'library_type__name',
         )
 
-        lanes_qs = Lane.objects.select_related('pool').prefetch_related(
+        pools_qs = Pool.objects.prefetch_related(
             Prefetch(
-                'pool__libraries',
+                'libraries',
                 queryset=libraries_qs,
                 to_attr='fetched_libraries',
             ),
             Prefetch(
-                'pool__samples',
+                'samples',
                 queryset=samples_qs,
                 to_attr='fetched_samples',
             ),
+        ).only('name')
+
+        lanes_qs = Lane.objects.prefetch_related(
+            Prefetch('pools', queryset=pools_qs, to_attr='fetched_pools'),
         ).only(
             'name',
             'phix',
             'loading_concentration',
-            'pool__name',
-            'pool__libraries',
-            'pool__samples',
         )
 
         queryset = Flowcell.objects.exclude(
@@ -184,25 +186,22 @@ class SequencesStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
             'samples',
         )
 
-        lanes_qs = Lane.objects.select_related(
-            'pool'
-        ).prefetch_related(
+        pools_qs = Pool.objects.prefetch_related(
             Prefetch(
-                'pool__libraries',
+                'libraries',
                 queryset=Library.objects.only('barcode'),
                 to_attr='fetched_libraries',
             ),
             Prefetch(
-                'pool__samples',
+                'samples',
                 queryset=Sample.objects.only('barcode'),
                 to_attr='fetched_samples',
             ),
-        ).only(
-            'name',
-            'pool__name',
-            'pool__libraries',
-            'pool__samples',
-        ).order_by('name')
+        ).only('name')
+
+        lanes_qs = Lane.objects.prefetch_related(
+            Prefetch('pools', queryset=pools_qs, to_attr='fetched_pools'),
+        ).only('name').order_by('name')
 
         queryset = Flowcell.objects.exclude(
             sequences__isnull=True,
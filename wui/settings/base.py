@@ -231,3 +231,11 @@ IPYTHON_ARGUMENTS = [
 
 SETUP_ADMIN_EMAIL = os.environ.get('SETUP_ADMIN_EMAIL', '')
 SETUP_ADMIN_PASSWORD = os.environ.get('SETUP_ADMIN_PASSWORD', None)
+
+
+# Index generator
+
+# The number of processes of the multi-restart search per worker
+# (shared by all its requests and jobs)
+INDEX_GENERATOR_PROCESSES = int(
+    os.environ.get('INDEX_GENERATOR_PROCESSES', 2))